@@ -0,0 +1,106 @@
+# Cached artifacts derived from compositions (MIDI data and rendered audio)
+# Every artifact is cached on its composition together with the stage inputs
+# it was built from: the notes revision, the rhythm pattern, the tempo and
+# the render options. When one of them changes only the artifacts depending
+# on it are rebuilt, and only their affected part:
+#   scale change   notes revision bumps -> MIDI pitches, note events, audio
+#   rhythm change  MIDI ticks, note events and audio; the MIDI pitches stay
+#   tempo change   audio only; the MIDI file just gets a new tempo event
+#   name change    nothing but the MIDI track name
+# Compositions must be changed through their attributes, update() or
+# change_scale(), not by editing the note list in place.
+
+import numpy as np
+
+from instrumentation import traced
+from midi_export import (
+    DEFAULT_VELOCITY, durations_to_ticks, frequencies_to_midi, header_chunk, note_events,
+    tempo_event, text_event, track_chunk
+)
+from rhythm import resolve_rhythm
+from synthesis import DEFAULT_FRAME_SIZE, DEFAULT_SAMPLE_RATE, AdditiveSynthesizer, timbre_partials
+
+# Tempo the rhythm durations are written for
+NOMINAL_TEMPO = 120
+
+def cached(comp, kind, key, build):
+    # Artifact of a composition, rebuilt only when its inputs change
+    # comp: Composition or CompactComposition
+    # kind: artifact name
+    # key: inputs the artifact is built from
+    # build: function building the artifact
+    # returns: the artifact
+    artifacts = comp._artifacts
+    if artifacts is None:
+        artifacts = comp._artifacts = {}
+    entry = artifacts.get(kind)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    value = build()
+    artifacts[kind] = (key, value)
+    return value
+
+def invalidate(comp, kind=None):
+    # Drop one cached artifact of a composition, or all of them
+    if comp._artifacts is not None:
+        if kind is None:
+            comp._artifacts = None
+        else:
+            comp._artifacts.pop(kind, None)
+
+def midi_pitches(comp):
+    # MIDI note numbers of the notes; depends on the notes only
+    return cached(comp, 'midi_pitches', (comp.notes_revision,),
+                  lambda: frequencies_to_midi(np.asarray(comp.notes, dtype=np.float64)))
+
+def midi_ticks(comp):
+    # Tick durations of the notes; depends on the rhythm and note count only
+    count = comp.note_count
+    return cached(comp, 'midi_ticks', (comp.rhythm_pattern, count),
+                  lambda: durations_to_ticks(resolve_rhythm(comp.rhythm_pattern).durations(count)))
+
+def midi_note_events(comp, velocity=DEFAULT_VELOCITY):
+    # Encoded note events of the composition's MIDI track
+    key = (comp.notes_revision, comp.rhythm_pattern, velocity)
+    return cached(comp, 'midi_note_events', key,
+                  lambda: note_events(midi_pitches(comp), midi_ticks(comp), velocity=velocity)[0])
+
+@traced(category='artifacts')
+def composition_midi(comp, velocity=DEFAULT_VELOCITY):
+    # Single-track MIDI file of a composition, like composition_to_midi
+    # The name and tempo events are added to the cached note events, so a
+    # tempo or name change re-encodes no notes
+    # returns: bytes of the MIDI file
+    meta = b'\x00' + text_event(0x03, comp.name) + b'\x00' + tempo_event(comp.tempo)
+    return header_chunk(0, 1) + track_chunk(meta + midi_note_events(comp, velocity))
+
+def save_composition_midi(comp, filepath):
+    # Write a composition's (cached) MIDI file
+    # returns: True if successful, False otherwise
+    try:
+        data = composition_midi(comp)
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        return True
+    except Exception as e:
+        print(f"Error exporting MIDI file: {e}")
+        return False
+
+@traced(category='artifacts')
+def composition_audio(comp, timbre=None, synthesizer=None):
+    # Additive synthesis of a composition at its tempo
+    # Durations are nominal 120 BPM values, scaled to the composition tempo
+    # as in the MIDI export
+    # timbre: sequence type name or partial amplitudes (None for sine)
+    # synthesizer: AdditiveSynthesizer to render with (a default one if None)
+    # returns: (float32 samples, sample rate)
+    sample_rate = synthesizer.sample_rate if synthesizer else DEFAULT_SAMPLE_RATE
+    frame_size = synthesizer.frame_size if synthesizer else DEFAULT_FRAME_SIZE
+    timbre_key = tuple(timbre) if isinstance(timbre, (list, tuple)) else timbre
+    key = (comp.notes_revision, comp.rhythm_pattern, comp.tempo, timbre_key, sample_rate, frame_size)
+
+    def render():
+        durations = (resolve_rhythm(comp.rhythm_pattern).durations(comp.note_count)
+                     * (NOMINAL_TEMPO / comp.tempo))
+        return (synthesizer or AdditiveSynthesizer()).render(comp.notes, durations, timbre_partials(timbre))
+    return cached(comp, 'audio', key, render), sample_rate
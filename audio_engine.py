@@ -4,12 +4,18 @@ import winsound
 import time
 import threading
 
+from instrumentation import traced
+from rhythm import Rhythm, create_rhythm_pattern
+from synthesis import AdditiveSynthesizer, timbre_partials, to_wav_bytes
+
 class AudioEngine:
     def __init__(self):
         # Initialize the audio engine
         self.is_playing = False
         self.current_thread = None
+        self.synthesizer = AdditiveSynthesizer()
         
+    @traced(category='audio')
     def play_note(self, frequency, duration_ms=500):
         # Play a single note using winsound
         # frequency: frequency in Hz
@@ -20,7 +26,7 @@ class AudioEngine:
             # Ensure frequency is in valid range for winsound
             freq_int = max(37, min(32767, freq_int))
             
-            winsound.Beep(freq_int, duration_ms)
+            winsound.Beep(freq_int, int(duration_ms))
         except Exception as e:
             print(f"Error playing note: {e}")
     
@@ -40,6 +46,7 @@ class AudioEngine:
         beat_duration = 60000 / tempo  # Convert BPM to milliseconds
         note_delay = beat_duration / 4  # Assume 16th notes for now
         
+        @traced("AudioEngine.play_melody.playback", 'audio')
         def play_sequence():
             try:
                 for idx, note in enumerate(notes):
@@ -75,13 +82,15 @@ class AudioEngine:
     def play_sequence_with_rhythm(self, notes, rhythm_pattern=None, tempo=120):
         # Play a sequence with a specific rhythm pattern
         # notes: list of note frequencies
-        # rhythm_pattern: list of note durations (in milliseconds)
+        # rhythm_pattern: list of note durations (in milliseconds), or a
+        #                 Rhythm whose durations are looked up note by note
         # tempo: tempo in BPM
-        if not rhythm_pattern:
+        if isinstance(rhythm_pattern, Rhythm):
+            rhythm_pattern = rhythm_pattern.iter_durations(len(notes))
+        elif not rhythm_pattern:
             # Default to equal note durations
             rhythm_pattern = [500] * len(notes)
-        
-        if len(notes) != len(rhythm_pattern):
+        elif len(notes) != len(rhythm_pattern):
             print("Warning: Notes and rhythm pattern have different lengths. Using shorter length.")
             min_length = min(len(notes), len(rhythm_pattern))
             notes = notes[:min_length]
@@ -93,6 +102,7 @@ class AudioEngine:
         
         self.is_playing = True
         
+        @traced("AudioEngine.play_sequence_with_rhythm.playback", 'audio')
         def play_with_rhythm():
             try:
                 for i, (note, duration) in enumerate(zip(notes, rhythm_pattern)):
@@ -118,33 +128,52 @@ class AudioEngine:
         self.current_thread.daemon = True
         self.current_thread.start()
     
+    @traced(category='audio')
+    def render_additive(self, notes, rhythm_pattern=None, timbre=None, num_partials=64):
+        # Render a melody with additive synthesis
+        # notes: list of note frequencies
+        # rhythm_pattern: list of note durations (in milliseconds) or a Rhythm
+        # timbre: sequence type name or list of partial amplitudes (None for sine)
+        # num_partials: number of harmonics when the timbre is a sequence name
+        # returns: float32 array of samples
+        partials = timbre_partials(timbre, num_partials)
+        return self.synthesizer.render(notes, rhythm_pattern, partials)
+    
+    def play_additive(self, notes, rhythm_pattern=None, timbre=None, num_partials=64):
+        # Play a melody rendered with additive synthesis
+        # notes: list of note frequencies
+        # rhythm_pattern: list of note durations (in milliseconds) or a Rhythm
+        # timbre: sequence type name or list of partial amplitudes (None for sine)
+        # num_partials: number of harmonics when the timbre is a sequence name
+        if self.is_playing:
+            print("Already playing a melody. Please wait...")
+            return
+        
+        self.is_playing = True
+        
+        @traced("AudioEngine.play_additive.playback", 'audio')
+        def play_rendered():
+            try:
+                samples = self.render_additive(notes, rhythm_pattern, timbre, num_partials)
+                wav_data = to_wav_bytes(samples, self.synthesizer.sample_rate)
+                if self.is_playing:
+                    winsound.PlaySound(wav_data, winsound.SND_MEMORY)
+                
+                self.is_playing = False
+                print("Additive melody finished playing.")
+                
+            except Exception as e:
+                print(f"Error playing additive melody: {e}")
+                self.is_playing = False
+        
+        # Start playing in a separate thread
+        self.current_thread = threading.Thread(target=play_rendered)
+        self.current_thread.daemon = True
+        self.current_thread.start()
+    
     def create_rhythm_pattern(self, pattern_type='simple', num_notes=8):
         # Create a rhythm pattern for the melody
         # pattern_type: type of rhythm pattern
         # num_notes: number of notes in the pattern
         # returns: list of note durations in milliseconds
-        if pattern_type == 'simple':
-            # Simple pattern: all notes equal duration
-            return [500] * num_notes
-        elif pattern_type == 'waltz':
-            # Waltz pattern: 3/4 time
-            pattern = []
-            for idx in range(num_notes):
-                if idx % 3 == 0:
-                    pattern.append(800)  # Strong beat
-                else:
-                    pattern.append(400)  # Weak beat
-            return pattern[:num_notes]
-        elif pattern_type == 'march':
-            # March pattern: 4/4 time
-            pattern = []
-            for idx in range(num_notes):
-                if idx % 4 == 0:
-                    pattern.append(600)  # Strong beat
-                elif idx % 2 == 0:
-                    pattern.append(400)  # Medium beat
-                else:
-                    pattern.append(200)  # Weak beat
-            return pattern[:num_notes]
-        else:
-            return [500] * num_notes
+        return create_rhythm_pattern(pattern_type, num_notes)
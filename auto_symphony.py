@@ -21,25 +21,26 @@ def play_automatic_symphony():
         print("\nCreating Symphony Movements...")
         print("-" * 50)
         
-        # Create all movements automatically
-        print("Creating Movement 1: Fibonacci Theme...")
-        symphony.create_fibonacci_theme(12, 120, 'major')
-        time.sleep(1)
+        # Create all movements automatically, saving them in the background
+        with symphony.generator.composition_manager.write_behind():
+            print("Creating Movement 1: Fibonacci Theme...")
+            symphony.create_fibonacci_theme(12, 120, 'major')
+            time.sleep(1)
         
-        print("Creating Movement 2: Prime Counterpoint...")
-        symphony.create_prime_counterpoint(15, 90, 'minor')
-        time.sleep(1)
+            print("Creating Movement 2: Prime Counterpoint...")
+            symphony.create_prime_counterpoint(15, 90, 'minor')
+            time.sleep(1)
         
-        print("Creating Movement 3: Pi Bridge...")
-        symphony.create_pi_bridge(20, 150, 'pentatonic')
-        time.sleep(1)
+            print("Creating Movement 3: Pi Bridge...")
+            symphony.create_pi_bridge(20, 150, 'pentatonic')
+            time.sleep(1)
         
-        print("Creating Movement 4: Fibonacci Variation...")
-        symphony.create_fibonacci_variation(8, 180, 'major')
-        time.sleep(1)
+            print("Creating Movement 4: Fibonacci Variation...")
+            symphony.create_fibonacci_variation(8, 180, 'major')
+            time.sleep(1)
         
-        print("Creating Movement 5: Prime Finale...")
-        symphony.create_prime_finale(10, 60, 'minor')
+            print("Creating Movement 5: Prime Finale...")
+            symphony.create_prime_finale(10, 60, 'minor')
         
         # Show symphony summary
         symphony.create_symphony_summary()
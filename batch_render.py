@@ -0,0 +1,183 @@
+# Headless batch rendering driven by a job spec
+# Generates many compositions from a JSON job spec, saves them and renders
+# WAV and MIDI files on a pool of worker processes, without the Windows
+# sound system or any prompts. Used by 'python -m cli render'.
+#
+# A job spec is a list of jobs, or an object with a "jobs" list and optional
+# "defaults" merged into every job:
+#   {"defaults": {"scale": "minor", "outputs": ["wav", "midi"]},
+#    "jobs": [{"sequence": "primes", "n": 16, "tempo": 90, "rhythm": "march"}]}
+
+import io
+import json
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+from functools import partial
+
+from artifacts import composition_audio, save_composition_midi
+from catalog_scan import ordered_map
+from composition import Composition, CompositionManager, file_stem
+from math_sequences import SEQUENCE_GENERATORS
+from midi_export import MIDI_EXTENSION
+from rhythm import is_rhythm_pattern
+from synthesis import save_wav
+
+SCALE_TYPES = ('major', 'minor', 'pentatonic')
+OUTPUT_TYPES = ('wav', 'midi')
+JOB_DEFAULTS = {
+    'scale': 'major',
+    'rhythm': 'simple',
+    'tempo': 120,
+    'outputs': ['wav', 'midi'],
+    'timbre': None,
+}
+
+# Per-process composition managers, reused across jobs
+_managers = {}
+
+def load_job_spec(filepath):
+    # Read and validate a job spec
+    # filepath: path of the JSON job spec
+    # returns: list of complete job dictionaries
+    # raises: ValueError if the spec is invalid
+    with open(filepath, 'r') as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get('jobs'), list):
+        raise ValueError("Job spec must be a list of jobs or an object with a 'jobs' list")
+
+    defaults = dict(JOB_DEFAULTS, **spec.get('defaults', {}))
+    jobs = []
+    name_counts = {}
+    for idx, job in enumerate(spec['jobs']):
+        job = dict(defaults, **job)
+        try:
+            validate_job(job)
+        except ValueError as e:
+            raise ValueError(f"Job {idx + 1}: {e}")
+        name = job.get('name') or default_job_name(job)
+        # Jobs with the same name would overwrite each other's files
+        name_counts[name] = name_counts.get(name, 0) + 1
+        if name_counts[name] > 1:
+            name = f"{name}_{name_counts[name]}"
+        job['name'] = name
+        jobs.append(job)
+    return jobs
+
+def default_job_name(job):
+    # File-friendly name built from every field that shapes a job's outputs
+    parts = [job['sequence'], job['n'], job['scale'], job['rhythm'], job['tempo']]
+    timbre = job['timbre']
+    if timbre is not None:
+        parts.append(timbre if isinstance(timbre, str) else 'partials')
+    parts.append('-'.join(job['outputs']) or 'none')
+    return '_'.join(str(part) for part in parts)
+
+def validate_job(job):
+    # Check a job's fields, raising ValueError on the first problem
+    if job.get('sequence') not in SEQUENCE_GENERATORS:
+        raise ValueError(f"unknown sequence {job.get('sequence')!r}")
+    n = job.get('n')
+    if isinstance(n, bool) or not isinstance(n, int) or n <= 0:
+        raise ValueError("'n' must be a positive integer")
+    if job['scale'] not in SCALE_TYPES:
+        raise ValueError(f"unknown scale {job['scale']!r}")
+    if not is_rhythm_pattern(job['rhythm']):
+        raise ValueError(f"unknown rhythm {job['rhythm']!r}")
+    tempo = job['tempo']
+    if isinstance(tempo, bool) or not isinstance(tempo, (int, float)) or tempo <= 0:
+        raise ValueError("'tempo' must be a positive number")
+    timbre = job['timbre']
+    if isinstance(timbre, str) and timbre not in SEQUENCE_GENERATORS:
+        raise ValueError(f"unknown timbre {timbre!r}")
+    unknown = [output for output in job['outputs'] if output not in OUTPUT_TYPES]
+    if unknown:
+        raise ValueError(f"unknown outputs {unknown}")
+
+def render_job(job, output_directory, save_directory=None):
+    # Generate, save and render one job (runs in a worker process)
+    # job: complete job dictionary from load_job_spec
+    # output_directory: directory for WAV and MIDI files
+    # save_directory: composition directory to save into (None skips saving)
+    # returns: result dictionary for the summary
+    comp = Composition.from_recipe(job['name'], job['sequence'], job['n'], job['scale'],
+                                   job['tempo'], job['rhythm'])
+    return render_composition(comp, job['outputs'], output_directory, save_directory, job['timbre'])
+
+def render_composition(comp, outputs, output_directory=None, save_directory=None, timbre=None,
+                       manager_options=None):
+    # Save and render a composition (runs in a worker process)
+    # comp: composition
+    # outputs: output types to write ('wav', 'midi')
+    # output_directory: directory for WAV and MIDI files
+    # save_directory: composition directory to save into (None skips saving)
+    # timbre: additive synthesis timbre of the WAV output
+    # manager_options: CompositionManager.storage_options() of the saving manager
+    # returns: result dictionary with the saved file name and output paths
+    start = time.perf_counter()
+    result = {'name': comp.name, 'note_count': len(comp.notes), 'outputs': {}}
+    if outputs:
+        base_path = os.path.join(output_directory, file_stem(comp.name))
+
+    # Library code reports progress with print(); keep the summary clean
+    with redirect_stdout(io.StringIO()) as log:
+        if save_directory is not None:
+            options = manager_options or {}
+            key = (save_directory, tuple(sorted(options.items())))
+            manager = _managers.get(key)
+            if manager is None:
+                manager = _managers[key] = CompositionManager(save_directory, **options)
+            if not manager.save_composition(comp):
+                raise RuntimeError(log.getvalue().strip() or "saving failed")
+            result['saved'] = manager.composition_filename(comp.name, created_date=comp.created_date)
+
+        if 'wav' in outputs:
+            # Rendered once per composition and stage inputs (see artifacts)
+            samples, sample_rate = composition_audio(comp, timbre)
+            save_wav(samples, base_path + '.wav', sample_rate)
+            result['outputs']['wav'] = base_path + '.wav'
+            result['duration_seconds'] = round(len(samples) / sample_rate, 3)
+
+        if 'midi' in outputs:
+            if not save_composition_midi(comp, base_path + MIDI_EXTENSION):
+                raise RuntimeError(log.getvalue().strip() or "writing MIDI failed")
+            result['outputs']['midi'] = base_path + MIDI_EXTENSION
+
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+def run_jobs(jobs, output_directory, save_directory=None, workers=None):
+    # Render jobs in parallel worker processes
+    # jobs: list of job dictionaries from load_job_spec
+    # output_directory: directory for WAV and MIDI files
+    # save_directory: composition directory to save into (None skips saving)
+    # workers: number of worker processes (1 renders in this process)
+    # returns: summary dictionary with per-job results in job order
+    os.makedirs(output_directory, exist_ok=True)
+    start = time.perf_counter()
+    worker = partial(render_job, output_directory=output_directory, save_directory=save_directory)
+    results = []
+    try:
+        for job, (result, error) in zip(jobs, ordered_map(worker, jobs, workers, use_processes=True)):
+            if error is not None:
+                result = {'name': job['name'], 'status': 'error', 'error': str(error)}
+            else:
+                result['status'] = 'ok'
+            results.append(result)
+    except BrokenProcessPool as e:
+        # A worker process died (e.g. killed for running out of memory) and
+        # took the pool with it; report the unfinished jobs as failed
+        error = f"worker process died: {e}"
+        results += [{'name': job['name'], 'status': 'error', 'error': error}
+                    for job in jobs[len(results):]]
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    return {
+        'jobs': len(jobs),
+        'succeeded': len(jobs) - failed,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - start, 3),
+        'results': results,
+    }
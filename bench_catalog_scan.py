@@ -0,0 +1,139 @@
+# Catalog scan benchmark on a synthetic composition directory
+# Writes a directory of JSON compositions and compares reading their metadata
+# the old way (os.listdir and json.load of every whole file on one thread)
+# with the scandir-based prefix scan, sequentially and on thread and process
+# pools. Peak memory of each mode is measured with tracemalloc in a
+# separate, untimed pass. tracemalloc only sees this process, so for the
+# process pool the peak resident set of the worker processes is reported as
+# well (where the resource module exists, i.e. not on Windows); it includes
+# each worker's interpreter and imports and is not comparable with the
+# traced peaks.
+#
+# Usage: python bench_catalog_scan.py [file_count] [notes_per_composition] [directory]
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from catalog_scan import scan_catalog
+from composition import STORAGE_EXTENSIONS, Composition
+from math_sequences import generate_primes, sequence_to_notes
+
+def create_catalog(directory, file_count, notes_per_composition):
+    # Write a synthetic catalog in the layout CompositionManager saves
+    # directory: directory to fill
+    # file_count: number of composition files
+    # notes_per_composition: notes in every composition
+    os.makedirs(directory, exist_ok=True)
+    notes = sequence_to_notes(generate_primes(notes_per_composition), 'minor')
+    template = Composition("Template", "primes", notes, 90, "minor", "march").to_dict()
+    template['note_count'] = len(notes)
+    template['notes'] = template.pop('notes')
+    for i in range(file_count):
+        template['name'] = f"Catalog_Piece_{i:06d}"
+        with open(os.path.join(directory, f"{template['name']}.json"), 'w') as f:
+            json.dump(template, f, indent=2)
+
+def listdir_scan(directory):
+    # Sequential scan as list_compositions used to do it
+    results = []
+    for filename in os.listdir(directory):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename), 'r') as f:
+                data = json.load(f)
+            data['note_count'] = len(data.pop('notes'))
+            data['filename'] = filename
+            results.append(data)
+    return len(results)
+
+def catalog_scan(directory, workers, use_processes=False):
+    # Stream the metadata with scan_catalog, keeping nothing but a count
+    count = 0
+    for _entry, metadata, error in scan_catalog(directory, STORAGE_EXTENSIONS.values(),
+                                                 workers=workers, use_processes=use_processes):
+        if error is None:
+            count += 1
+    return count
+
+def children_peak_rss():
+    # Largest resident set of any finished child process, in bytes
+    # returns: bytes, or None where it cannot be measured
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(scan, *args):
+    # Time a scan, then repeat it under tracemalloc for its peak memory
+    # (tracing slows the scan down, so it is not timed)
+    # returns: (files read, seconds, peak bytes)
+    start = time.perf_counter()
+    count = scan(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    scan(*args)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+def run_benchmark(file_count=50000, notes_per_composition=200, directory=None):
+    # Compare the scanning modes on a synthetic catalog
+    print("=" * 60)
+    print("           CATALOG SCAN BENCHMARK")
+    print("=" * 60)
+    print(f"Files: {file_count}, notes per composition: {notes_per_composition}")
+
+    temporary = directory is None
+    if temporary:
+        directory = tempfile.mkdtemp(prefix="catalog_bench_")
+    try:
+        start = time.perf_counter()
+        create_catalog(directory, file_count, notes_per_composition)
+        print(f"Catalog written in {time.perf_counter() - start:.1f}s")
+        print("-" * 60)
+
+        modes = [
+            ("listdir + json.load", listdir_scan, (directory,)),
+            ("scandir prefix, 1 worker", catalog_scan, (directory, 1)),
+            ("scandir prefix, threads", catalog_scan, (directory, None)),
+            ("scandir prefix, processes", catalog_scan, (directory, os.cpu_count(), True)),
+        ]
+        results = {}
+        for label, scan, args in modes:
+            count, elapsed, peak = measure(scan, *args)
+            results[label] = elapsed
+            line = (f"{label:28s} {count:7d} files {elapsed:7.2f}s "
+                    f"{count / elapsed:9.0f} files/s  peak {peak / (1024 * 1024):7.1f} MB")
+            if scan is catalog_scan and len(args) > 2 and args[2]:
+                # Nothing before this mode starts child processes
+                worker_rss = children_peak_rss()
+                line += " in this process"
+                if worker_rss is not None:
+                    line += f", largest worker {worker_rss / (1024 * 1024):.1f} MB RSS"
+            print(line)
+
+        print("-" * 60)
+        baseline = results["listdir + json.load"]
+        best = min(results, key=results.get)
+        print(f"Fastest: {best} ({baseline / results[best]:.1f}x the listdir scan)")
+        return results
+    finally:
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    notes_per_composition = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    directory = sys.argv[3] if len(sys.argv) > 3 else None
+    run_benchmark(file_count, notes_per_composition, directory)
@@ -0,0 +1,64 @@
+# Memory benchmark comparing Composition with CompactComposition
+# Builds a catalog of compositions of each kind and reports the memory held
+# per composition, measured with tracemalloc.
+#
+# Usage: python bench_composition_memory.py [count] [notes_per_composition]
+
+import gc
+import sys
+import tracemalloc
+
+from composition import CompactComposition, Composition
+from math_sequences import generate_primes, sequence_to_notes
+
+def measure_catalog(composition_class, count, notes_per_composition):
+    # Build a catalog from dictionaries, as loading from disk would
+    # composition_class: Composition or CompactComposition
+    # count: number of compositions in the catalog
+    # notes_per_composition: notes in every composition
+    # returns: (bytes allocated by the catalog, catalog)
+    notes = sequence_to_notes(generate_primes(notes_per_composition), 'minor')
+    template = Composition("Template", "primes", notes, 90, "minor", "march").to_dict()
+
+    gc.collect()
+    tracemalloc.start()
+    before, _peak = tracemalloc.get_traced_memory()
+    catalog = []
+    for i in range(count):
+        data = dict(template)
+        data['name'] = f"Catalog_Piece_{i}"
+        # Fresh strings and notes per composition, like separately parsed files
+        data['sequence_type'] = ''.join(template['sequence_type'])
+        data['notes'] = [float(str(note)) for note in template['notes']]
+        catalog.append(composition_class.from_dict(data))
+        del data
+    gc.collect()
+    after, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return after - before, catalog
+
+def run_benchmark(count=10000, notes_per_composition=50):
+    # Compare the memory used per composition by both classes
+    print("=" * 60)
+    print("           COMPOSITION MEMORY BENCHMARK")
+    print("=" * 60)
+    print(f"Compositions: {count}, notes per composition: {notes_per_composition}")
+    print("-" * 60)
+
+    results = {}
+    for composition_class in (Composition, CompactComposition):
+        total_bytes, catalog = measure_catalog(composition_class, count, notes_per_composition)
+        results[composition_class.__name__] = total_bytes
+        print(f"{composition_class.__name__:20s} {total_bytes / count:10.1f} bytes/composition "
+              f"{total_bytes / (1024 * 1024):8.1f} MB total")
+        del catalog
+
+    ratio = results['Composition'] / results['CompactComposition']
+    print("-" * 60)
+    print(f"CompactComposition uses {ratio:.1f}x less memory")
+    return results
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    notes_per_composition = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run_benchmark(count, notes_per_composition)
@@ -0,0 +1,60 @@
+# MIDI export throughput benchmark
+# Encodes a batch of sequence-derived compositions as Standard MIDI Files,
+# in memory and written to disk, and reports compositions per second.
+#
+# Usage: python bench_midi_export.py [count] [notes_per_composition]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from composition import Composition
+from math_sequences import generate_pi_digits, generate_primes, sequence_to_notes
+from midi_export import MIDI_EXTENSION, composition_to_midi, save_midi
+
+def build_batch(count, notes_per_composition):
+    # Compositions with varying melodies, tempos and rhythms
+    melodies = [
+        sequence_to_notes(generate_primes(notes_per_composition), 'minor'),
+        sequence_to_notes(generate_pi_digits(notes_per_composition), 'pentatonic'),
+    ]
+    rhythms = ['simple', 'waltz', 'march']
+    return [
+        Composition(f"Batch_{i}", "primes", melodies[i % 2], 60 + i % 120, "minor", rhythms[i % 3])
+        for i in range(count)
+    ]
+
+def run_benchmark(count=5000, notes_per_composition=50):
+    # Measure MIDI encoding and file export throughput
+    print("=" * 60)
+    print("           MIDI EXPORT BENCHMARK")
+    print("=" * 60)
+    print(f"Compositions: {count}, notes per composition: {notes_per_composition}")
+    print("-" * 60)
+
+    batch = build_batch(count, notes_per_composition)
+
+    start = time.perf_counter()
+    total_bytes = sum(len(composition_to_midi(comp)) for comp in batch)
+    encode_seconds = time.perf_counter() - start
+    print(f"{'Encode in memory':24s} {count / encode_seconds:10.0f} compositions/s "
+          f"({total_bytes / count:.0f} bytes each)")
+
+    directory = tempfile.mkdtemp(prefix="midi_bench_")
+    try:
+        start = time.perf_counter()
+        for comp in batch:
+            save_midi(comp, os.path.join(directory, f"{comp.name}{MIDI_EXTENSION}"))
+        write_seconds = time.perf_counter() - start
+        print(f"{'Write files':24s} {count / write_seconds:10.0f} compositions/s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {'encode_per_second': count / encode_seconds, 'write_per_second': count / write_seconds}
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    notes_per_composition = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run_benchmark(count, notes_per_composition)
@@ -0,0 +1,279 @@
+# Benchmark suite with scaling curves for the hot paths
+# Times sequence generation, note mapping, saving and listing compositions,
+# MIDI encoding and additive rendering at input sizes from 10 up to 10^7.
+# Every case climbs the size ladder until a run exceeds the time budget, or
+# the next size is predicted to take over ten times the budget from the
+# local slope of the curve, so slow (e.g. quadratic) paths stop early
+# instead of running for hours.
+# Results are saved as JSON with the fitted scaling exponent of each case
+# and can be compared against a saved baseline; timings slower than the
+# baseline by more than the threshold are flagged as regressions and make
+# the run exit with status 1. Sizes that ran in under a millisecond in the
+# baseline are too noisy to compare and are left out.
+#
+# Usage:
+#   python bench_suite.py [--cases generate_primes,sequence_to_notes] [--max-size 100000]
+#                         [--budget 2.0] [--output results.json]
+#                         [--baseline baseline.json] [--threshold 0.25]
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+from composition import Composition, CompositionManager
+from math_sequences import (
+    generate_fibonacci, generate_pi_digits, generate_primes, sequence_to_notes,
+    sequence_to_notes_by_scale
+)
+from midi_export import composition_to_midi
+from synthesis import AdditiveSynthesizer
+
+SIZES = [10 ** exponent for exponent in range(1, 8)]
+# Seconds a single run may take before larger sizes are skipped
+DEFAULT_BUDGET = 2.0
+# A next size predicted to take longer than this many budgets is skipped
+PREDICTION_LIMIT = 10
+# Fast runs are timed in batches of calls lasting at least 0.2 s
+# (timeit.Timer.autorange); up to MAX_REPEATS batches are timed per size,
+# as long as they fit in MAX_MEASURE_SECONDS, and the fastest one counts
+MAX_REPEATS = 5
+MAX_MEASURE_SECONDS = 1.0
+# Timings under this are dominated by overhead and timer noise
+NOISE_FLOOR_SECONDS = 1e-3
+DEFAULT_THRESHOLD = 0.25
+SCALES = ('major', 'minor', 'pentatonic')
+
+def sample_sequence(size):
+    # Deterministic integer sequence spread over every note and octave
+    return [(i * 7919) % 200 for i in range(size)]
+
+def sample_notes(size):
+    return sequence_to_notes(sample_sequence(size), 'minor')
+
+def setup_save(size):
+    directory = tempfile.mkdtemp(prefix="bench_save_")
+    manager = CompositionManager(directory)
+    comp = Composition("Bench", "primes", sample_notes(size), 120, "minor", "march")
+    return (lambda: manager.save_composition(comp)), lambda: shutil.rmtree(directory, ignore_errors=True)
+
+def setup_list(size):
+    # size: number of saved compositions
+    directory = tempfile.mkdtemp(prefix="bench_list_")
+    manager = CompositionManager(directory)
+    notes = sample_notes(32)
+    batch = []
+    for i in range(size):
+        comp = Composition(f"Bench_{i:08d}", "primes", notes, 120, "minor", "march")
+        batch.append((manager.composition_filename(comp.name), comp))
+        if len(batch) >= 1000:
+            manager._write_compositions(batch)
+            batch = []
+    manager._write_compositions(batch)
+    # A fresh manager rescans every file, as after copying a catalog
+    run = lambda: CompositionManager(directory).list_compositions(refresh=True)
+    return run, lambda: shutil.rmtree(directory, ignore_errors=True)
+
+def setup_render(size):
+    # size: number of 100 ms notes
+    synthesizer = AdditiveSynthesizer()
+    notes = sample_notes(size)
+    durations = [100] * size
+    return lambda: synthesizer.render(notes, durations, [1.0, 0.5, 0.25], gap_ms=0)
+
+def setup_midi(size):
+    comp = Composition("Bench", "primes", sample_notes(size), 120, "minor", "march")
+    return lambda: composition_to_midi(comp)
+
+# Case name: (setup function(size) returning a callable, or a (callable,
+# cleanup) pair, and the largest size worth trying)
+CASES = {
+    'generate_primes': (lambda size: lambda: generate_primes(size), 10 ** 7),
+    # Fibonacci numbers grow linearly in digits, so memory grows quadratically
+    'generate_fibonacci': (lambda size: lambda: generate_fibonacci(size), 10 ** 5),
+    # Pi digits come from a fixed 101-digit string; larger sizes repeat the same work
+    'generate_pi_digits': (lambda size: lambda: generate_pi_digits(size), 100),
+    'sequence_to_notes': (
+        lambda size: (lambda sequence: lambda: sequence_to_notes(sequence, 'minor'))(sample_sequence(size)),
+        10 ** 7,
+    ),
+    'sequence_to_notes_by_scale': (
+        lambda size: (lambda sequence: lambda: sequence_to_notes_by_scale(sequence, SCALES))(sample_sequence(size)),
+        10 ** 7,
+    ),
+    'save_composition': (setup_save, 10 ** 7),
+    'list_compositions': (setup_list, 10 ** 5),
+    'midi_export': (setup_midi, 10 ** 7),
+    'render_additive': (setup_render, 10 ** 6),
+}
+
+def measure(run):
+    # Time a callable, averaging fast runs over batches of calls
+    # returns: seconds per run in the fastest batch
+    timer = timeit.Timer(run)
+    number, elapsed = timer.autorange()
+    batches = [elapsed]
+    spent = elapsed
+    while len(batches) < MAX_REPEATS and spent + elapsed <= MAX_MEASURE_SECONDS:
+        elapsed = timer.timeit(number)
+        batches.append(elapsed)
+        spent += elapsed
+    return min(batches) / number
+
+def scaling_exponent(timings):
+    # Least-squares slope of log(time) over log(size): ~1 linear, ~2 quadratic
+    # timings: dictionary of size to seconds
+    # returns: exponent, or None with fewer than two sizes
+    # Sizes whose runs take under a millisecond are dominated by overhead
+    points = [(math.log(size), math.log(seconds)) for size, seconds in timings.items()
+              if seconds > NOISE_FLOOR_SECONDS]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _y in points) / len(points)
+    mean_y = sum(y for _x, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _y in points)
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in points) / variance, 2)
+
+def run_case(name, max_size=None, budget=DEFAULT_BUDGET):
+    # Time one case across the size ladder
+    # name: key of CASES
+    # max_size: largest size to try (capped by the case's own limit)
+    # budget: stop after the first size whose run exceeds this many seconds
+    # returns: dictionary of size to seconds
+    setup, case_limit = CASES[name]
+    limit = min(case_limit, max_size or case_limit)
+    timings = {}
+    for size in SIZES:
+        if size > limit:
+            break
+        if len(timings) >= 2:
+            # Extrapolate from the last two sizes, assuming at least linear growth
+            (small, small_seconds), (large, large_seconds) = list(timings.items())[-2:]
+            slope = 1.0
+            if small_seconds > 1e-4:
+                slope = max(slope, math.log(large_seconds / small_seconds) / math.log(large / small))
+            if large_seconds * (size / large) ** slope > PREDICTION_LIMIT * budget:
+                print(f"  {size:>10d} skipped (predicted over {PREDICTION_LIMIT * budget:.0f} s)")
+                break
+        prepared = setup(size)
+        run, cleanup = prepared if isinstance(prepared, tuple) else (prepared, None)
+        try:
+            # Library code reports progress with print(); keep the table clean
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds = measure(run)
+        finally:
+            if cleanup is not None:
+                cleanup()
+        timings[size] = seconds
+        print(f"  {size:>10d} {seconds * 1000:12.3f} ms {seconds / size * 1e9:12.1f} ns/item")
+        if seconds > budget:
+            break
+    return timings
+
+def run_benchmark(cases=None, max_size=None, budget=DEFAULT_BUDGET):
+    # Run the suite
+    # cases: case names to run (defaults to all)
+    # max_size: largest input size
+    # budget: per-run time budget in seconds
+    # returns: results dictionary ready to be saved as JSON
+    print("=" * 60)
+    print("           BENCHMARK SUITE")
+    print("=" * 60)
+    results = {}
+    for name in cases or CASES:
+        print(f"\n{name}:")
+        timings = run_case(name, max_size, budget)
+        exponent = scaling_exponent(timings)
+        if exponent is not None:
+            print(f"  scaling exponent: {exponent}")
+        results[name] = {
+            'seconds': {str(size): seconds for size, seconds in timings.items()},
+            'scaling_exponent': exponent,
+        }
+    return {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Timings slower than a baseline by more than a threshold
+    # results, baseline: dictionaries from run_benchmark
+    # threshold: allowed slowdown as a fraction (0.25 = 25% slower)
+    # Sizes whose baseline is under NOISE_FLOOR_SECONDS are not compared
+    # returns: list of regression dictionaries (case, size, baseline,
+    #          current and ratio of the times)
+    regressions = []
+    for name, case in results['results'].items():
+        baseline_case = baseline.get('results', {}).get(name)
+        if baseline_case is None:
+            continue
+        for size, seconds in case['seconds'].items():
+            baseline_seconds = baseline_case['seconds'].get(size)
+            if baseline_seconds is None or baseline_seconds < NOISE_FLOOR_SECONDS:
+                continue
+            if seconds > baseline_seconds * (1 + threshold):
+                regressions.append({
+                    'case': name,
+                    'size': int(size),
+                    'baseline': baseline_seconds,
+                    'current': seconds,
+                    'ratio': round(seconds / baseline_seconds, 2),
+                })
+    return regressions
+
+def main(argv=None):
+    # Run the suite from the command line
+    # returns: process exit code (1 if regressions were found)
+    parser = argparse.ArgumentParser(description="Benchmark suite with scaling curves")
+    parser.add_argument("--cases", help=f"comma-separated cases (default: all of {', '.join(CASES)})")
+    parser.add_argument("--max-size", type=int, help="largest input size (default: 10^7)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="skip larger sizes once a run takes this many seconds")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown flagged as a regression (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(',') if args.cases else None
+    unknown = [name for name in cases or [] if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = run_benchmark(cases, args.max_size, args.budget)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"\nBaseline {args.baseline} not found; nothing to compare.")
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print("\n" + "=" * 60)
+        if not regressions:
+            print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+            return 0
+        print(f"REGRESSIONS over {args.threshold:.0%} against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression['case']} at {regression['size']}: "
+                  f"{regression['baseline'] * 1000:.3f} ms -> {regression['current'] * 1000:.3f} ms "
+                  f"({regression['ratio']}x)")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# Parallel metadata scan of composition directories
+# Lists composition files with os.scandir and reads their metadata on a
+# thread or process pool. Results stream back in file name order, and only
+# a bounded number of files is in flight at once. JSON files are read just
+# up to their notes, so memory stays small even for huge melodies.
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from composition_storage import BINARY_EXTENSION, read_binary_header
+
+SCAN_CHUNK_SIZE = 16 * 1024
+NOTES_KEY = '"notes":'
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Files read ahead per worker while earlier results are still being consumed
+READ_AHEAD_PER_WORKER = 4
+
+def read_json_metadata(filepath, chunk_size=SCAN_CHUNK_SIZE):
+    # Read the metadata of a JSON composition without parsing its notes
+    # Saved compositions keep 'note_count' ahead of the notes, so reading
+    # stops at the notes. Older files are counted in chunks instead, and
+    # fields written after the notes are still picked up.
+    # filepath: path of the composition file
+    # chunk_size: characters read at a time
+    # returns: metadata dictionary with 'note_count'
+    with open(filepath, 'r', encoding='utf-8') as f:
+        head = ''
+        while True:
+            chunk = f.read(chunk_size)
+            head += chunk
+            pos = head.find(NOTES_KEY)
+            if pos >= 0 or not chunk:
+                break
+        if pos < 0:
+            # Recipe-only composition without notes
+            return json.loads(head)
+
+        metadata = json.loads(head[:pos].rstrip().rstrip(',') + '}')
+        if 'note_count' in metadata:
+            return metadata
+
+        rest = head[pos + len(NOTES_KEY):]
+        commas = 0
+        has_values = False
+        while True:
+            end = rest.find(']')
+            part = rest if end < 0 else rest[:end]
+            commas += part.count(',')
+            has_values = has_values or bool(part.strip(' \t\r\n['))
+            if end >= 0:
+                break
+            rest = f.read(chunk_size)
+            if not rest:
+                raise ValueError(f"Unterminated notes in {filepath}")
+        metadata['note_count'] = commas + 1 if has_values else 0
+
+        tail = (rest[end + 1:] + f.read()).strip()
+    if tail.startswith(','):
+        metadata.update(json.loads('{' + tail[1:]))
+    return metadata
+
+def read_composition_metadata(filepath):
+    # Read the metadata of a composition file in either storage format
+    # filepath: path of the composition file
+    # returns: metadata dictionary with 'note_count' (no notes)
+    if filepath.endswith(BINARY_EXTENSION):
+        header, _data_offset = read_binary_header(filepath)
+        return {key: value for key, value in header.items() if key not in ('dtype', 'palette')}
+    return read_json_metadata(filepath)
+
+def list_composition_files(directory, extensions):
+    # Composition files of a directory, in file name order
+    # directory: directory to scan
+    # extensions: file extensions that hold compositions
+    # returns: list of os.DirEntry objects
+    extensions = tuple(extensions)
+    with os.scandir(directory) as entries:
+        files = [entry for entry in entries
+                 if entry.name.endswith(extensions) and entry.is_file()]
+    files.sort(key=lambda entry: entry.name)
+    return files
+
+def _call(func, item):
+    # Run one task, returning its error instead of raising it
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+def ordered_map(func, items, workers=None, use_processes=False):
+    # Apply a function to items on a pool, yielding results in input order
+    # func: function(item); must be picklable when use_processes is set
+    # items: iterable of inputs
+    # workers: pool size (1 runs on the calling thread)
+    # use_processes: use a process pool instead of threads
+    # yields: (result, error) pairs, error being None on success
+    workers = workers or DEFAULT_WORKERS
+    if workers == 1:
+        for item in items:
+            yield _call(func, item)
+        return
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        window = deque()
+        for item in items:
+            window.append(executor.submit(_call, func, item))
+            if len(window) >= workers * READ_AHEAD_PER_WORKER:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+def scan_catalog(directory, extensions, read_metadata=read_composition_metadata,
+                 workers=None, use_processes=False):
+    # Stream the metadata of every composition file in a directory
+    # directory: directory to scan
+    # extensions: file extensions that hold compositions
+    # read_metadata: function(filepath) returning metadata
+    # workers: pool size (1 scans sequentially)
+    # use_processes: parse files in worker processes instead of threads
+    # yields: (os.DirEntry, metadata, error) in file name order; metadata is
+    #         None when the file could not be read
+    files = list_composition_files(directory, extensions)
+    results = ordered_map(read_metadata, (entry.path for entry in files), workers, use_processes)
+    for entry, (metadata, error) in zip(files, results):
+        yield entry, metadata, error
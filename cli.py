@@ -0,0 +1,102 @@
+# Command-line tools for composition catalogs
+# Non-interactive companion to main.py for scripting and moving catalogs
+# between machines. Runs without the Windows sound system.
+#
+# Usage:
+#   python -m cli export catalog.jsonl.gz [--only-metadata] [--sequence-type primes]
+#   python -m cli import catalog.jsonl.gz [--format binary] [--batch-size 256]
+#   python -m cli midi midi_files/ [--sequence-type fibonacci]
+#   python -m cli render jobs.json [--workers 16] [--output-dir renders] [--no-save]
+
+import argparse
+import json
+import sys
+
+from batch_render import load_job_spec, run_jobs
+
+from composition import STORAGE_EXTENSIONS, CompositionManager
+
+def build_parser():
+    # Build the command-line argument parser
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Mathematical Melody Generator catalog tools"
+    )
+    parser.add_argument("--directory", default="compositions",
+                        help="composition directory (default: compositions)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export compositions as JSON Lines")
+    export_parser.add_argument("path", help="output file (.gz compresses it)")
+    export_parser.add_argument("--only-metadata", action="store_true",
+                               help="export metadata and note counts without notes")
+    export_parser.add_argument("--sequence-type", help="only export this sequence type")
+    export_parser.add_argument("--scale-type", help="only export this scale")
+
+    import_parser = commands.add_parser("import", help="import compositions from JSON Lines")
+    import_parser.add_argument("path", help="input file (.gz is decompressed)")
+    import_parser.add_argument("--format", choices=sorted(STORAGE_EXTENSIONS), default="json",
+                               help="storage format of the imported files (default: json)")
+    import_parser.add_argument("--batch-size", type=int, default=256,
+                               help="compositions written per batch (default: 256)")
+
+    midi_parser = commands.add_parser("midi", help="export compositions as MIDI files")
+    midi_parser.add_argument("path", help="output directory")
+    midi_parser.add_argument("--sequence-type", help="only export this sequence type")
+    midi_parser.add_argument("--scale-type", help="only export this scale")
+
+    render_parser = commands.add_parser("render", help="generate and render compositions from a job spec")
+    render_parser.add_argument("path", help="JSON job spec")
+    render_parser.add_argument("--workers", type=int, default=None,
+                               help="worker processes (default: CPUs + 4, at most 32)")
+    render_parser.add_argument("--output-dir", default="renders",
+                               help="directory for WAV and MIDI files (default: renders)")
+    render_parser.add_argument("--no-save", action="store_true",
+                               help="render without saving compositions to --directory")
+    return parser
+
+def export_command(args):
+    manager = CompositionManager(args.directory)
+    count = manager.export_jsonl(args.path, only_metadata=args.only_metadata,
+                                 sequence_type=args.sequence_type, scale_type=args.scale_type)
+    return 0 if count is not None else 1
+
+def import_command(args):
+    manager = CompositionManager(args.directory, storage_format=args.format)
+    count = manager.import_jsonl(args.path, batch_size=args.batch_size)
+    return 0 if count is not None else 1
+
+def midi_command(args):
+    manager = CompositionManager(args.directory)
+    count = manager.export_midi(args.path, sequence_type=args.sequence_type,
+                                scale_type=args.scale_type)
+    return 0 if count is not None else 1
+
+def render_command(args):
+    # Prints a JSON summary on stdout; exit code 1 if any job failed, 2 if
+    # the job spec is invalid
+    try:
+        jobs = load_job_spec(args.path)
+    except (OSError, ValueError) as e:
+        print(json.dumps({'error': f"Invalid job spec: {e}"}))
+        return 2
+    save_directory = None if args.no_save else args.directory
+    summary = run_jobs(jobs, args.output_dir, save_directory, args.workers)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary['failed'] == 0 else 1
+
+COMMANDS = {
+    'export': export_command,
+    'import': import_command,
+    'midi': midi_command,
+    'render': render_command,
+}
+
+def main(argv=None):
+    # Run a command
+    # argv: command-line arguments (defaults to sys.argv)
+    # returns: process exit code
+    args = build_parser().parse_args(argv)
+    return COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
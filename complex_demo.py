@@ -2,9 +2,13 @@
 # Creates a full musical composition using multiple mathematical sequences
 # and advanced features to showcase the project's capabilities
 
+import os
 import time
 import threading
 from melody_generator import MelodyGenerator
+from midi_export import MIDI_EXTENSION, save_midi
+from symphony_bundle import BUNDLE_EXTENSION, write_symphony_bundle
+from synthesis import to_pcm16
 from math_sequences import generate_fibonacci, generate_primes, generate_pi_digits, sequence_to_notes
 
 class ComplexComposition:
@@ -27,7 +31,7 @@ class ComplexComposition:
         
         # Create composition
         comp = self.generator.composition_manager.create_composition_from_sequence(
-            f"Fibonacci_Theme_{n}_Notes", "fibonacci", notes, tempo, scale_type, "waltz"
+            f"Fibonacci_Theme_{n}_Notes", "fibonacci", notes, tempo, scale_type, "waltz", n=n
         )
         
         if comp:
@@ -50,7 +54,7 @@ class ComplexComposition:
         # notes
         # Create composition
         comp = self.generator.composition_manager.create_composition_from_sequence(
-            f"Prime_Counterpoint_{n}_Numbers", "primes", notes, tempo, scale_type, "march"
+            f"Prime_Counterpoint_{n}_Numbers", "primes", notes, tempo, scale_type, "march", n=n
         )
         
         if comp:
@@ -72,7 +76,7 @@ class ComplexComposition:
         
         # Create composition
         comp = self.generator.composition_manager.create_composition_from_sequence(
-            f"Pi_Bridge_{n}_Digits", "pi", notes, tempo, scale_type, "simple"
+            f"Pi_Bridge_{n}_Digits", "pi", notes, tempo, scale_type, "simple", n=n
         )
         
         if comp:
@@ -93,7 +97,7 @@ class ComplexComposition:
         
         # Create composition
         comp = self.generator.composition_manager.create_composition_from_sequence(
-            f"Fibonacci_Variation_{n}_Notes", "fibonacci", notes, tempo, scale_type, "march"
+            f"Fibonacci_Variation_{n}_Notes", "fibonacci", notes, tempo, scale_type, "march", n=n
         )
         
         if comp:
@@ -114,7 +118,7 @@ class ComplexComposition:
         
         # Create composition
         comp = self.generator.composition_manager.create_composition_from_sequence(
-            f"Prime_Finale_{n}_Numbers", "primes", notes, tempo, scale_type, "waltz"
+            f"Prime_Finale_{n}_Numbers", "primes", notes, tempo, scale_type, "waltz", n=n
         )
         
         if comp:
@@ -198,15 +202,53 @@ class ComplexComposition:
         
         print("=" * 80)
     
-    def save_symphony(self):
-        # Save all compositions as a complete symphony
+    def save_symphony(self, filename="Mathematical_Symphony", timbre=None):
+        # Save all compositions as a complete symphony in one bundle file
+        # filename: bundle name inside the compositions directory
+        # timbre: if given, also store each movement rendered with additive
+        #         synthesis so players can stream it without re-rendering
+        # returns: path of the bundle file, or None on error
         print("\nSaving Complete Symphony...")
         
+        manager = self.generator.composition_manager
+        audio = self.generator.audio_engine
+        
+        # Make sure queued movement saves are on disk
+        manager.flush()
+        
+        pcm_tracks = None
+        if timbre is not None:
+            pcm_tracks = []
+            for comp in self.compositions:
+                rhythm_pattern = audio.create_rhythm_pattern(comp.rhythm_pattern, len(comp.notes))
+                samples = audio.render_additive(comp.notes, rhythm_pattern, timbre)
+                pcm_tracks.append(to_pcm16(samples))
+        
+        filepath = os.path.join(manager.save_directory, f"{filename}{BUNDLE_EXTENSION}")
+        try:
+            write_symphony_bundle(filepath, filename, self.compositions, pcm_tracks,
+                                  audio.synthesizer.sample_rate)
+        except Exception as e:
+            print(f"Error saving symphony: {e}")
+            return None
+        
         for comp in self.compositions:
             print(f"   {comp.name} saved")
         
-        print(f"\nSymphony saved! You can reload individual movements using the main application.")
+        print(f"\nSymphony saved to {filepath}! You can reload individual movements using the main application.")
         print("   Run 'python main.py' and use option 7 to load compositions.")
+        return filepath
+    
+    def export_symphony_midi(self, filename="Mathematical_Symphony"):
+        # Export all movements as one multi-track MIDI file
+        # filename: file name (without extension) inside the compositions directory
+        # returns: path of the MIDI file, or None on error
+        filepath = os.path.join(self.generator.composition_manager.save_directory,
+                                f"{filename}{MIDI_EXTENSION}")
+        if not save_midi(self.compositions, filepath, title=filename):
+            return None
+        print(f"Symphony exported to {filepath} ({len(self.compositions)} tracks).")
+        return filepath
     
     def interactive_demo(self):
         # Run an interactive demonstration of the symphony creation
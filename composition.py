@@ -1,153 +1,1081 @@
 # Composition management for saving and loading musical compositions
 
+import copy
+import hashlib
 import json
+import logging
 import os
-from datetime import datetime
+import re
+import sys
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-class Composition:
-    def __init__(self, name="Untitled", sequence_type="fibonacci", notes=None, 
-                 tempo=120, scale_type="major", rhythm_pattern="simple"):
-        # Initialize a composition
-        # name: name of the composition
-        # sequence_type: type of mathematical sequence
-        # notes: list of note frequencies
-        # tempo: tempo in BPM
-        # scale_type: musical scale type
-        # rhythm_pattern: rhythm pattern type
-        self.name = name
-        self.sequence_type = sequence_type
-        self.notes = notes or []
-        self.tempo = tempo
-        self.scale_type = scale_type
-        self.rhythm_pattern = rhythm_pattern
-        self.created_date = datetime.now().isoformat()
+import numpy as np
+
+from catalog_scan import read_composition_metadata, scan_catalog
+from composition_cache import DEFAULT_CACHE_BYTES, CompositionCache, detach
+from composition_history import CompositionHistory
+from composition_index import CompositionIndex
+from composition_storage import (
+    BINARY_EXTENSION, atomic_write, mapped_file, open_text, read_binary_composition,
+    read_binary_header, unmap_notes, write_binary_composition
+)
+from math_sequences import (
+    SCALE_BASE_NOTES, generate_sequence, reduce_sequence, reduced_to_notes, sequence_to_notes
+)
+from file_lock import FileLock
+from instrumentation import traced
+from midi_export import MIDI_EXTENSION, composition_to_midi
+from note_blobs import GC_GRACE_SECONDS, NoteBlobStore
+from persistence import WriteBehindQueue
+from rhythm import rhythm_spec
+from score import Score
+from transforms import scale_degrees
+
+JSON_EXTENSION = '.json'
+# Compact compositions store dates as microseconds since this naive epoch
+DATE_EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+STORAGE_EXTENSIONS = {'json': JSON_EXTENSION, 'binary': BINARY_EXTENSION}
+# Index rows fetched at a time when streaming the whole catalog
+CATALOG_PAGE_SIZE = 500
+# File naming schemes: 'name' uses the composition name only, 'unique' adds a
+# creation-stamped id so concurrent writers never replace each other's files
+NAMING_SCHEMES = ('name', 'unique')
+# Where notes are kept: 'inline' in each composition file, or 'blobs' in
+# shared content-addressed note blobs that composition files refer to
+NOTE_STORES = ('inline', 'blobs')
+CROCKFORD_BASE32 = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+def notes_to_list(notes):
+    # Convert notes held in a list, numpy array or lazy view to a plain list
+    if isinstance(notes, list):
+        return notes
+    if hasattr(notes, 'tolist'):
+        return notes.tolist()
+    return [float(note) for note in notes]
+
+def print_report(message, level=logging.INFO):
+    # Default reporter of CompositionManager status messages
+    print(message)
+
+def file_stem(name):
+    # File-name-safe form of a composition name, used for every file named
+    # after one: anything but letters, digits, '.', '-' and '_' becomes '_'
+    # (e.g. the ':' of rhythm specs, which Windows reserves for alternate
+    # data streams)
+    return re.sub(r'[^\w.-]', '_', name)
+
+def composition_id(name, created_date):
+    # ULID-style id of a composition: 48 bits of creation time in
+    # milliseconds followed by 80 bits hashed from the name and the exact
+    # creation date. Ids sort by creation time and stay the same every time
+    # the composition is saved again.
+    # name: composition name
+    # created_date: ISO creation date of the composition
+    # returns: 26-character Crockford base32 string
+    created = datetime.fromisoformat(created_date)
+    milliseconds = max(0, (created - DATE_EPOCH) // timedelta(milliseconds=1))
+    digest = hashlib.blake2b(f"{name}\0{created_date}".encode('utf-8'), digest_size=10).digest()
+    value = (milliseconds % (1 << 48)) << 80 | int.from_bytes(digest, 'big')
+    return ''.join(CROCKFORD_BASE32[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+def notes_checksum(notes):
+    # Checksum of note frequencies, used to verify regenerated recipe notes
+    return f"crc32:{zlib.crc32(np.asarray(notes, dtype='<f8').tobytes()):08x}"
+
+def remapped_notes(comp, scale_type, reduced=None):
+    # Notes of a composition mapped to another scale (the mapping stage only)
+    # reduced: reduced source sequence of recipe notes; without it every
+    #          note is read as the nearest degree of the composition's scale
+    # returns: float64 note array
+    # raises: ValueError for unknown scales
+    if scale_type not in SCALE_BASE_NOTES:
+        raise ValueError(f"Unknown scale type: {scale_type}")
+    if reduced is None:
+        source_scale = comp.scale_type if comp.scale_type in SCALE_BASE_NOTES else 'major'
+        reduced = scale_degrees(np.asarray(comp.notes, dtype=np.float64), source_scale)
+    return reduced_to_notes(reduced, scale_type)
+
+def score_fields(score, voice=None):
+    # Notes, tempo and rhythm pattern of a composition made from a score
+    # The notes are taken in onset order and their durations become the
+    # rhythm pattern; rests between notes are not kept
+    # voice: voice to take (all notes if None)
+    # returns: (note frequencies, tempo, rhythm pattern)
+    if voice is not None:
+        score = score.voice(voice)
+    return score.events['freq'].tolist(), score.tempo, rhythm_spec(score.durations_ms())
+
+class CompositionBase:
+    # Behaviour shared by Composition and CompactComposition: recipe notes,
+    # checksums, scale changes and conversion to dictionaries and scores.
+    # Subclasses decide how notes are held (_wrap_notes, _wrap_derived).
+    __slots__ = ()
+    
+    @classmethod
+    def from_recipe(cls, name, sequence_type, n, scale_type="major", tempo=120,
+                    rhythm_pattern="simple"):
+        # Create a lazy composition whose notes are generated when first used
+        # n: number of sequence values the notes are mapped from
+        recipe = {'sequence_type': sequence_type, 'n': n, 'scale_type': scale_type}
+        return cls(name, sequence_type, None, tempo, scale_type, rhythm_pattern, recipe)
+    
+    @property
+    def notes(self):
+        # Note frequencies, regenerated from the recipe the first time they
+        # are needed
+        if self._notes is None:
+            notes = self._regenerate_notes()
+            if self.checksum is not None and notes_checksum(notes) != self.checksum:
+                raise ValueError(f"Regenerated notes of '{self.name}' do not match their checksum")
+            self._derive_notes(notes)
+        return self._notes
+    
+    @notes.setter
+    def notes(self, value):
+        # Explicit notes are no longer described by the recipe
+        self._notes = self._wrap_notes(value if value is not None else [])
+        self._drop_recipe()
+    
+    @property
+    def notes_loaded(self):
+        # Whether the notes are in memory (False for unused recipes)
+        return self._notes is not None
+    
+    @property
+    def note_count(self):
+        # Number of notes, known without regenerating recipe notes
+        if self._notes is None and self._note_count is not None:
+            return self._note_count
+        return len(self.notes)
+    
+    def reduced_sequence(self):
+        # Source sequence of the recipe, reduced for note mapping
+        # returns: int64 array, or None without a recipe
+        if self.recipe is None:
+            return None
+        recipe = self.recipe
+        return reduce_sequence(generate_sequence(recipe['sequence_type'], recipe['n']))
+    
+    def _regenerate_notes(self):
+        # Run the sequence and mapping engine for the recipe
+        # returns: float64 note array
+        return reduced_to_notes(self.reduced_sequence(), self.recipe.get('scale_type', 'major'))
+    
+    def _derive_notes(self, notes):
+        # Keep notes derived from the recipe, with the checksums that tell
+        # later in-place edits apart: the recipe checksum is of the float64
+        # notes, the notes checksum of the notes as held
+        self.checksum = notes_checksum(notes)
+        self._notes = self._wrap_derived(notes)
+        self._notes_checksum = notes_checksum(self._notes)
+    
+    def _drop_recipe(self):
+        # Forget the recipe once the notes no longer follow from it
+        self.recipe = None
+        self.checksum = None
+        self._notes_checksum = None
+        self._note_count = None
+        self.notes_revision += 1
+    
+    def verify_recipe(self):
+        # Check that loaded notes are still the ones the recipe describes
+        # Notes edited in place (comp.notes[0] = x) no longer match the
+        # checksum taken when they were derived; the recipe is dropped then,
+        # so the edited notes are saved instead of regenerated. Notes that
+        # were loaded or given rather than derived are compared with the
+        # recipe checksum, or with the regenerated notes, once.
+        # returns: True if the composition is described by its recipe
+        if self.recipe is None:
+            return False
+        if self._notes is None:
+            return True
+        checksum = notes_checksum(self._notes)
+        if self._notes_checksum is None:
+            if checksum != self.checksum:
+                regenerated = self._regenerate_notes()
+                if notes_checksum(self._wrap_derived(regenerated)) != checksum:
+                    self._drop_recipe()
+                    return False
+                self.checksum = notes_checksum(regenerated)
+            self._notes_checksum = checksum
+        elif checksum != self._notes_checksum:
+            self._drop_recipe()
+            return False
+        return True
+    
+    def change_scale(self, scale_type):
+        # Re-map the notes to another scale
+        # Recipe notes are re-mapped from the source sequence, or stay
+        # unloaded until used; other notes, including recipe notes edited in
+        # place, are re-mapped degree by degree.
+        # Tempo, rhythm and the sequence stage are untouched.
+        # raises: ValueError for unknown scales
+        if scale_type == self.scale_type:
+            return
+        if self.verify_recipe():
+            if self._notes is not None:
+                self._derive_notes(remapped_notes(self, scale_type, self.reduced_sequence()))
+            elif scale_type not in SCALE_BASE_NOTES:
+                raise ValueError(f"Unknown scale type: {scale_type}")
+            else:
+                self.checksum = None
+            self.recipe = dict(self.recipe, scale_type=scale_type)
+        elif len(self._notes):
+            self._notes = self._wrap_derived(remapped_notes(self, scale_type))
+        self.scale_type = sys.intern(scale_type)
+        self.notes_revision += 1
+    
+    def update(self, **kwargs):
+        # Update composition properties
+        # A new scale_type re-maps the notes (see change_scale) unless new
+        # notes are given as well
+        scale_type = kwargs.pop('scale_type') if 'scale_type' in kwargs and 'notes' not in kwargs else None
+        for key, value in kwargs.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+        if scale_type is not None:
+            self.change_scale(scale_type)
         self.modified_date = datetime.now().isoformat()
     
-    def to_dict(self):
-        # Convert composition to dictionary for saving
-        return {
+    def _metadata_fields(self):
+        # Composition fields other than the notes
+        data = {
             'name': self.name,
             'sequence_type': self.sequence_type,
-            'notes': self.notes,
             'tempo': self.tempo,
             'scale_type': self.scale_type,
             'rhythm_pattern': self.rhythm_pattern,
             'created_date': self.created_date,
             'modified_date': self.modified_date
         }
+        if self.verify_recipe():
+            data['recipe'] = dict(self.recipe)
+            data['checksum'] = self.checksum
+        return data
+    
+    def to_dict(self, include_notes=True):
+        # Convert composition to dictionary for saving
+        # include_notes: False stores only the recipe of derived compositions
+        #                (and the notes if they no longer match it)
+        data = self._metadata_fields()
+        if include_notes or self.recipe is None:
+            data['notes'] = notes_to_list(self.notes)
+        else:
+            data['note_count'] = self.note_count
+        return data
+    
+    def metadata_dict(self):
+        # Composition fields without the notes, plus the note count
+        data = self._metadata_fields()
+        data['note_count'] = self.note_count
+        return data
     
     @classmethod
     def from_dict(cls, data):
         # Create composition from dictionary
+        now = datetime.now().isoformat()
+        recipe = data.get('recipe')
+        notes = data.get('notes')
         comp = cls(
             name=data.get('name', 'Untitled'),
             sequence_type=data.get('sequence_type', 'fibonacci'),
-            notes=data.get('notes', []),
+            notes=notes if notes is not None or recipe is not None else [],
             tempo=data.get('tempo', 120),
             scale_type=data.get('scale_type', 'major'),
-            rhythm_pattern=data.get('rhythm_pattern', 'simple')
+            rhythm_pattern=data.get('rhythm_pattern', 'simple'),
+            recipe=recipe
         )
-        comp.created_date = data.get('created_date', datetime.now().isoformat())
-        comp.modified_date = data.get('modified_date', datetime.now().isoformat())
+        comp.checksum = data.get('checksum')
+        comp._note_count = data.get('note_count')
+        comp.created_date = data.get('created_date', now)
+        comp.modified_date = data.get('modified_date', now)
         return comp
     
-    def update(self, **kwargs):
-        # Update composition properties
-        for key, value in kwargs.items():
-            if hasattr(self, key):
-                setattr(self, key, value)
+    def to_score(self, voice=0, start_ticks=0):
+        # Timeline of the notes as a Score
+        # voice: voice number of the notes
+        # start_ticks: onset of the first note
+        return Score.from_composition(self, voice, start_ticks)
+    
+    @classmethod
+    def from_score(cls, score, name="Untitled", sequence_type="score", scale_type="major",
+                   voice=None):
+        # Create a composition from the notes of a Score
+        # voice: voice to take (all notes if None)
+        notes, tempo, rhythm_pattern = score_fields(score, voice)
+        return cls(name, sequence_type, notes, tempo, scale_type, rhythm_pattern)
+
+class Composition(CompositionBase):
+    def __init__(self, name="Untitled", sequence_type="fibonacci", notes=None, 
+                 tempo=120, scale_type="major", rhythm_pattern="simple",
+                 recipe=None):
+        # Initialize a composition
+        # name: name of the composition
+        # sequence_type: type of mathematical sequence
+        # notes: list of note frequencies
+        # tempo: tempo in BPM
+        # scale_type: musical scale type
+        # rhythm_pattern: rhythm pattern type
+        # recipe: {'sequence_type', 'n', 'scale_type'} the notes are derived
+        #         from; without notes they are regenerated on first access
+        self.name = name
+        self.sequence_type = sequence_type
+        self.recipe = recipe
+        self.checksum = None
+        self._notes_checksum = None
+        self._note_count = None
+        self._notes = notes if notes is not None or recipe is not None else []
+        # Recipe sequence reduced for note mapping, kept so a scale change
+        # re-runs only the mapping stage
+        self._reduced_sequence = None
+        # Bumped whenever the notes change; cached artifacts depend on it
+        self.notes_revision = 0
+        self._artifacts = None
+        self.tempo = tempo
+        self.scale_type = scale_type
+        self.rhythm_pattern = rhythm_pattern
+        self.created_date = datetime.now().isoformat()
         self.modified_date = datetime.now().isoformat()
+    
+    def __getstate__(self):
+        # Cached artifacts are not copied or pickled along
+        state = self.__dict__.copy()
+        state['_artifacts'] = None
+        return state
+    
+    @staticmethod
+    def _wrap_notes(notes):
+        # Explicit notes are kept as given
+        return notes
+    
+    @staticmethod
+    def _wrap_derived(notes):
+        # Notes derived from a sequence are kept as a list
+        return notes.tolist()
+    
+    def _drop_recipe(self):
+        super()._drop_recipe()
+        self._reduced_sequence = None
+    
+    def reduced_sequence(self):
+        # Source sequence of the recipe, reduced for note mapping
+        # returns: int64 array (generated once and kept), or None without a
+        #          recipe
+        if self.recipe is None:
+            return None
+        if self._reduced_sequence is None:
+            recipe = self.recipe
+            sequence = generate_sequence(recipe['sequence_type'], recipe['n'])
+            self._reduced_sequence = reduce_sequence(sequence)
+        return self._reduced_sequence
+    
+    def set_source_sequence(self, sequence):
+        # Keep the sequence the recipe notes were mapped from, so a later
+        # scale change does not generate it again. Only its reduced form is
+        # kept: raw values (e.g. Fibonacci numbers of thousands of digits)
+        # would make every copy and pickle of the composition huge.
+        if self.recipe is not None:
+            self._reduced_sequence = reduce_sequence(sequence)
+    
+    def copy(self):
+        # Shallow copy that does not share a mutable note list
+        # Read-only note arrays (memory maps) are shared instead of copied
+        duplicate = copy.copy(self)
+        if isinstance(self._notes, list):
+            duplicate._notes = list(self._notes)
+        elif isinstance(self._notes, np.ndarray) and self._notes.flags.writeable:
+            duplicate._notes = self._notes.copy()
+        return duplicate
+
+class CompactComposition(CompositionBase):
+    # Memory-lean composition for large in-memory catalogs
+    # Uses __slots__ instead of a per-instance __dict__, keeps notes in a
+    # float32 array (4 bytes per note instead of a float object plus a list
+    # slot), stores dates as integer microseconds and interns the repeated
+    # sequence, scale and rhythm names. Converts to and from the same
+    # dictionaries as Composition; note values are rounded to float32.
+    # Compact compositions keep no source sequence, so scale changes of
+    # recipe notes generate it again.
+    __slots__ = (
+        'name', 'sequence_type', 'tempo', 'scale_type', 'rhythm_pattern',
+        'recipe', 'checksum', 'created_us', 'modified_us', '_notes', '_note_count',
+        'notes_revision', '_artifacts', '_notes_checksum'
+    )
+    
+    def __init__(self, name="Untitled", sequence_type="fibonacci", notes=None,
+                 tempo=120, scale_type="major", rhythm_pattern="simple",
+                 recipe=None):
+        # Initialize a compact composition (same arguments as Composition)
+        self.name = name
+        self.sequence_type = sys.intern(sequence_type)
+        self.tempo = tempo
+        self.scale_type = sys.intern(scale_type)
+        self.rhythm_pattern = sys.intern(rhythm_pattern)
+        self.recipe = recipe
+        self.checksum = None
+        self._notes_checksum = None
+        self._note_count = None
+        self.notes_revision = 0
+        self._artifacts = None
+        self._notes = None
+        if notes is not None or recipe is None:
+            self._notes = self._to_array(notes if notes is not None else [])
+        now = self._to_timestamp(datetime.now().isoformat())
+        self.created_us = now
+        self.modified_us = now
+    
+    def __getstate__(self):
+        # Cached artifacts are not copied or pickled along
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        state['_artifacts'] = None
+        return None, state
+    
+    @staticmethod
+    def _to_array(notes):
+        # Pack note frequencies into a float32 array
+        packed = array('f')
+        packed.frombytes(np.asarray(notes, dtype=np.float32).tobytes())
+        return packed
+    
+    _wrap_notes = _to_array
+    _wrap_derived = _to_array
+    
+    @staticmethod
+    def _to_timestamp(iso_date):
+        # ISO date string to integer microseconds since DATE_EPOCH
+        return (datetime.fromisoformat(iso_date) - DATE_EPOCH) // ONE_MICROSECOND
+    
+    @staticmethod
+    def _to_iso(timestamp):
+        # Integer microseconds since DATE_EPOCH to an ISO date string
+        return (DATE_EPOCH + timestamp * ONE_MICROSECOND).isoformat()
+    
+    @property
+    def created_date(self):
+        return self._to_iso(self.created_us)
+    
+    @created_date.setter
+    def created_date(self, value):
+        self.created_us = self._to_timestamp(value)
+    
+    @property
+    def modified_date(self):
+        return self._to_iso(self.modified_us)
+    
+    @modified_date.setter
+    def modified_date(self, value):
+        self.modified_us = self._to_timestamp(value)
+    
+    def copy(self):
+        # Copy that does not share the note array
+        duplicate = CompactComposition.__new__(CompactComposition)
+        for slot in self.__slots__:
+            setattr(duplicate, slot, getattr(self, slot))
+        if self._notes is not None:
+            duplicate._notes = array('f', self._notes)
+        duplicate._artifacts = None
+        return duplicate
+    
+    @classmethod
+    def from_composition(cls, comp):
+        # Convert a regular composition without regenerating recipe notes
+        return cls.from_dict(comp.to_dict(include_notes=comp.notes_loaded))
+    
+    def to_composition(self):
+        # Convert back to a regular composition
+        return Composition.from_dict(self.to_dict(include_notes=self.notes_loaded))
 
 class CompositionManager:
-    def __init__(self, save_directory="compositions"):
+    def __init__(self, save_directory="compositions", storage_format="json",
+                 cache_bytes=DEFAULT_CACHE_BYTES, write_behind=False,
+                 store_recipes=False, composition_class=None, naming='name',
+                 note_store='inline', keep_history=False, report=print_report):
         # Initialize the composition manager
         # save_directory: directory to save compositions
+        # storage_format: 'json' or 'binary' (compact, memory-mapped on load)
+        # cache_bytes: memory budget of the loaded composition cache
+        # write_behind: queue saves for a background writer (see flush())
+        # store_recipes: save sequence-derived compositions as their recipe
+        #                and checksum instead of their notes
+        # composition_class: class of loaded compositions (Composition, or
+        #                    CompactComposition for large in-memory catalogs)
+        # naming: 'name' (file named after the composition) or 'unique' (a
+        #         creation-stamped id is added, for many concurrent writers)
+        # note_store: 'inline' or 'blobs' (identical melodies stored once,
+        #             delta-compressed; see collect_garbage())
+        # keep_history: keep every saved revision (see list_versions())
+        # report: function(message, level=logging.INFO) receiving status
+        #         messages such as "saved successfully" and warnings (at
+        #         logging.WARNING); None discards them. Errors are always
+        #         printed.
+        if storage_format not in STORAGE_EXTENSIONS:
+            raise ValueError(f"Unknown storage format: {storage_format}")
+        if naming not in NAMING_SCHEMES:
+            raise ValueError(f"Unknown naming scheme: {naming}")
+        if note_store not in NOTE_STORES:
+            raise ValueError(f"Unknown note store: {note_store}")
+        self.naming = naming
+        self.note_store = note_store
+        self.keep_history = keep_history
+        self.report = report or (lambda message, level=logging.INFO: None)
         self.save_directory = save_directory
-        self.compositions = {}
+        self.storage_format = storage_format
+        self.store_recipes = store_recipes
+        self.composition_class = composition_class or Composition
+        self.compositions = CompositionCache(cache_bytes)
         self.ensure_save_directory()
+        self.index = CompositionIndex(save_directory, STORAGE_EXTENSIONS.values())
+        self.blobs = NoteBlobStore(save_directory)
+        self.history = CompositionHistory(save_directory)
+        self.writer = None
+        if write_behind:
+            self.start_write_behind()
+    
+    def storage_options(self):
+        # Constructor arguments that decide how files are written, for
+        # creating an equivalent manager in another process
+        return {
+            'storage_format': self.storage_format,
+            'store_recipes': self.store_recipes,
+            'naming': self.naming,
+            'note_store': self.note_store,
+            'keep_history': self.keep_history,
+        }
     
     def ensure_save_directory(self):
         # Ensure the save directory exists
         if not os.path.exists(self.save_directory):
             os.makedirs(self.save_directory)
     
+    def composition_filename(self, name, storage_format=None, created_date=None):
+        # File name used for a composition name
+        # name: composition name
+        # storage_format: storage format (defaults to the manager's format)
+        # created_date: creation date, required with unique naming
+        extension = STORAGE_EXTENSIONS[storage_format or self.storage_format]
+        if self.naming == 'unique':
+            return f"{file_stem(name)}_{composition_id(name, created_date)}{extension}"
+        return f"{file_stem(name)}{extension}"
+    
+    def _file_lock(self, filename, shared=False):
+        # Advisory lock on a composition file, shared between processes
+        return FileLock(self.save_directory, filename, shared)
+    
+    def start_write_behind(self, batch_size=64, batch_delay=0.05):
+        # Queue future saves for a background writer instead of writing them
+        # synchronously; flush() waits until everything queued is on disk
+        # batch_size: maximum number of compositions written per batch
+        # batch_delay: seconds to wait for more saves before writing a batch
+        if self.writer is None:
+            self.writer = WriteBehindQueue(self._write_compositions, batch_size, batch_delay)
+    
+    def stop_write_behind(self):
+        # Write everything queued and go back to synchronous saves
+        # returns: True if every queued save succeeded
+        if self.writer is None:
+            return True
+        errors = self.writer.close()
+        self.writer = None
+        return not errors
+    
+    def flush(self):
+        # Wait until every queued save has been written
+        # returns: True if every queued save succeeded
+        if self.writer is None:
+            return True
+        return not self.writer.flush()
+    
+    @contextmanager
+    def write_behind(self, batch_size=64, batch_delay=0.05):
+        # Context manager that queues saves inside the block and writes them
+        # all before the block exits
+        # raises: RuntimeError if a queued save failed (each failure has
+        #         been reported by the writer)
+        already_active = self.writer is not None
+        self.start_write_behind(batch_size, batch_delay)
+        try:
+            yield self
+        finally:
+            succeeded = self.flush() if already_active else self.stop_write_behind()
+        if not succeeded:
+            raise RuntimeError("Some queued compositions could not be saved")
+    
+    def _write_composition_file(self, filepath, comp):
+        # Atomically write one composition file in the manager's format
+        recipe_only = self.store_recipes and comp.verify_recipe()
+        if self.note_store == 'blobs' and not recipe_only:
+            # The file only refers to the shared, content-addressed notes
+            metadata = comp.metadata_dict()
+            metadata['notes_blob'] = self.blobs.put(comp.notes, comp.scale_type)
+            if filepath.endswith(BINARY_EXTENSION):
+                atomic_write(
+                    filepath, lambda f: write_binary_composition(f, metadata, None), binary=True
+                )
+            else:
+                atomic_write(filepath, lambda f: json.dump(metadata, f, indent=2))
+        elif filepath.endswith(BINARY_EXTENSION):
+            notes = None if recipe_only else comp.notes
+            atomic_write(
+                filepath,
+                lambda f: write_binary_composition(f, comp.metadata_dict(), notes),
+                binary=True
+            )
+        else:
+            data = comp.to_dict(include_notes=not recipe_only)
+            if 'notes' in data:
+                # The count ahead of the notes lets catalog scans stop there
+                notes = data.pop('notes')
+                data['note_count'] = len(notes)
+                data['notes'] = notes
+            atomic_write(filepath, lambda f: json.dump(data, f, indent=2))
+    
+    def _warn_if_replacing(self, filepath, comp):
+        # Warn when a save replaces a different composition of the same name,
+        # e.g. one saved by another process
+        try:
+            existing = read_composition_metadata(filepath)
+        except (OSError, ValueError):
+            return
+        if existing.get('created_date') not in (None, comp.created_date):
+            self.report(f"Warning: '{comp.name}' replaces a different composition saved "
+                        f"as {os.path.basename(filepath)} (use naming='unique' to keep both)",
+                        logging.WARNING)
+    
+    def _release_file(self, filename, comp):
+        # Stop using the current file before it is written over: notes the
+        # composition has memory-mapped from it are read into memory, and the
+        # cached composition of the file is dropped
+        filepath = os.path.realpath(os.path.join(self.save_directory, filename))
+        notes = getattr(comp, '_notes', None)
+        if notes is not None and mapped_file(notes) == filepath:
+            comp._notes = unmap_notes(notes)
+        self.compositions.invalidate(filename)
+    
+    @traced(category='storage')
+    def _write_compositions(self, batch):
+        # Write a batch of compositions and update the index and cache
+        # batch: list of (filename, composition) pairs
+        # returns: list of (filename, exception) failures
+        directory_mtime = self.index.directory_mtime()
+        written = []
+        failures = []
+        for filename, comp in batch:
+            filepath = os.path.join(self.save_directory, filename)
+            try:
+                with self._file_lock(filename):
+                    if self.naming == 'name':
+                        self._warn_if_replacing(filepath, comp)
+                    self._release_file(filename, comp)
+                    self._write_composition_file(filepath, comp)
+                    stat_result = os.stat(filepath)
+                    if self.keep_history:
+                        self.history.record(filename, comp.to_dict())
+                self.compositions.put(filename, stat_result, comp)
+                written.append((filename, comp.metadata_dict()))
+            except Exception as e:
+                failures.append((filename, e))
+        if written:
+            try:
+                self.index.record_saved_many(written, directory_mtime)
+            except Exception as e:
+                # The files are saved; the index catches up on its next sync
+                print(f"Error updating the composition index: {e}")
+                self.index.mark_stale()
+        return failures
+    
+    @traced(category='storage')
     def save_composition(self, comp):
         # Save a composition to file
+        # Files are replaced atomically, so a crash never leaves a truncated
+        # composition behind. With write-behind enabled the save is queued.
         # comp: composition to save
-        # returns: True if successful, False otherwise
+        # returns: True if successful (or queued), False otherwise
         try:
-            filename = f"{comp.name.replace(' ', '_')}.json"
-            filepath = os.path.join(self.save_directory, filename)
+            filename = self.composition_filename(comp.name, created_date=comp.created_date)
             
             # Update modified date
             comp.modified_date = datetime.now().isoformat()
+            # Notes loaded from the file being replaced must not stay mapped
+            self._release_file(filename, comp)
             
-            with open(filepath, 'w') as f:
-                json.dump(comp.to_dict(), f, indent=2)
+            if self.writer is not None:
+                self.writer.submit(filename, detach(comp))
+                self.report(f"Composition '{comp.name}' queued for saving.")
+                return True
             
-            self.compositions[comp.name] = comp
-            print(f"Composition '{comp.name}' saved successfully.")
+            failures = self._write_compositions([(filename, comp)])
+            if failures:
+                raise failures[0][1]
+            self.report(f"Composition '{comp.name}' saved successfully.")
             return True
             
         except Exception as e:
             print(f"Error saving composition: {e}")
             return False
     
+    @traced(category='storage')
     def load_composition(self, filename):
         # Load a composition from file
         # filename: name of the file to load
         # returns: loaded composition or None if failed
         try:
+            if self.writer is not None:
+                # Read your own writes before the background writer gets to them
+                pending = self.writer.lookup(filename)
+                if pending is not None:
+                    self.report(f"Composition '{pending.name}' loaded successfully.")
+                    return detach(pending)
+            
             filepath = os.path.join(self.save_directory, filename)
             
-            if not os.path.exists(filepath):
+            # A shared lock keeps concurrent saves and deletes of the file out
+            # while it is read; a file deleted meanwhile is simply not found
+            composition = None
+            with self._file_lock(filename, shared=True):
+                try:
+                    stat_result = os.stat(filepath)
+                except FileNotFoundError:
+                    stat_result = None
+                if stat_result is not None:
+                    composition = self.compositions.get(filename, stat_result)
+                    if composition is None:
+                        data = self._read_composition_file(filepath)
+                        composition = self.composition_class.from_dict(data)
+                        self.compositions.put(filename, stat_result, composition)
+            
+            if composition is None:
+                self.compositions.invalidate(filename)
                 print(f"File '{filename}' not found.")
                 return None
-            
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            composition = Composition.from_dict(data)
-            self.compositions[composition.name] = composition
-            print(f"Composition '{composition.name}' loaded successfully.")
+            self.report(f"Composition '{composition.name}' loaded successfully.")
             return composition
             
         except Exception as e:
             print(f"Error loading composition: {e}")
             return None
     
-    def list_compositions(self):
-        # List all available compositions
-        compositions = []
+    @traced(category='storage')
+    def _read_composition_file(self, filepath):
+        # Read a composition file of either format into a dictionary
+        # Binary files only read their header; notes are memory-mapped
+        if filepath.endswith(BINARY_EXTENSION):
+            data = read_binary_composition(filepath)
+        else:
+            with open(filepath, 'r') as f:
+                data = json.load(f)
+        if 'notes_blob' in data and 'notes' not in data:
+            data['notes'] = self.blobs.get(data['notes_blob'])
+        return data
+    
+    @traced(category='storage')
+    def _sync_index(self, refresh=False, workers=None):
+        # Bring the metadata index up to date with the save directory
+        # returns: False if there is no save directory yet
+        if not os.path.exists(self.save_directory):
+            return False
         
+        if self.writer is not None and self.writer.has_pending():
+            self.writer.flush()
+        self.index.reconcile(read_composition_metadata, force=refresh, workers=workers)
+        return True
+    
+    def list_compositions(self, refresh=False, workers=None):
+        # List all available compositions from the metadata index
+        # refresh: rescan every file instead of trusting the directory mtime
+        # workers: number of threads reading changed files
+        # returns: list of metadata dictionaries with 'filename' and
+        #          'note_count' (notes are not loaded)
+        if not self._sync_index(refresh, workers):
+            return []
+        return self.index.list_entries()
+    
+    @traced(category='storage')
+    def query(self, sequence_type=None, scale_type=None, tempo_range=None, min_notes=None,
+              max_notes=None, created_after=None, created_before=None, name_contains=None,
+              name=None, order_by='filename', limit=None, offset=0):
+        # Find compositions by their metadata without opening any files
+        # sequence_type: only this sequence type
+        # scale_type: only this scale
+        # tempo_range: (lowest, highest) tempo, either may be None
+        # min_notes, max_notes: bounds on the number of notes
+        # created_after, created_before: datetime or ISO date string bounds
+        # name_contains: text the name must contain (case-insensitive)
+        # name: exact composition name
+        # order_by: metadata column, prefixed with '-' for descending order
+        # limit: page size (None for all matches)
+        # offset: number of matches to skip, for the following pages
+        # returns: list of metadata dictionaries with 'filename' and 'note_count'
+        if not self._sync_index():
+            return []
+        return self.index.query(order_by, limit, offset, **self._query_filters(locals()))
+    
+    def count_compositions(self, sequence_type=None, scale_type=None, tempo_range=None,
+                           min_notes=None, max_notes=None, created_after=None,
+                           created_before=None, name_contains=None, name=None):
+        # Number of compositions matching the filters of query()
+        if not self._sync_index():
+            return 0
+        return self.index.count(**self._query_filters(locals()))
+    
+    def _query_filters(self, arguments):
+        # Collect the filter arguments of query() for the index
+        filters = {key: arguments[key] for key in (
+            'sequence_type', 'scale_type', 'tempo_range', 'min_notes', 'max_notes',
+            'created_after', 'created_before', 'name_contains', 'name'
+        )}
+        for key in ('created_after', 'created_before'):
+            if isinstance(filters[key], datetime):
+                filters[key] = filters[key].isoformat()
+        return filters
+    
+    def scan_compositions(self, workers=None, use_processes=False):
+        # Stream the metadata of every composition file without the index
+        # Files are parsed on a thread or process pool and only up to their
+        # notes, so this suits huge directories and one-off scans
+        # workers: pool size (1 scans sequentially)
+        # use_processes: parse files in worker processes instead of threads
+        # yields: metadata dictionaries with 'filename', in file name order
         if not os.path.exists(self.save_directory):
-            return compositions
+            return
         
-        for fname in os.listdir(self.save_directory):
-            if fname.endswith('.json'):
+        if self.writer is not None and self.writer.has_pending():
+            self.writer.flush()
+        scan = scan_catalog(self.save_directory, STORAGE_EXTENSIONS.values(),
+                            workers=workers, use_processes=use_processes)
+        for entry, metadata, error in scan:
+            if error is not None:
+                print(f"Error reading {entry.name}: {error}")
+                continue
+            metadata['filename'] = entry.name
+            yield metadata
+    
+    def _iter_catalog(self, **filters):
+        # Stream index entries page by page, so memory stays constant
+        # filters: query() filters
+        offset = 0
+        while True:
+            page = self.query(limit=CATALOG_PAGE_SIZE, offset=offset, **filters)
+            yield from page
+            if len(page) < CATALOG_PAGE_SIZE:
+                return
+            offset += len(page)
+    
+    @traced(category='storage')
+    def export_jsonl(self, filepath, only_metadata=False, compress=None, **filters):
+        # Export compositions as JSON Lines, one composition per line
+        # filepath: output file; a '.gz' extension compresses it
+        # only_metadata: write index metadata (with note counts) instead of
+        #   whole compositions, e.g. to build a catalog elsewhere
+        # compress: force gzip on or off instead of going by the extension
+        # filters: optional query() filters selecting what to export
+        # returns: number of compositions exported, or None on error
+        try:
+            count = 0
+            with open_text(filepath, 'w', compress) as f:
+                for entry in self._iter_catalog(**filters):
+                    if only_metadata:
+                        data = entry
+                    else:
+                        try:
+                            data = self._read_composition_file(
+                                os.path.join(self.save_directory, entry['filename'])
+                            )
+                        except Exception as e:
+                            print(f"Error reading {entry['filename']}: {e}")
+                            continue
+                        if 'notes' in data:
+                            data['notes'] = notes_to_list(data['notes'])
+                    f.write(json.dumps(data))
+                    f.write('\n')
+                    count += 1
+            self.report(f"Exported {count} compositions to {filepath}.")
+            return count
+            
+        except Exception as e:
+            print(f"Error exporting compositions: {e}")
+            return None
+    
+    @traced(category='storage')
+    def import_jsonl(self, filepath, batch_size=256, compress=None):
+        # Import compositions from JSON Lines written by export_jsonl
+        # Lines are read one at a time and written in batches, each batch
+        # updating the index in a single transaction
+        # filepath: input file; a '.gz' extension means it is compressed
+        # batch_size: compositions written per batch
+        # compress: force gzip on or off instead of going by the extension
+        # returns: number of compositions imported, or None on error
+        try:
+            if self.writer is not None:
+                self.writer.flush()
+            os.makedirs(self.save_directory, exist_ok=True)
+            
+            imported = 0
+            skipped = 0
+            batch = []
+            
+            def write_batch():
+                failures = self._write_compositions(batch)
+                for filename, error in failures:
+                    print(f"Error saving composition file '{filename}': {error}")
+                batch.clear()
+                return len(failures)
+            
+            with open_text(filepath, 'r', compress) as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError as e:
+                        print(f"Error reading line {line_number}: {e}")
+                        skipped += 1
+                        continue
+                    if data.get('notes') is None and data.get('recipe') is None:
+                        # Metadata-only lines cannot be turned into compositions
+                        skipped += 1
+                        continue
+                    comp = self.composition_class.from_dict(data)
+                    batch.append((self.composition_filename(comp.name, created_date=comp.created_date), comp))
+                    imported += 1
+                    if len(batch) >= batch_size:
+                        imported -= write_batch()
+            if batch:
+                imported -= write_batch()
+            
+            message = f"Imported {imported} compositions from {filepath}."
+            if skipped:
+                message += f" Skipped {skipped} lines without notes."
+            self.report(message)
+            return imported
+            
+        except Exception as e:
+            print(f"Error importing compositions: {e}")
+            return None
+    
+    @traced(category='storage')
+    def export_midi(self, directory, **filters):
+        # Export saved compositions as Standard MIDI Files, one per composition
+        # directory: output directory
+        # filters: optional query() filters selecting what to export
+        # returns: number of files written, or None on error
+        try:
+            os.makedirs(directory, exist_ok=True)
+            count = 0
+            for entry in self._iter_catalog(**filters):
                 try:
-                    filepath = os.path.join(self.save_directory, fname)
-                    with open(filepath, 'r') as f:
-                        data = json.load(f)
-                    compositions.append(data)
+                    data = self._read_composition_file(
+                        os.path.join(self.save_directory, entry['filename'])
+                    )
+                    comp = Composition.from_dict(data)
+                    midi_name = os.path.splitext(entry['filename'])[0] + MIDI_EXTENSION
+                    with open(os.path.join(directory, midi_name), 'wb') as f:
+                        f.write(composition_to_midi(comp))
+                    count += 1
                 except Exception as e:
-                    print(f"Error reading {fname}: {e}")
-        
-        return compositions
+                    print(f"Error exporting {entry['filename']}: {e}")
+            self.report(f"Exported {count} compositions as MIDI files to {directory}.")
+            return count
+            
+        except Exception as e:
+            print(f"Error exporting MIDI files: {e}")
+            return None
+    
+    def list_versions(self, filename):
+        # Saved revisions of a composition (needs keep_history)
+        # filename: name of the composition file
+        # returns: list of dictionaries with 'version' and 'saved_date', oldest first
+        return self.history.versions(filename)
+    
+    def load_version(self, filename, version=None):
+        # Load an earlier revision of a composition
+        # filename: name of the composition file
+        # version: version number from list_versions() (None for the latest)
+        # returns: the composition as it was saved, or None if not found
+        try:
+            label = "latest version" if version is None else f"version {version}"
+            data = self.history.load(filename, version)
+            if data is None:
+                print(f"No {label} of '{filename}' found.")
+                return None
+            composition = self.composition_class.from_dict(data)
+            self.report(f"Composition '{composition.name}' ({label}) loaded successfully.")
+            return composition
+            
+        except Exception as e:
+            print(f"Error loading composition version: {e}")
+            return None
     
+    @traced(category='storage')
+    def collect_garbage(self, grace_seconds=GC_GRACE_SECONDS):
+        # Remove note blobs no composition file refers to any more
+        # grace_seconds: keep unreferenced blobs younger than this, which
+        #   another process may be about to refer to
+        # returns: number of blobs removed, or None on error
+        try:
+            self.flush()
+            referenced = set()
+            for entry, metadata, error in scan_catalog(self.save_directory,
+                                                       STORAGE_EXTENSIONS.values()):
+                if error is not None:
+                    # Never remove blobs a file we could not read may refer to
+                    raise ValueError(f"cannot read {entry.name}: {error}")
+                if metadata.get('notes_blob'):
+                    referenced.add(metadata['notes_blob'])
+            removed = self.blobs.collect_garbage(referenced, grace_seconds)
+            self.report(f"Removed {removed} unused note blobs.")
+            return removed
+            
+        except Exception as e:
+            print(f"Error collecting note blobs: {e}")
+            return None
+    
+    def cache_stats(self):
+        # Statistics of the loaded composition cache
+        # returns: dictionary with hits, misses, evictions and memory usage
+        return self.compositions.stats()
+    
+    @traced(category='storage')
     def delete_composition(self, name):
         # Delete a composition
-        # name: name of the composition to delete
+        # name: name of the composition to delete (with unique naming, every
+        #       saved composition of that name)
         # returns: True if successful, False otherwise
         try:
-            fname = f"{name.replace(' ', '_')}.json"
-            filepath = os.path.join(self.save_directory, fname)
-            
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                if name in self.compositions:
-                    del self.compositions[name]
-                print(f"Composition '{name}' deleted successfully.")
+            discarded = False
+            if self.naming == 'unique':
+                # File names carry ids, so find every file of this name in the
+                # index once queued saves are on disk
+                self.flush()
+                self._sync_index()
+                filenames = [entry['filename'] for entry in self.index.query(name=name)]
+            else:
+                filenames = [self.composition_filename(name, fmt) for fmt in STORAGE_EXTENSIONS]
+                # Saves still waiting in the write-behind queue are dropped first
+                if self.writer is not None:
+                    for filename in filenames:
+                        discarded = self.writer.discard(filename) or discarded
+            
+            removed = False
+            for filename in filenames:
+                # Readers holding the lock finish before the file goes away
+                with self._file_lock(filename):
+                    directory_mtime = self.index.directory_mtime()
+                    try:
+                        os.remove(os.path.join(self.save_directory, filename))
+                    except FileNotFoundError:
+                        # Already deleted, possibly by another process
+                        continue
+                self.compositions.invalidate(filename)
+                self.index.record_deleted(filename, directory_mtime)
+                self.history.remove(filename)
+                removed = True
+            
+            if removed or discarded:
+                self.report(f"Composition '{name}' deleted successfully.")
                 return True
             else:
                 print(f"Composition '{name}' not found.")
@@ -159,7 +1087,7 @@ class CompositionManager:
     
     def create_composition_from_sequence(self, name, sequence_type, notes, 
                                        tempo=120, scale_type="major", 
-                                       rhythm_pattern="simple"):
+                                       rhythm_pattern="simple", n=None, sequence=None):
         # Create and save a new composition from a mathematical sequence
         # name: name of the composition
         # sequence_type: type of mathematical sequence
@@ -167,15 +1095,28 @@ class CompositionManager:
         # tempo: tempo in BPM
         # scale_type: musical scale type
         # rhythm_pattern: rhythm pattern type
+        # n: number of sequence values the notes were mapped from; records a
+        #    recipe so the notes can be regenerated instead of stored
+        # sequence: the n sequence values, kept so a scale change re-maps
+        #           them without generating the sequence again
         # returns: created composition
+        recipe = None
+        if n is not None:
+            recipe = {'sequence_type': sequence_type, 'n': n, 'scale_type': scale_type}
         composition = Composition(
             name=name,
             sequence_type=sequence_type,
             notes=notes,
             tempo=tempo,
             scale_type=scale_type,
-            rhythm_pattern=rhythm_pattern
+            rhythm_pattern=rhythm_pattern,
+            recipe=recipe
         )
+        if recipe is not None and notes is not None:
+            # Later in-place edits of the notes are told apart by this
+            composition.checksum = composition._notes_checksum = notes_checksum(notes)
+        if sequence is not None:
+            composition.set_source_sequence(sequence)
         
         if self.save_composition(composition):
             return composition
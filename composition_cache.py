@@ -0,0 +1,129 @@
+# In-memory LRU cache of loaded compositions
+# Entries are keyed by file name and remember the file's mtime and size, so a
+# cached composition is only served while the file on disk is unchanged. The
+# cache is bounded by an estimate of the memory its compositions use.
+
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+ENTRY_OVERHEAD_BYTES = 1024  # metadata strings, dates and bookkeeping
+FLOAT_OBJECT_BYTES = sys.getsizeof(1.0)
+
+def estimate_notes_size(notes):
+    # Estimate the memory held by a composition's notes
+    # notes: list, numpy array, array.array or lazy memory-mapped view
+    # returns: size in bytes
+    if isinstance(notes, list):
+        return sys.getsizeof(notes) + FLOAT_OBJECT_BYTES * len(notes)
+    if isinstance(notes, np.memmap):
+        # Backed by the file and paged in by the OS on demand
+        return 0
+    if isinstance(notes, np.ndarray):
+        return notes.nbytes
+    if isinstance(notes, array):
+        return sys.getsizeof(notes)
+    palette = getattr(notes, 'palette', None)
+    if palette is not None:
+        return palette.nbytes
+    return FLOAT_OBJECT_BYTES * len(notes)
+
+def detach(comp):
+    # Copy a composition so callers and the cache never share mutable notes
+    return comp.copy()
+
+class CompositionCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        # Initialize the cache
+        # max_bytes: memory budget for cached compositions
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # filename -> (mtime_ns, size, comp, nbytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, filename):
+        return filename in self.entries
+
+    def _remove(self, filename):
+        _mtime_ns, _size, _comp, nbytes = self.entries.pop(filename)
+        self.current_bytes -= nbytes
+
+    def get(self, filename, stat_result):
+        # Look up a composition whose file has the given stat result
+        # filename: file name inside the save directory
+        # stat_result: os.stat() of the file as it is now
+        # returns: copy of the cached composition, or None on a miss
+        with self.lock:
+            entry = self.entries.get(filename)
+            if entry is not None and entry[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+                self.entries.move_to_end(filename)
+                self.hits += 1
+                return detach(entry[2])
+            if entry is not None:
+                # The file was changed since it was cached
+                self._remove(filename)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, filename, stat_result, comp):
+        # Cache a composition matching a file's current stat result
+        # filename: file name inside the save directory
+        # stat_result: os.stat() of the file the composition was read from
+        # comp: composition to cache (a private copy is kept)
+        nbytes = ENTRY_OVERHEAD_BYTES
+        if comp.notes_loaded:
+            nbytes += estimate_notes_size(comp.notes)
+        with self.lock:
+            if filename in self.entries:
+                self._remove(filename)
+            if nbytes > self.max_bytes:
+                return
+            self.entries[filename] = (
+                stat_result.st_mtime_ns, stat_result.st_size, detach(comp), nbytes
+            )
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, filename):
+        # Drop a cached composition, e.g. after its file was deleted
+        with self.lock:
+            if filename in self.entries:
+                self._remove(filename)
+                self.invalidations += 1
+
+    def clear(self):
+        # Drop every cached composition
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        # Cache statistics
+        # returns: dictionary with hit/miss counts and memory usage
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,208 @@
+# Version history of saved compositions
+# Every save appends a revision to the composition's history. A revision is
+# stored as a delta against its parent - the changed metadata fields plus
+# patches replacing ranges of notes - and a full snapshot is taken whenever
+# the chain of deltas grows long or the deltas outgrow the snapshot. Each
+# snapshot starts a new segment file, so reading any version reads at most
+# one segment. Snapshot notes are kept in the compact note blob encoding.
+
+import base64
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from note_blobs import decode_note_blob, encode_note_blob
+
+HISTORY_DIRECTORY = '.history'
+SEGMENT_EXTENSION = '.jsonl'
+# Longest chain of deltas after a snapshot
+MAX_DELTA_CHAIN = 32
+# A new snapshot is also taken once the deltas of a segment add up to this
+# many times the size of its snapshot, bounding the bytes read per version
+MAX_DELTA_RATIO = 4
+
+def diff_compositions(parent, child):
+    # Delta turning one composition dictionary into another
+    # parent, child: dictionaries in the Composition.to_dict layout
+    # returns: delta dictionary with 'set', 'unset' and 'patches'
+    delta = {}
+    changed = {key: value for key, value in child.items()
+               if key != 'notes' and parent.get(key) != value}
+    if changed:
+        delta['set'] = changed
+    removed = [key for key in parent if key not in child]
+    if removed:
+        delta['unset'] = removed
+
+    old_notes = parent.get('notes') or []
+    new_notes = child.get('notes') or []
+    if old_notes != new_notes:
+        delta['patches'] = note_patches(old_notes, new_notes)
+    return delta
+
+def note_patches(old_notes, new_notes):
+    # Patches turning one note list into another, found in linear time
+    # Notes of the same length are compared element by element and every
+    # run of changed notes becomes a patch; otherwise the common prefix and
+    # suffix are trimmed and the rest is replaced by one patch. (A general
+    # sequence diff is quadratic on melodies with few distinct notes.)
+    # returns: list of [start, stop, replacement notes] in parent positions
+    old = np.asarray(old_notes, dtype=np.float64)
+    new = np.asarray(new_notes, dtype=np.float64)
+    if len(old) == len(new):
+        changed = np.flatnonzero(old != new)
+        if not len(changed):
+            return []
+        breaks = np.flatnonzero(np.diff(changed) > 1) + 1
+        starts = changed[np.concatenate(([0], breaks))]
+        stops = changed[np.concatenate((breaks - 1, [len(changed) - 1]))] + 1
+        return [[int(start), int(stop), list(new_notes[start:stop])]
+                for start, stop in zip(starts, stops)]
+    shortest = min(len(old), len(new))
+    differs = np.flatnonzero(old[:shortest] != new[:shortest])
+    prefix = int(differs[0]) if len(differs) else shortest
+    tail = shortest - prefix
+    differs = np.flatnonzero(old[len(old) - tail:][::-1] != new[len(new) - tail:][::-1])
+    suffix = int(differs[0]) if len(differs) else tail
+    return [[prefix, len(old) - suffix, list(new_notes[prefix:len(new_notes) - suffix])]]
+
+def apply_delta(parent, delta):
+    # Apply a delta from diff_compositions
+    # parent: dictionary in the Composition.to_dict layout (not modified)
+    # delta: delta dictionary
+    # returns: the child dictionary
+    child = {key: value for key, value in parent.items() if key not in delta.get('unset', ())}
+    child.update(delta.get('set', {}))
+    patches = delta.get('patches')
+    if patches:
+        notes = list(parent.get('notes') or [])
+        # Patch positions refer to the parent, so apply them back to front
+        for start, stop, replacement in reversed(patches):
+            notes[start:stop] = replacement
+        child['notes'] = notes
+    return child
+
+def encode_snapshot(data):
+    # Composition dictionary with its notes packed as a note blob
+    snapshot = {key: value for key, value in data.items() if key != 'notes'}
+    if 'notes' in data:
+        blob = encode_note_blob(data['notes'], data.get('scale_type'))
+        snapshot['notes_blob_data'] = base64.b64encode(blob).decode('ascii')
+    return snapshot
+
+def decode_snapshot(snapshot):
+    # Inverse of encode_snapshot
+    data = {key: value for key, value in snapshot.items() if key != 'notes_blob_data'}
+    if 'notes_blob_data' in snapshot:
+        data['notes'] = decode_note_blob(base64.b64decode(snapshot['notes_blob_data'])).tolist()
+    return data
+
+class CompositionHistory:
+    def __init__(self, save_directory):
+        # History store inside a composition save directory
+        # save_directory: directory holding the composition files
+        self.directory = os.path.join(save_directory, HISTORY_DIRECTORY)
+
+    def _segments(self, filename):
+        # Segment files of a composition as (first version, path), oldest first
+        directory = os.path.join(self.directory, filename)
+        if not os.path.isdir(directory):
+            return []
+        segments = [
+            (int(name[:-len(SEGMENT_EXTENSION)]), os.path.join(directory, name))
+            for name in os.listdir(directory) if name.endswith(SEGMENT_EXTENSION)
+        ]
+        return sorted(segments)
+
+    def _read_segment(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _replay(self, records, version=None):
+        # Rebuild a version from a segment's snapshot and deltas
+        data = None
+        for record in records:
+            if version is not None and record['version'] > version:
+                break
+            if 'snapshot' in record:
+                data = decode_snapshot(record['snapshot'])
+            else:
+                data = apply_delta(data, record['delta'])
+        return data
+
+    def record(self, filename, data):
+        # Append a revision of a composition
+        # filename: composition file name
+        # data: the saved composition as a Composition.to_dict dictionary
+        # returns: version number of the new revision
+        segments = self._segments(filename)
+        saved_date = datetime.now().isoformat()
+        if segments:
+            first_version, path = segments[-1]
+            records = self._read_segment(path)
+            version = records[-1]['version'] + 1
+            snapshot_size = len(json.dumps(records[0]['snapshot']))
+            delta_size = sum(len(json.dumps(record['delta'])) for record in records[1:])
+            delta = diff_compositions(self._replay(records), data)
+            delta_size += len(json.dumps(delta))
+            if len(records) <= MAX_DELTA_CHAIN and delta_size <= MAX_DELTA_RATIO * snapshot_size:
+                record = {'version': version, 'saved_date': saved_date, 'delta': delta}
+                self._append(path, record)
+                return version
+        else:
+            version = 0
+        # Start a new segment with a full snapshot
+        path = os.path.join(self.directory, filename, f"{version:08d}{SEGMENT_EXTENSION}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {'version': version, 'saved_date': saved_date, 'snapshot': encode_snapshot(data)}
+        self._append(path, record)
+        return version
+
+    def _append(self, path, record):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def versions(self, filename):
+        # Saved revisions of a composition, oldest first
+        # filename: composition file name
+        # returns: list of dictionaries with 'version', 'saved_date' and
+        #          'snapshot' (whether the revision is stored in full)
+        versions = []
+        for _first_version, path in self._segments(filename):
+            for record in self._read_segment(path):
+                versions.append({
+                    'version': record['version'],
+                    'saved_date': record['saved_date'],
+                    'snapshot': 'snapshot' in record,
+                })
+        return versions
+
+    def load(self, filename, version=None):
+        # Rebuild a revision of a composition
+        # Only the segment holding the version is read, so this takes at most
+        # one snapshot and MAX_DELTA_CHAIN deltas whatever the history length
+        # filename: composition file name
+        # version: version number (None for the latest)
+        # returns: Composition.to_dict dictionary, or None if there is no such version
+        segments = self._segments(filename)
+        if version is not None:
+            segments = [segment for segment in segments if segment[0] <= version]
+        if not segments:
+            return None
+        records = self._read_segment(segments[-1][1])
+        if version is not None and records[-1]['version'] < version:
+            return None
+        return self._replay(records, version)
+
+    def size(self, filename):
+        # Bytes used by the history of a composition
+        return sum(os.path.getsize(path) for _first_version, path in self._segments(filename))
+
+    def remove(self, filename):
+        # Drop the whole history of a composition
+        shutil.rmtree(os.path.join(self.directory, filename), ignore_errors=True)
@@ -0,0 +1,269 @@
+# Sidecar SQLite index of composition metadata
+# Keeps name, sequence type, tempo, scale, note count and dates of every
+# composition file in a save directory, so listing never has to open the
+# composition files themselves. The index is updated on save and delete and
+# reconciled with the directory using file modification times.
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+from catalog_scan import list_composition_files, ordered_map
+
+# The index lives in its own subdirectory, so the journal files SQLite
+# creates and removes never change the save directory's mtime
+INDEX_DIRECTORY = '.index'
+INDEX_FILENAME = 'catalog.sqlite'
+# Where earlier versions kept the index (journalled in memory only)
+LEGACY_INDEX_FILENAME = '.catalog.sqlite'
+
+# Metadata columns stored for every composition file
+METADATA_COLUMNS = [
+    'name', 'sequence_type', 'tempo', 'scale_type', 'rhythm_pattern',
+    'note_count', 'created_date', 'modified_date'
+]
+COLUMNS = ['filename'] + METADATA_COLUMNS
+# Columns with an SQL index, for filtering and sorting large catalogs
+INDEXED_COLUMNS = ['sequence_type', 'scale_type', 'tempo', 'note_count', 'created_date']
+
+class CompositionIndex:
+    def __init__(self, save_directory, extensions):
+        # Open (or create) the index of a save directory
+        # save_directory: directory holding the composition files
+        # extensions: file extensions that hold compositions
+        self.save_directory = save_directory
+        self.extensions = tuple(extensions)
+        index_directory = os.path.join(save_directory, INDEX_DIRECTORY)
+        os.makedirs(index_directory, exist_ok=True)
+        self.index_path = os.path.join(index_directory, INDEX_FILENAME)
+        self.lock = threading.Lock()
+        # Set when an update failed, so the next reconcile rescans everything
+        self.stale = False
+        try:
+            self._create_schema()
+        except sqlite3.DatabaseError:
+            # The index only caches file metadata, so it is safe to rebuild
+            self._remove_database()
+            self._create_schema()
+        legacy_path = os.path.join(save_directory, LEGACY_INDEX_FILENAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def _remove_database(self):
+        # Remove the index database together with its write-ahead log
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.index_path + suffix):
+                os.remove(self.index_path + suffix)
+
+    def _connect(self):
+        # Open a short-lived connection to the index database
+        # Connections are not kept open so the save directory can be removed
+        # or shared with other processes at any time
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        # Several processes write the index; the write-ahead log keeps it
+        # consistent if one of them crashes mid-transaction, and readers
+        # never wait for a writer
+        connection.execute("PRAGMA journal_mode=WAL")
+        return closing(connection)
+
+    def _create_schema(self):
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS compositions ("
+                "filename TEXT PRIMARY KEY, name TEXT, sequence_type TEXT, "
+                "tempo INTEGER, scale_type TEXT, rhythm_pattern TEXT, "
+                "note_count INTEGER, created_date TEXT, modified_date TEXT, "
+                "mtime_ns INTEGER, size INTEGER)"
+            )
+            for column in INDEXED_COLUMNS:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS compositions_{column} ON compositions ({column})"
+                )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS directory_state (key TEXT PRIMARY KEY, value INTEGER)"
+            )
+            connection.commit()
+
+    def _stored_directory_mtime(self, connection):
+        row = connection.execute(
+            "SELECT value FROM directory_state WHERE key = 'mtime_ns'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _store_directory_mtime(self, connection, mtime_ns):
+        connection.execute(
+            "INSERT OR REPLACE INTO directory_state (key, value) VALUES ('mtime_ns', ?)",
+            (mtime_ns,)
+        )
+
+    def _upsert(self, connection, filename, metadata, stat_result):
+        values = [filename] + [metadata.get(column) for column in METADATA_COLUMNS]
+        values += [stat_result.st_mtime_ns, stat_result.st_size]
+        connection.execute(
+            f"INSERT OR REPLACE INTO compositions ({', '.join(COLUMNS)}, mtime_ns, size) "
+            f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+            values
+        )
+
+    def mark_stale(self):
+        # Distrust the index until the next reconcile, e.g. after a file was
+        # written but recording it failed
+        self.stale = True
+
+    def directory_mtime(self):
+        # Current modification time of the save directory
+        return os.stat(self.save_directory).st_mtime_ns
+
+    def record_saved(self, filename, metadata, directory_mtime_before=None):
+        # Update the index after a composition file was written
+        # filename: file name inside the save directory
+        # metadata: composition metadata (see METADATA_COLUMNS)
+        # directory_mtime_before: directory mtime taken before the write; when
+        #   nothing else touched the directory the index stays in sync without
+        #   a rescan
+        self.record_saved_many([(filename, metadata)], directory_mtime_before)
+
+    def record_saved_many(self, records, directory_mtime_before=None):
+        # Update the index after a batch of composition files was written
+        # records: list of (filename, metadata) pairs
+        # directory_mtime_before: directory mtime taken before the first write
+        stats = [
+            os.stat(os.path.join(self.save_directory, filename)) for filename, _metadata in records
+        ]
+        with self.lock, self._connect() as connection:
+            stored = self._stored_directory_mtime(connection)
+            for (filename, metadata), stat_result in zip(records, stats):
+                self._upsert(connection, filename, metadata, stat_result)
+            if directory_mtime_before is not None and stored == directory_mtime_before:
+                self._store_directory_mtime(connection, self.directory_mtime())
+            connection.commit()
+
+    def record_deleted(self, filename, directory_mtime_before=None):
+        # Update the index after a composition file was removed
+        # filename: file name inside the save directory
+        # directory_mtime_before: directory mtime taken before the delete
+        with self.lock, self._connect() as connection:
+            stored = self._stored_directory_mtime(connection)
+            connection.execute("DELETE FROM compositions WHERE filename = ?", (filename,))
+            if directory_mtime_before is not None and stored == directory_mtime_before:
+                self._store_directory_mtime(connection, self.directory_mtime())
+            connection.commit()
+
+    def reconcile(self, read_metadata, force=False, workers=None):
+        # Bring the index in line with the files in the save directory
+        # Adding, removing or replacing files changes the directory mtime, so
+        # an unchanged directory is trusted as is. Otherwise every file is
+        # stat'ed and only new or modified files (by mtime and size) are read,
+        # in parallel.
+        # read_metadata: function(filepath) returning composition metadata
+        # force: rescan even if the directory mtime has not changed, e.g.
+        #   after files were edited in place by another program
+        # workers: number of threads reading changed files
+        # returns: number of files that had to be read
+        with self.lock, self._connect() as connection:
+            directory_mtime = self.directory_mtime()
+            force = force or self.stale
+            if not force and directory_mtime == self._stored_directory_mtime(connection):
+                return 0
+
+            known = {
+                filename: (mtime_ns, size) for filename, mtime_ns, size in
+                connection.execute("SELECT filename, mtime_ns, size FROM compositions")
+            }
+            seen = set()
+            changed = []
+            for entry in list_composition_files(self.save_directory, self.extensions):
+                seen.add(entry.name)
+                stat_result = entry.stat()
+                if known.get(entry.name) != (stat_result.st_mtime_ns, stat_result.st_size):
+                    changed.append((entry, stat_result))
+
+            read_count = 0
+            results = ordered_map(read_metadata, [entry.path for entry, _stat in changed], workers)
+            for (entry, stat_result), (metadata, error) in zip(changed, results):
+                if error is not None:
+                    print(f"Error reading {entry.name}: {error}")
+                    continue
+                self._upsert(connection, entry.name, metadata, stat_result)
+                read_count += 1
+
+            removed = [(filename,) for filename in known if filename not in seen]
+            connection.executemany("DELETE FROM compositions WHERE filename = ?", removed)
+            self._store_directory_mtime(connection, directory_mtime)
+            connection.commit()
+            self.stale = False
+            return read_count
+
+    def list_entries(self):
+        # All indexed compositions ordered by file name
+        # returns: list of metadata dictionaries including 'filename'
+        with self.lock, self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM compositions ORDER BY filename"
+            ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def _where_clause(self, filters):
+        # Build an SQL WHERE clause from query filters
+        # filters: dict of column conditions, see query()
+        # returns: (clause, parameters)
+        conditions = []
+        parameters = []
+        for column in ('name', 'sequence_type', 'scale_type'):
+            value = filters.get(column)
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        ranges = [
+            ('tempo', filters.get('tempo_range') or (None, None)),
+            ('note_count', (filters.get('min_notes'), filters.get('max_notes'))),
+            ('created_date', (filters.get('created_after'), filters.get('created_before'))),
+        ]
+        for column, (low, high) in ranges:
+            if low is not None:
+                conditions.append(f"{column} >= ?")
+                parameters.append(low)
+            if high is not None:
+                conditions.append(f"{column} <= ?")
+                parameters.append(high)
+        name_contains = filters.get('name_contains')
+        if name_contains:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            escaped = name_contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            parameters.append(f"%{escaped}%")
+        clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return clause, parameters
+
+    def query(self, order_by='filename', limit=None, offset=0, **filters):
+        # Select indexed compositions matching filters, one page at a time
+        # order_by: column to sort by, prefixed with '-' for descending order
+        # limit: maximum number of results (None for all)
+        # offset: number of matching results to skip
+        # filters: name, sequence_type, scale_type, tempo_range (low, high),
+        #   min_notes, max_notes, created_after, created_before (ISO dates)
+        #   and name_contains; None leaves a filter out
+        # returns: list of metadata dictionaries including 'filename'
+        descending = order_by.startswith('-')
+        column = order_by.lstrip('-')
+        if column not in COLUMNS:
+            raise ValueError(f"Cannot order compositions by '{column}'")
+        clause, parameters = self._where_clause(filters)
+        direction = "DESC" if descending else "ASC"
+        # The file name breaks ties so pages never overlap or skip entries
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM compositions{clause} "
+               f"ORDER BY {column} {direction}, filename {direction}")
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            parameters += [-1 if limit is None else limit, offset]
+        with self.lock, self._connect() as connection:
+            rows = connection.execute(sql, parameters).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, **filters):
+        # Number of indexed compositions matching filters (see query())
+        clause, parameters = self._where_clause(filters)
+        with self.lock, self._connect() as connection:
+            return connection.execute(
+                f"SELECT COUNT(*) FROM compositions{clause}", parameters
+            ).fetchone()[0]
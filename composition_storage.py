@@ -0,0 +1,234 @@
+# Binary storage format for compositions
+# A composition file is a fixed struct preamble, a small JSON metadata header
+# and a contiguous note array. Loading maps the note array with numpy.memmap,
+# so opening a huge composition only reads the header and note data is paged
+# in lazily as it is accessed.
+
+import gzip
+import json
+import os
+import stat
+import struct
+import tempfile
+
+import numpy as np
+
+BINARY_EXTENSION = '.mfc'
+TEMP_SUFFIX = '.tmp'
+MAGIC = b'MFMC'
+FORMAT_VERSION = 1
+# magic, version, flags, metadata header length, offset of the note array
+PREAMBLE = struct.Struct('<4sHHIQ')
+DATA_ALIGNMENT = 64
+MAX_PALETTE_SIZE = 65536
+GZIP_EXTENSION = '.gz'
+# Umask assumed where the process umask cannot be read without changing it
+DEFAULT_UMASK = 0o022
+
+class PalettedNotes:
+    # Lazy read-only view of notes stored as uint16 indices into a palette
+    # of distinct frequencies. Sequence-derived melodies only use a handful
+    # of distinct pitches, so this is lossless and half the size of float32.
+
+    def __init__(self, indices, palette):
+        # indices: uint16 array (usually a memmap) of palette positions
+        # palette: float64 array of distinct note frequencies
+        self.indices = indices
+        self.palette = palette
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.palette[self.indices[key]]
+        return float(self.palette[self.indices[key]])
+
+    def __iter__(self):
+        # Decode in chunks so iteration never materializes the whole melody
+        chunk_size = 65536
+        for start in range(0, len(self.indices), chunk_size):
+            for freq in self.palette[self.indices[start:start + chunk_size]]:
+                yield float(freq)
+
+    def __array__(self, dtype=None):
+        notes = self.palette[self.indices]
+        return notes.astype(dtype) if dtype is not None else notes
+
+    def tolist(self):
+        return self.palette[self.indices].tolist()
+
+def encode_notes(notes, note_dtype='auto'):
+    # Encode notes as a compact array
+    # notes: sequence of note frequencies
+    # note_dtype: 'float32', 'uint16' (palette) or 'auto' (uint16 when possible)
+    # returns: (header fields dict, numpy array to store)
+    values = np.asarray(notes, dtype=np.float64)
+
+    if note_dtype in ('auto', 'uint16'):
+        palette, indices = np.unique(values, return_inverse=True)
+        if len(palette) <= MAX_PALETTE_SIZE:
+            return {'dtype': 'uint16', 'palette': palette.tolist()}, indices.astype('<u2')
+        if note_dtype == 'uint16':
+            raise ValueError(f"Too many distinct notes for a uint16 palette: {len(palette)}")
+    elif note_dtype != 'float32':
+        raise ValueError(f"Unknown note dtype: {note_dtype}")
+
+    return {'dtype': 'float32'}, values.astype('<f4')
+
+def write_binary_composition(f, metadata, notes, note_dtype='auto'):
+    # Write a composition in the binary format
+    # f: binary file object opened for writing
+    # metadata: composition fields except the notes
+    # notes: sequence of note frequencies, or None for a recipe-only
+    #        composition whose metadata carries the recipe and note count
+    # note_dtype: see encode_notes
+    header = dict(metadata)
+    if notes is not None:
+        fields, array = encode_notes(notes, note_dtype)
+        header.update(fields)
+        header['note_count'] = len(array)
+    else:
+        array = np.zeros(0, dtype='<f4')
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    data_offset = PREAMBLE.size + len(header_bytes)
+    data_offset += -data_offset % DATA_ALIGNMENT
+
+    f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes), data_offset))
+    f.write(header_bytes)
+    f.write(b'\0' * (data_offset - PREAMBLE.size - len(header_bytes)))
+    f.write(array.tobytes())
+
+def read_binary_header(filepath):
+    # Read only the metadata header of a binary composition
+    # filepath: path of the composition file
+    # returns: (header dict, offset of the note array)
+    with open(filepath, 'rb') as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise ValueError(f"Truncated composition file: {filepath}")
+        magic, version, _flags, header_length, data_offset = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"Not a binary composition file: {filepath}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported composition format version {version}")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    return header, data_offset
+
+def map_notes(filepath, header, data_offset):
+    # Map the note array of a binary composition without reading it
+    # filepath: path of the composition file
+    # header: header dict from read_binary_header
+    # data_offset: offset of the note array
+    # returns: read-only array-like of note frequencies
+    count = header['note_count']
+    dtype = '<u2' if header['dtype'] == 'uint16' else '<f4'
+    if count == 0:
+        indices = np.zeros(0, dtype=dtype)
+    else:
+        indices = np.memmap(filepath, dtype=dtype, mode='r', offset=data_offset, shape=(count,))
+
+    if header['dtype'] == 'uint16':
+        return PalettedNotes(indices, np.asarray(header['palette'], dtype=np.float64))
+    return indices
+
+def mapped_file(notes):
+    # Path of the file notes are memory-mapped from, or None for notes that
+    # are in memory
+    if isinstance(notes, PalettedNotes):
+        notes = notes.indices
+    if isinstance(notes, np.memmap) and notes.filename is not None:
+        return os.path.realpath(notes.filename)
+    return None
+
+def unmap_notes(notes):
+    # Read memory-mapped notes into memory, so their file can be written
+    # over: truncating a mapped file crashes the next access with SIGBUS,
+    # and Windows refuses to replace a mapped file at all
+    # returns: read-only in-memory notes of the same kind
+    if isinstance(notes, PalettedNotes):
+        indices = np.array(notes.indices)
+        indices.flags.writeable = False
+        return PalettedNotes(indices, notes.palette)
+    values = np.array(notes)
+    values.flags.writeable = False
+    return values
+
+def read_binary_composition(filepath):
+    # Open a binary composition lazily
+    # filepath: path of the composition file
+    # returns: dict in the Composition.to_dict layout with lazily mapped notes
+    #          (recipe-only compositions have no 'notes')
+    header, data_offset = read_binary_header(filepath)
+    data = {key: value for key, value in header.items()
+            if key not in ('dtype', 'palette')}
+    if 'dtype' in header:
+        data['notes'] = map_notes(filepath, header, data_offset)
+    return data
+
+def process_umask():
+    # Current umask of the process, for the files atomic_write creates
+    # (temporary files are private until then). os.umask() can only read it
+    # by setting it, which would briefly give files other threads create
+    # the wrong permissions, so it is read from /proc where available.
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    return DEFAULT_UMASK
+
+def fsync_directory(directory):
+    # Make renames in a directory durable (directories cannot be opened,
+    # and need no sync, on Windows)
+    if os.name == 'nt':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(filepath, write_func, binary=False):
+    # Write a file so readers only ever see the old or the complete new file
+    # The data goes to a temporary file in the same directory, is fsync'ed
+    # and then renamed over the destination with os.replace. The new file
+    # keeps the permissions of the file it replaces, or gets the usual ones
+    # under the umask (see process_umask).
+    # filepath: destination path
+    # write_func: function(f) that writes the contents to an open file
+    # binary: open the temporary file in binary mode
+    directory, filename = os.path.split(filepath)
+    try:
+        mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~process_umask()
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{filename}.", suffix=TEMP_SUFFIX, dir=directory or '.'
+    )
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w') as f:
+            write_func(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(directory)
+
+def open_text(filepath, mode='r', compress=None):
+    # Open a text file, optionally gzip-compressed
+    # filepath: path of the file
+    # mode: 'r' to read, 'w' to write
+    # compress: True/False, or None to decide by a '.gz' extension
+    if compress is None:
+        compress = filepath.endswith(GZIP_EXTENSION)
+    if compress:
+        return gzip.open(filepath, mode + 't', encoding='utf-8')
+    return open(filepath, mode, encoding='utf-8')
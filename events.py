@@ -0,0 +1,260 @@
+# Structured events reported by MelodyGenerator
+# Instead of printing, the generator hands typed events to sinks. An event
+# only keeps references to its data; text is formatted when a sink asks for
+# it, so a 100k-number sequence costs nothing to report unless a sink shows
+# it. Any callable taking an event is a sink; PrintSink reproduces the
+# classic console output and is the default.
+
+import json
+import logging
+import sys
+import time
+
+# Text used for each sequence type: (melody name, unit, sequence label)
+SEQUENCE_LABELS = {
+    'fibonacci': ('Fibonacci melody', 'numbers', 'Fibonacci sequence'),
+    'primes': ('prime numbers melody', 'numbers', 'Prime sequence'),
+    'pi': ('pi digits melody', 'digits', 'Pi digits'),
+}
+
+def _labels(sequence_type):
+    return SEQUENCE_LABELS.get(sequence_type, (f"{sequence_type} melody", 'numbers', f"{sequence_type} sequence"))
+
+class Event:
+    # Base class of all events
+    # kind: short event name used in structured output
+    kind = 'event'
+    __slots__ = ('timestamp',)
+
+    def __init__(self):
+        self.timestamp = time.time()
+
+    def fields(self):
+        # JSON-friendly summary of the event (bulky data is left out)
+        return {}
+
+    def message(self):
+        # Human-readable text of the event
+        return self.kind
+
+    def __str__(self):
+        return self.message()
+
+class Notice(Event):
+    # Plain status message, e.g. that there is nothing to play
+    # level: logging level of the message (warnings use logging.WARNING)
+    kind = 'notice'
+    __slots__ = ('text', 'level')
+
+    def __init__(self, text, level=logging.INFO):
+        super().__init__()
+        self.text = text
+        self.level = level
+
+    def fields(self):
+        return {'text': self.text, 'level': logging.getLevelName(self.level)}
+
+    def message(self):
+        return self.text
+
+class GenerationStarted(Event):
+    kind = 'generation_started'
+    __slots__ = ('sequence_type', 'n')
+
+    def __init__(self, sequence_type, n):
+        super().__init__()
+        self.sequence_type = sequence_type
+        self.n = n
+
+    def fields(self):
+        return {'sequence_type': self.sequence_type, 'n': self.n}
+
+    def message(self):
+        melody, unit, _label = _labels(self.sequence_type)
+        return f"Generating {melody} with {self.n} {unit}..."
+
+class SequenceGenerated(Event):
+    # The raw sequence; its text is the most expensive output to format
+    kind = 'sequence_generated'
+    __slots__ = ('sequence_type', 'sequence')
+
+    def __init__(self, sequence_type, sequence):
+        super().__init__()
+        self.sequence_type = sequence_type
+        self.sequence = sequence
+
+    def fields(self):
+        return {'sequence_type': self.sequence_type, 'length': len(self.sequence)}
+
+    def message(self):
+        return f"{_labels(self.sequence_type)[2]}: {self.sequence}"
+
+class NotesMapped(Event):
+    kind = 'notes_mapped'
+    __slots__ = ('scale_type', 'notes')
+
+    def __init__(self, scale_type, notes):
+        super().__init__()
+        self.scale_type = scale_type
+        self.notes = notes
+
+    def fields(self):
+        return {'scale_type': self.scale_type, 'note_count': len(self.notes)}
+
+    def message(self):
+        return f"Generated {len(self.notes)} musical notes"
+
+class CompositionSaved(Event):
+    kind = 'composition_saved'
+    __slots__ = ('composition',)
+
+    def __init__(self, composition):
+        super().__init__()
+        self.composition = composition
+
+    def fields(self):
+        return {'name': self.composition.name}
+
+    def message(self):
+        return f"Composition '{self.composition.name}' created and saved."
+
+class PlaybackStarted(Event):
+    kind = 'playback_started'
+    __slots__ = ('composition', 'timbre')
+
+    def __init__(self, composition, timbre=None):
+        super().__init__()
+        self.composition = composition
+        self.timbre = timbre
+
+    def fields(self):
+        comp = self.composition
+        return {'name': comp.name, 'sequence_type': comp.sequence_type, 'tempo': comp.tempo,
+                'scale_type': comp.scale_type, 'rhythm_pattern': comp.rhythm_pattern}
+
+    def message(self):
+        comp = self.composition
+        return "\n".join([
+            f"Playing composition: {comp.name}",
+            f"Sequence type: {comp.sequence_type}",
+            f"Tempo: {comp.tempo} BPM",
+            f"Scale: {comp.scale_type}",
+            f"Rhythm: {comp.rhythm_pattern}",
+        ])
+
+class CompositionExported(Event):
+    kind = 'composition_exported'
+    __slots__ = ('composition', 'filepath')
+
+    def __init__(self, composition, filepath):
+        super().__init__()
+        self.composition = composition
+        self.filepath = filepath
+
+    def fields(self):
+        return {'name': self.composition.name, 'filepath': self.filepath}
+
+    def message(self):
+        return f"Composition '{self.composition.name}' exported to {self.filepath}."
+
+class CompositionsListed(Event):
+    # Result of listing saved compositions (catalog metadata dictionaries)
+    kind = 'compositions_listed'
+    __slots__ = ('compositions',)
+
+    def __init__(self, compositions):
+        super().__init__()
+        self.compositions = compositions
+
+    def fields(self):
+        return {'compositions': self.compositions}
+
+    def message(self):
+        if not self.compositions:
+            return "No saved compositions found."
+        lines = ["\nSaved Compositions:", "-" * 50]
+        for i, comp in enumerate(self.compositions, 1):
+            lines += [
+                f"{i}. {comp['name']}",
+                f"   Type: {comp['sequence_type']}",
+                f"   Tempo: {comp['tempo']} BPM",
+                f"   Scale: {comp['scale_type']}",
+                f"   Notes: {comp['note_count']}",
+                f"   Created: {(comp['created_date'] or '')[:10]}",
+                "",
+            ]
+        return "\n".join(lines)
+
+class CompositionInfo(Event):
+    kind = 'composition_info'
+    __slots__ = ('composition',)
+
+    def __init__(self, composition):
+        super().__init__()
+        self.composition = composition
+
+    def fields(self):
+        comp = self.composition
+        return {'name': comp.name, 'sequence_type': comp.sequence_type,
+                'note_count': len(comp.notes), 'tempo': comp.tempo,
+                'scale_type': comp.scale_type, 'rhythm_pattern': comp.rhythm_pattern,
+                'created_date': comp.created_date, 'modified_date': comp.modified_date}
+
+    def message(self):
+        comp = self.composition
+        lines = [
+            "\nComposition Information:",
+            "-" * 30,
+            f"Name: {comp.name}",
+            f"Sequence Type: {comp.sequence_type}",
+            f"Number of Notes: {len(comp.notes)}",
+            f"Tempo: {comp.tempo} BPM",
+            f"Scale: {comp.scale_type}",
+            f"Rhythm Pattern: {comp.rhythm_pattern}",
+            f"Created: {comp.created_date[:19]}",
+            f"Modified: {comp.modified_date[:19]}",
+        ]
+        # Show first few notes
+        if len(comp.notes):
+            lines.append("\nFirst 10 notes (frequencies in Hz):")
+            for i, note in enumerate(comp.notes[:10]):
+                lines.append(f"  Note {i+1}: {note:.2f} Hz")
+            if len(comp.notes) > 10:
+                lines.append(f"  ... and {len(comp.notes) - 10} more notes")
+        return "\n".join(lines)
+
+class PrintSink:
+    # Prints every event's message (the classic console output)
+    def __init__(self, stream=None):
+        # stream: text stream (defaults to the current sys.stdout)
+        self.stream = stream
+
+    def __call__(self, event):
+        print(event.message(), file=self.stream or sys.stdout)
+
+class LoggingSink:
+    # Passes events to a logger; messages are only formatted if the logger
+    # emits them
+    def __init__(self, logger=None, level=logging.INFO):
+        # logger: logging.Logger (defaults to the 'melody_generator' logger)
+        # level: log level of the events
+        self.logger = logger or logging.getLogger('melody_generator')
+        self.level = level
+
+    def __call__(self, event):
+        # Notices log at their own level when it is higher (warnings)
+        level = max(self.level, getattr(event, 'level', logging.NOTSET))
+        if self.logger.isEnabledFor(level):
+            # The event formats itself when the record is rendered
+            self.logger.log(level, "%s", event, extra={'event': event})
+
+class JsonLinesSink:
+    # Writes one JSON object per event: kind, timestamp and the event's fields
+    def __init__(self, stream):
+        # stream: writable text stream, e.g. an open file
+        self.stream = stream
+
+    def __call__(self, event):
+        record = {'event': event.kind, 'timestamp': event.timestamp}
+        record.update(event.fields())
+        self.stream.write(json.dumps(record, default=str) + '\n')
@@ -0,0 +1,76 @@
+# Advisory file locks shared between processes
+# Processes that save, load and delete compositions in the same directory
+# take these locks around each file. Lock files live in a hidden
+# subdirectory and are picked by hashing the locked file name into a fixed
+# number of stripes, so they never pile up and are never deleted (deleting a
+# lock file another process still holds would silently break the lock).
+
+import os
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_DIRECTORY = '.locks'
+LOCK_STRIPES = 64
+RETRY_DELAY = 0.01
+
+class FileLock:
+    def __init__(self, directory, key, shared=False):
+        # Lock guarding one file of a directory
+        # directory: directory holding the locked file
+        # key: name of the locked file
+        # shared: take a shared (reader) lock; Windows only has exclusive
+        #         locks, so readers exclude each other there
+        stripe = zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES
+        self.lock_directory = os.path.join(directory, LOCK_DIRECTORY)
+        self.path = os.path.join(self.lock_directory, f"{stripe:02d}.lock")
+        self.shared = shared
+        self.fd = None
+
+    def acquire(self):
+        # Block until the lock is held
+        os.makedirs(self.lock_directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+                return
+            while True:
+                try:
+                    # Lock the first byte (it does not need to exist)
+                    os.lseek(self.fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    time.sleep(RETRY_DELAY)
+        except BaseException:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def release(self):
+        # Release the lock
+        if self.fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,212 @@
+# Per-stage timing and memory instrumentation
+# Code marks its stages with the traced() decorator or a span() block. While
+# recording is enabled, every span records its wall time, the CPU time of
+# its thread and optionally the peak memory it allocated (tracemalloc), and
+# the spans can be saved as a Chrome trace (chrome://tracing, Perfetto).
+# When recording is disabled a traced function costs one global check and a
+# span() block a shared no-op context manager.
+#
+# Usage:
+#   with instrumentation.recording(trace_memory=True) as recorder:
+#       generator.generate_fibonacci_melody(1000)
+#   recorder.save_chrome_trace("trace.json")
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Active recorder; None while instrumentation is disabled
+_recorder = None
+
+class _NullSpan:
+    # Context manager used while recording is disabled
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    # One timed stage; created by span() and traced() while recording
+    __slots__ = ('recorder', 'name', 'category', 'args', 'start_ns', 'cpu_start_ns',
+                 'memory_start', 'memory_peak')
+
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        recorder = self.recorder
+        if recorder.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = recorder._stack()
+            if stack:
+                # The parent keeps the peak seen so far before it is reset
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            stack.append(self)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+            self.memory_peak = current
+        self.cpu_start_ns = time.thread_time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_ns = time.perf_counter_ns()
+        cpu_ns = time.thread_time_ns() - self.cpu_start_ns
+        memory = None
+        recorder = self.recorder
+        if recorder.trace_memory:
+            peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+            stack = recorder._stack()
+            stack.pop()
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            memory = peak - self.memory_start
+        recorder._record(self, end_ns, cpu_ns, memory, exc_type)
+        return False
+
+class Recorder:
+    def __init__(self, trace_memory=False):
+        # Collects finished spans
+        # trace_memory: also record each span's peak allocated memory with
+        #               tracemalloc (slows the traced code down noticeably)
+        self.trace_memory = trace_memory
+        # Whether enable() started tracemalloc and disable() should stop it
+        self.started_tracemalloc = False
+        self.events = []
+        self.origin_ns = time.perf_counter_ns()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        # Open spans of the current thread, used for memory peaks
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span, end_ns, cpu_ns, memory, exc_type):
+        args = dict(span.args)
+        args['cpu_ms'] = round(cpu_ns / 1e6, 3)
+        if memory is not None:
+            args['memory_peak_bytes'] = memory
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        event = {
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': (span.start_ns - self.origin_ns) / 1000,
+            'dur': (end_ns - span.start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        # Totals per span name
+        # returns: dictionary of name to count, wall_ms, cpu_ms and (with
+        #          memory tracing) the largest memory_peak_bytes
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], {'count': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0})
+            total['count'] += 1
+            total['wall_ms'] += event['dur'] / 1000
+            total['cpu_ms'] += event['args']['cpu_ms']
+            if 'memory_peak_bytes' in event['args']:
+                total['memory_peak_bytes'] = max(total.get('memory_peak_bytes', 0),
+                                                 event['args']['memory_peak_bytes'])
+        return totals
+
+    def chrome_trace(self):
+        # Spans in the Chrome trace event format
+        return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, filepath):
+        # Save the spans as a Chrome trace JSON file
+        # filepath: destination path
+        # returns: True if successful, False otherwise
+        try:
+            with open(filepath, 'w') as f:
+                json.dump(self.chrome_trace(), f)
+            return True
+        except Exception as e:
+            print(f"Error saving trace: {e}")
+            return False
+
+def enable(trace_memory=False):
+    # Start recording spans
+    # trace_memory: also record peak memory per span (starts tracemalloc)
+    # returns: the new Recorder
+    global _recorder
+    recorder = Recorder(trace_memory)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        recorder.started_tracemalloc = True
+    _recorder = recorder
+    return recorder
+
+def disable():
+    # Stop recording spans
+    # returns: the Recorder that was active, or None
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None and recorder.started_tracemalloc:
+        tracemalloc.stop()
+    return recorder
+
+def is_enabled():
+    return _recorder is not None
+
+@contextmanager
+def recording(trace_memory=False):
+    # Record spans for the duration of a with block
+    # trace_memory: also record peak memory per span
+    # yields: the Recorder
+    recorder = enable(trace_memory)
+    try:
+        yield recorder
+    finally:
+        if _recorder is recorder:
+            disable()
+
+def span(name, category='', **args):
+    # Time a block of code
+    # name: span name, e.g. 'CompositionManager.save_composition'
+    # category: span category shown in trace viewers
+    # args: extra values stored with the span
+    # returns: context manager
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return Span(recorder, name, category, args)
+
+def traced(name=None, category=''):
+    # Decorator timing every call of a function as a span
+    # name: span name (defaults to the function's qualified name)
+    # category: span category shown in trace viewers
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            with Span(recorder, span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
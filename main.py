@@ -3,10 +3,15 @@
 
 from melody_generator import MelodyGenerator
 import os
+import sys
+
+# Compositions shown per page when browsing saved compositions
+PAGE_SIZE = 10
 
 def clear_screen():
-    # Clear the console screen
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # Clear the console screen (skipped when output is piped or redirected)
+    if sys.stdout.isatty():
+        os.system('cls' if os.name == 'nt' else 'clear')
 
 def print_banner():
     # Print the application banner
@@ -115,29 +120,59 @@ def generate_melody_menu(generator, melody_type):
     else:
         print("Failed to generate melody.")
 
+def select_composition_menu(generator, action):
+    # Browse saved compositions page by page and choose one
+    # action: what will be done with the choice ("load", "delete")
+    # returns: metadata of the chosen composition, or None if cancelled
+    manager = generator.composition_manager
+    
+    sequence_type = None
+    total = manager.count_compositions()
+    if total > PAGE_SIZE:
+        sequence_type = input("Filter by sequence type (fibonacci/primes/pi, Enter for all): ").strip().lower() or None
+        total = manager.count_compositions(sequence_type=sequence_type)
+    if total == 0:
+        print("No saved compositions found.")
+        return None
+    
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = 0
+    while True:
+        offset = page * PAGE_SIZE
+        compositions = manager.query(sequence_type=sequence_type, limit=PAGE_SIZE, offset=offset)
+        print(f"\nAvailable compositions (page {page + 1} of {pages}):")
+        for idx, comp in enumerate(compositions, offset + 1):
+            print(f"{idx}. {comp['name']} ({comp['sequence_type']})")
+        
+        prompt = f"\nEnter composition number to {action}"
+        if pages > 1:
+            prompt += ", n/p for next/previous page"
+        choice = input(prompt + " (Enter to cancel): ").strip().lower()
+        if not choice:
+            return None
+        if choice == 'n' and page + 1 < pages:
+            page += 1
+        elif choice == 'p' and page > 0:
+            page -= 1
+        elif choice.isdigit() and 1 <= int(choice) <= total:
+            # Any number can be chosen, not only those on the current page
+            selected = manager.query(sequence_type=sequence_type, limit=1, offset=int(choice) - 1)
+            if selected:
+                return selected[0]
+            print("Invalid choice.")
+        else:
+            print("Invalid choice.")
+
 def load_composition_menu(generator):
     # Menu for loading compositions
     print("\nLoad Composition")
     print("-" * 20)
     
-    compositions = generator.composition_manager.list_compositions()
-    if not compositions:
-        print("No saved compositions found.")
-        return
-    
-    print("\nAvailable compositions:")
-    for idx, comp in enumerate(compositions, 1):
-        print(f"{idx}. {comp['name']} ({comp['sequence_type']})")
-    
-    choice = get_user_input("\nEnter composition number to load: ", int)
-    if choice is None or choice < 1 or choice > len(compositions):
-        print("Invalid choice.")
+    selected_comp = select_composition_menu(generator, "load")
+    if selected_comp is None:
         return
     
-    selected_comp = compositions[choice - 1]
-    fname = f"{selected_comp['name'].replace(' ', '_')}.json"
-    
-    if generator.load_composition(fname):
+    if generator.load_composition(selected_comp['filename']):
         print(f"Composition '{selected_comp['name']}' loaded successfully.")
     else:
         print("Failed to load composition.")
@@ -147,22 +182,10 @@ def delete_composition_menu(generator):
     print("\nDelete Composition")
     print("-" * 20)
     
-    compositions = generator.composition_manager.list_compositions()
-    if not compositions:
-        print("No saved compositions found.")
+    selected_comp = select_composition_menu(generator, "delete")
+    if selected_comp is None:
         return
     
-    print("\nAvailable compositions:")
-    for idx, comp in enumerate(compositions, 1):
-        print(f"{idx}. {comp['name']} ({comp['sequence_type']})")
-    
-    choice = get_user_input("\nEnter composition number to delete: ", int)
-    if choice is None or choice < 1 or choice > len(compositions):
-        print("Invalid choice.")
-        return
-    
-    selected_comp = compositions[choice - 1]
-    
     confirm = input(f"\nAre you sure you want to delete '{selected_comp['name']}'? (y/n): ").lower().strip()
     if confirm in ['y', 'yes']:
         if generator.delete_composition(selected_comp['name']):
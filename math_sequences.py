@@ -2,6 +2,20 @@
 
 import math
 
+import numpy as np
+
+from instrumentation import traced
+
+# Base pitches of each scale; octaves above them are powers of two
+SCALE_BASE_NOTES = {
+    'major': [261.63, 293.66, 329.63, 349.23, 392.00, 440.00, 493.88, 523.25],  # C, D, E, F, G, A, B, C
+    'minor': [261.63, 293.66, 311.13, 349.23, 392.00, 415.30, 466.16, 523.25],  # C, D, Eb, F, G, Ab, Bb, C
+    'pentatonic': [261.63, 293.66, 329.63, 392.00, 440.00, 523.25],  # C, D, E, G, A, C
+}
+# Highest octave shift; anything above 2^15 is clamped to 20000 Hz anyway
+MAX_OCTAVE = 15
+
+@traced(category='sequence')
 def generate_fibonacci(n):
     # Generate first n Fibonacci numbers
     # n: number of Fibonacci numbers to generate
@@ -36,6 +50,7 @@ def is_prime(num):
 
     return True
 
+@traced(category='sequence')
 def generate_primes(n):
     # Generate first n prime numbers
     # n: number of prime numbers to generate
@@ -50,6 +65,7 @@ def generate_primes(n):
     
     return prime_list
 
+@traced(category='sequence')
 def generate_pi_digits(n):
     # Generate first n digits of pi
     # n: number of pi digits to generate
@@ -63,27 +79,23 @@ def generate_pi_digits(n):
     
     return digit_list[:n]
 
+@traced(category='sequence')
 def sequence_to_notes(sequence, scale_type='major'):
     # Convert a mathematical sequence to musical notes
     # sequence: list of numbers
     # scale_type: type of scale ('major', 'minor', 'pentatonic')
     # returns: list of note frequencies in Hz
-    # Define basic note frequencies (C major scale)
-    if scale_type == 'major':
-        base_notes = [261.63, 293.66, 329.63, 349.23, 392.00, 440.00, 493.88, 523.25]  # C, D, E, F, G, A, B, C
-    elif scale_type == 'minor':
-        base_notes = [261.63, 293.66, 311.13, 349.23, 392.00, 415.30, 466.16, 523.25]  # C, D, Eb, F, G, Ab, Bb, C
-    elif scale_type == 'pentatonic':
-        base_notes = [261.63, 293.66, 329.63, 392.00, 440.00, 523.25]  # C, D, E, G, A, C
-    else:
-        base_notes = [261.63, 293.66, 329.63, 349.23, 392.00, 440.00, 493.88, 523.25]
+    # Unknown scales fall back to C major
+    base_notes = SCALE_BASE_NOTES.get(scale_type, SCALE_BASE_NOTES['major'])
     
     note_list = []
     for num in sequence:
         # Map number to note using modulo
         note_idx = abs(num) % len(base_notes)
         # Determine octave based on number magnitude
-        octave = abs(num) // len(base_notes)
+        # (capped, since anything above 2^15 is clamped to 20000 Hz anyway
+        # and huge values such as large Fibonacci numbers would overflow)
+        octave = min(abs(num) // len(base_notes), MAX_OCTAVE)
         # Calculate frequency with octave
         freq = base_notes[note_idx] * (2 ** octave)
         # Limit frequency to reasonable range (20Hz - 20000Hz)
@@ -91,3 +103,89 @@ def sequence_to_notes(sequence, scale_type='major'):
         note_list.append(freq)
     
     return note_list
+
+# Sequence values with the same note index and octave in every scale repeat
+# with this period once every scale has hit the octave cap at SCALE_CAP
+SCALE_PERIOD = math.lcm(*(len(base) for base in SCALE_BASE_NOTES.values()))
+SCALE_CAP = SCALE_PERIOD * -(-(MAX_OCTAVE + 1) * max(map(len, SCALE_BASE_NOTES.values())) // SCALE_PERIOD)
+
+def reduce_sequence(sequence):
+    # Reduce sequence values to small integers that map to the same notes
+    # in every scale: past the octave cap only the value modulo the scale
+    # lengths matters, which also keeps huge Fibonacci numbers out of numpy
+    # sequence: list of integers
+    # returns: int64 array of reduced values
+    return np.fromiter(
+        (value if value < SCALE_CAP else SCALE_CAP + value % SCALE_PERIOD for value in map(abs, sequence)),
+        dtype=np.int64, count=len(sequence)
+    )
+
+def reduced_to_notes(reduced, scale_type='major'):
+    # Map reduced sequence values (or scale degrees) to note frequencies
+    # reduced: values from reduce_sequence
+    # scale_type: scale name (unknown scales map to major)
+    # returns: float64 note array, the same notes as sequence_to_notes
+    base = np.asarray(SCALE_BASE_NOTES.get(scale_type, SCALE_BASE_NOTES['major']))
+    reduced = np.asarray(reduced, dtype=np.int64)
+    octaves = np.minimum(reduced // len(base), MAX_OCTAVE)
+    return np.clip(base[reduced % len(base)] * 2.0 ** octaves, 20, 20000)
+
+@traced(category='sequence')
+def sequence_to_notes_by_scale(sequence, scale_types):
+    # Map one sequence to several scales in a vectorized pass
+    # Gives the same notes as sequence_to_notes for every scale; the values
+    # are reduced once and shared by all scales
+    # sequence: list of integers
+    # scale_types: scale names
+    # returns: dictionary of scale name to float64 note array
+    reduced = reduce_sequence(sequence)
+    return {scale_type: reduced_to_notes(reduced, scale_type) for scale_type in scale_types}
+
+@traced(category='sequence')
+def generate_prime_gaps(n):
+    # Generate the first n gaps between consecutive prime numbers
+    # n: number of prime gaps to generate
+    # returns: list of prime gaps (3-2, 5-3, 7-5, ...)
+    if n <= 0:
+        return []
+    prime_list = generate_primes(n + 1)
+    return [prime_list[i + 1] - prime_list[i] for i in range(n)]
+
+# Sequence generators by the sequence_type name stored on compositions
+SEQUENCE_GENERATORS = {
+    'fibonacci': generate_fibonacci,
+    'primes': generate_primes,
+    'pi': generate_pi_digits,
+    'prime_gaps': generate_prime_gaps,
+}
+
+def generate_sequence(sequence_type, n):
+    # Generate the first n values of a named sequence
+    # sequence_type: one of the keys of SEQUENCE_GENERATORS
+    # n: number of values to generate
+    # returns: list of sequence values
+    if sequence_type not in SEQUENCE_GENERATORS:
+        raise ValueError(f"Unknown sequence type: {sequence_type}")
+    return SEQUENCE_GENERATORS[sequence_type](n)
+
+def sequence_to_partials(sequence, num_partials=64):
+    # Convert a mathematical sequence to harmonic partial amplitudes
+    # sequence: list of numbers (repeated if shorter than num_partials)
+    # num_partials: number of harmonics, the first being the fundamental
+    # returns: list of amplitudes that sum to 1.0
+    if num_partials <= 0:
+        return []
+    if not sequence:
+        return [1.0] + [0.0] * (num_partials - 1)
+    
+    values = [abs(sequence[k % len(sequence)]) for k in range(num_partials)]
+    peak = max(values)
+    if peak == 0:
+        return [1.0] + [0.0] * (num_partials - 1)
+    
+    # Log scaling keeps fast-growing sequences like Fibonacci usable and
+    # the natural 1/k roll-off keeps higher harmonics from sounding harsh
+    peak = math.log1p(peak)
+    amplitudes = [(math.log1p(v) / peak) / (k + 1) for k, v in enumerate(values)]
+    total = sum(amplitudes)
+    return [a / total for a in amplitudes]
@@ -1,18 +1,58 @@
 # Main melody generator that combines mathematical sequences with audio generation
 
+import os
+from collections import deque
+from functools import partial
+
 from math_sequences import (
     generate_fibonacci, generate_primes, generate_pi_digits, sequence_to_notes
 )
+from artifacts import save_composition_midi
 from audio_engine import AudioEngine
-from composition import CompositionManager
+from batch_render import render_composition
+from catalog_scan import ordered_map
+from composition import CompositionManager, file_stem
+from midi_export import MIDI_EXTENSION
+from instrumentation import traced
+from parameter_sweep import expand_sweep, sweep_compositions
+from rhythm import resolve_rhythm
+from events import (
+    CompositionExported, CompositionInfo, CompositionSaved, CompositionsListed,
+    GenerationStarted, Notice, NotesMapped, PlaybackStarted, PrintSink, SequenceGenerated
+)
 
 class MelodyGenerator:
-    def __init__(self):
+    def __init__(self, sinks=None, quiet=False):
         # Initialize the melody generator
+        # sinks: callables receiving events (defaults to printing them)
+        # quiet: report nothing; no event is even created
         self.audio_engine = AudioEngine()
-        self.composition_manager = CompositionManager()
         self.current_composition = None
+        if quiet:
+            self.sinks = []
+        else:
+            self.sinks = list(sinks) if sinks is not None else [PrintSink()]
+        # Storage status messages reach the sinks as notices
+        self.composition_manager = CompositionManager(report=partial(self.emit, Notice))
+    
+    def add_sink(self, sink):
+        # Start sending events to a sink (any callable taking an event)
+        self.sinks.append(sink)
+    
+    def remove_sink(self, sink):
+        # Stop sending events to a sink
+        self.sinks.remove(sink)
+    
+    def emit(self, event_type, *args):
+        # Report an event to every sink
+        # event_type: Event subclass; it is only created if there are sinks
+        # args: event constructor arguments
+        if self.sinks:
+            event = event_type(*args)
+            for sink in self.sinks:
+                sink(event)
         
+    @traced(category='generator')
     def generate_fibonacci_melody(self, n=10, tempo=120, scale_type='major', 
                                  rhythm_pattern='simple', save=True):
         # Generate and play a Fibonacci sequence melody
@@ -22,28 +62,30 @@ class MelodyGenerator:
         # rhythm_pattern: rhythm pattern type
         # save: whether to save the composition
         # returns: generated composition
-        print(f"Generating Fibonacci melody with {n} numbers...")
+        self.emit(GenerationStarted, "fibonacci", n)
         
         # Generate Fibonacci sequence
         fib_seq = generate_fibonacci(n)
-        print(f"Fibonacci sequence: {fib_seq}")
+        self.emit(SequenceGenerated, "fibonacci", fib_seq)
         
         # Convert to musical notes
         notes = sequence_to_notes(fib_seq, scale_type)
-        print(f"Generated {len(notes)} musical notes")
+        self.emit(NotesMapped, scale_type, notes)
         
         # Create composition
         comp_name = f"Fibonacci_{n}_Notes"
         comp = self.composition_manager.create_composition_from_sequence(
-            comp_name, "fibonacci", notes, tempo, scale_type, rhythm_pattern
+            comp_name, "fibonacci", notes, tempo, scale_type, rhythm_pattern, n=n,
+            sequence=fib_seq
         )
         
         if comp and save:
             self.current_composition = comp
-            print(f"Composition '{comp.name}' created and saved.")
+            self.emit(CompositionSaved, comp)
         
         return comp
     
+    @traced(category='generator')
     def generate_prime_melody(self, n=10, tempo=120, scale_type='major', 
                              rhythm_pattern='simple', save=True):
         # Generate and play a prime numbers melody
@@ -53,28 +95,30 @@ class MelodyGenerator:
         # rhythm_pattern: rhythm pattern type
         # save: whether to save the composition
         # returns: generated composition
-        print(f"Generating prime numbers melody with {n} numbers...")
+        self.emit(GenerationStarted, "primes", n)
         
         # Generate prime numbers
         prime_seq = generate_primes(n)
-        print(f"Prime sequence: {prime_seq}")
+        self.emit(SequenceGenerated, "primes", prime_seq)
         
         # Convert to musical notes
         notes = sequence_to_notes(prime_seq, scale_type)
-        print(f"Generated {len(notes)} musical notes")
+        self.emit(NotesMapped, scale_type, notes)
         
         # Create composition
         comp_name = f"Primes_{n}_Numbers"
         comp = self.composition_manager.create_composition_from_sequence(
-            comp_name, "primes", notes, tempo, scale_type, rhythm_pattern
+            comp_name, "primes", notes, tempo, scale_type, rhythm_pattern, n=n,
+            sequence=prime_seq
         )
         
         if comp and save:
             self.current_composition = comp
-            print(f"Composition '{comp.name}' created and saved.")
+            self.emit(CompositionSaved, comp)
         
         return comp
     
+    @traced(category='generator')
     def generate_pi_melody(self, n=20, tempo=120, scale_type='major', 
                            rhythm_pattern='simple', save=True):
         # Generate and play a pi digits melody
@@ -84,50 +128,103 @@ class MelodyGenerator:
         # rhythm_pattern: rhythm pattern type
         # save: whether to save the composition
         # returns: generated composition
-        print(f"Generating pi digits melody with {n} digits...")
+        self.emit(GenerationStarted, "pi", n)
         
         # Generate pi digits
         pi_digits = generate_pi_digits(n)
-        print(f"Pi digits: {pi_digits}")
+        self.emit(SequenceGenerated, "pi", pi_digits)
         
         # Convert to musical notes
         notes = sequence_to_notes(pi_digits, scale_type)
-        print(f"Generated {len(notes)} musical notes")
+        self.emit(NotesMapped, scale_type, notes)
         
         # Create composition
         comp_name = f"Pi_{n}_Digits"
         comp = self.composition_manager.create_composition_from_sequence(
-            comp_name, "pi", notes, tempo, scale_type, rhythm_pattern
+            comp_name, "pi", notes, tempo, scale_type, rhythm_pattern, n=n,
+            sequence=pi_digits
         )
         
         if comp and save:
             self.current_composition = comp
-            print(f"Composition '{comp.name}' created and saved.")
+            self.emit(CompositionSaved, comp)
         
         return comp
     
-    def play_composition(self, composition=None, use_rhythm=True):
+    def generate_batch(self, sweep_spec, save=True, outputs=(), output_directory=None,
+                       workers=None, timbre=None):
+        # Generate every combination of a parameter sweep
+        # Each sequence is generated once and mapped to all requested scales
+        # together; saving and rendering fan out to worker processes
+        # sweep_spec: parameter_sweep.expand_sweep spec, e.g.
+        #             {'sequence_type': 'primes', 'n': [16, 32],
+        #              'scale_type': ['major', 'minor'], 'tempo': [90, 120]}
+        # save: save the compositions to the composition directory
+        # outputs: files to render per composition ('wav', 'midi')
+        # output_directory: directory for rendered files
+        # workers: worker processes (1 works in this process)
+        # timbre: additive synthesis timbre of WAV files
+        # returns: lazy iterator of (composition, result, error) in sweep
+        #          order; result is the render_composition dictionary (None
+        #          if nothing was saved or rendered) and error the exception
+        #          of a failed item, which does not stop the others
+        # raises: ValueError if the sweep spec is invalid
+        variants = expand_sweep(sweep_spec)
+        if outputs:
+            if output_directory is None:
+                raise ValueError("Rendering a sweep needs an output directory")
+            os.makedirs(output_directory, exist_ok=True)
+        return self._run_batch(variants, save, list(outputs), output_directory, workers, timbre)
+    
+    def _run_batch(self, variants, save, outputs, output_directory, workers, timbre):
+        compositions = sweep_compositions(variants, self.composition_manager.composition_class)
+        if not save and not outputs:
+            for comp in compositions:
+                yield comp, None, None
+            return
+        
+        if save:
+            # Worker processes write the files; make sure queued saves of
+            # this process land first
+            self.composition_manager.flush()
+        manager = self.composition_manager
+        worker = partial(render_composition, outputs=outputs, output_directory=output_directory,
+                         save_directory=manager.save_directory if save else None, timbre=timbre,
+                         manager_options=manager.storage_options())
+        # Compositions are paired with their results as the pool hands them back
+        pending = deque()
+        def submitted():
+            for comp in compositions:
+                pending.append(comp)
+                yield comp
+        for result, error in ordered_map(worker, submitted(), workers, use_processes=True):
+            yield pending.popleft(), result, error
+    
+    @traced(category='generator')
+    def play_composition(self, composition=None, use_rhythm=True, timbre=None):
         # Play a composition
         # composition: composition to play (uses current if None)
         # use_rhythm: whether to use rhythm patterns
+        # timbre: sequence type name or partial amplitudes for additive
+        #         synthesis (None plays plain beeps)
         if composition is None:
             composition = self.current_composition
         
         if composition is None:
-            print("No composition to play. Generate one first.")
+            self.emit(Notice, "No composition to play. Generate one first.")
             return
         
-        print(f"Playing composition: {composition.name}")
-        print(f"Sequence type: {composition.sequence_type}")
-        print(f"Tempo: {composition.tempo} BPM")
-        print(f"Scale: {composition.scale_type}")
-        print(f"Rhythm: {composition.rhythm_pattern}")
+        self.emit(PlaybackStarted, composition, timbre)
         
-        if use_rhythm:
-            # Create rhythm pattern
-            rhythm_pattern = self.audio_engine.create_rhythm_pattern(
-                composition.rhythm_pattern, len(composition.notes)
-            )
+        if timbre is not None:
+            # Render the whole melody with a mathematically derived timbre
+            rhythm_pattern = None
+            if use_rhythm:
+                rhythm_pattern = resolve_rhythm(composition.rhythm_pattern)
+            self.audio_engine.play_additive(composition.notes, rhythm_pattern, timbre)
+        elif use_rhythm:
+            # Durations are looked up note by note as the melody plays
+            rhythm_pattern = resolve_rhythm(composition.rhythm_pattern)
             self.audio_engine.play_sequence_with_rhythm(
                 composition.notes, rhythm_pattern, composition.tempo
             )
@@ -144,25 +241,17 @@ class MelodyGenerator:
         # Stop the currently playing melody
         self.audio_engine.stop_melody()
     
-    def list_saved_compositions(self):
-        # List all saved compositions
-        compositions = self.composition_manager.list_compositions()
-        
-        if not compositions:
-            print("No saved compositions found.")
-            return
-        
-        print("\nSaved Compositions:")
-        print("-" * 50)
-        for i, comp in enumerate(compositions, 1):
-            print(f"{i}. {comp['name']}")
-            print(f"   Type: {comp['sequence_type']}")
-            print(f"   Tempo: {comp['tempo']} BPM")
-            print(f"   Scale: {comp['scale_type']}")
-            print(f"   Notes: {len(comp['notes'])}")
-            print(f"   Created: {comp['created_date'][:10]}")
-            print()
+    @traced(category='generator')
+    def list_saved_compositions(self, **filters):
+        # List saved compositions
+        # filters: optional CompositionManager.query() arguments, e.g.
+        #          sequence_type='primes' or order_by='-created_date'
+        # returns: list of composition metadata dictionaries
+        compositions = self.composition_manager.query(**filters)
+        self.emit(CompositionsListed, compositions)
+        return compositions
     
+    @traced(category='generator')
     def load_composition(self, filename):
         # Load a composition from file
         # filename: name of the file to load
@@ -178,31 +267,41 @@ class MelodyGenerator:
         # returns: True if successful, False otherwise
         return self.composition_manager.delete_composition(name)
     
+    @traced(category='generator')
+    def export_midi(self, filepath=None, composition=None):
+        # Export a composition as a Standard MIDI File
+        # filepath: destination (defaults to the composition name in the
+        #           compositions directory)
+        # composition: composition to export (uses current if None)
+        # returns: path of the MIDI file, or None if failed
+        if composition is None:
+            composition = self.current_composition
+        
+        if composition is None:
+            self.emit(Notice, "No composition to export. Generate one first.")
+            return None
+        
+        if filepath is None:
+            filepath = os.path.join(
+                self.composition_manager.save_directory,
+                f"{file_stem(composition.name)}{MIDI_EXTENSION}"
+            )
+        # Only the stages changed since the last export are encoded again
+        if not save_composition_midi(composition, filepath):
+            return None
+        self.emit(CompositionExported, composition, filepath)
+        return filepath
+    
     def get_composition_info(self, composition=None):
         # Get information about a composition
         # composition: composition to get info for (uses current if None)
+        # returns: the composition, or None if there is none
         if composition is None:
             composition = self.current_composition
         
         if composition is None:
-            print("No composition loaded.")
-            return
+            self.emit(Notice, "No composition loaded.")
+            return None
         
-        print(f"\nComposition Information:")
-        print("-" * 30)
-        print(f"Name: {composition.name}")
-        print(f"Sequence Type: {composition.sequence_type}")
-        print(f"Number of Notes: {len(composition.notes)}")
-        print(f"Tempo: {composition.tempo} BPM")
-        print(f"Scale: {composition.scale_type}")
-        print(f"Rhythm Pattern: {composition.rhythm_pattern}")
-        print(f"Created: {composition.created_date[:19]}")
-        print(f"Modified: {composition.modified_date[:19]}")
-        
-        # Show first few notes
-        if composition.notes:
-            print(f"\nFirst 10 notes (frequencies in Hz):")
-            for i, note in enumerate(composition.notes[:10]):
-                print(f"  Note {i+1}: {note:.2f} Hz")
-            if len(composition.notes) > 10:
-                print(f"  ... and {len(composition.notes) - 10} more notes")
+        self.emit(CompositionInfo, composition)
+        return composition
@@ -0,0 +1,189 @@
+# Standard MIDI File export
+# Writes compositions as Standard MIDI Files without any MIDI library, so
+# they can be opened in a DAW. Frequencies are quantized to MIDI note numbers
+# with a precomputed table of note boundaries, and rhythm durations become
+# ticks with 500 ms (one beat at 120 BPM) as a quarter note. The composition
+# tempo is written as a tempo event, so it sets the playback speed.
+
+import os
+import struct
+
+import numpy as np
+
+from rhythm import resolve_rhythm
+
+MIDI_EXTENSION = '.mid'
+TICKS_PER_QUARTER = 480
+QUARTER_NOTE_MS = 500
+DEFAULT_VELOCITY = 96
+# Frequency boundaries between neighbouring MIDI notes: note m covers
+# frequencies from NOTE_BOUNDARIES[m - 1] up to NOTE_BOUNDARIES[m]
+NOTE_BOUNDARIES = 440.0 * 2.0 ** ((np.arange(127) - 69 + 0.5) / 12)
+# Variable-length quantities of common delta times, computed once
+VLQ_CACHE_SIZE = 16 * TICKS_PER_QUARTER
+
+def _encode_vlq(value):
+    # MIDI variable-length quantity: 7 bits per byte, high bit set on all
+    # but the last byte
+    encoded = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        encoded.insert(0, 0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(encoded)
+
+VLQ_TABLE = [_encode_vlq(value) for value in range(VLQ_CACHE_SIZE)]
+
+def vlq(value):
+    # Variable-length quantity of a delta time
+    return VLQ_TABLE[value] if value < VLQ_CACHE_SIZE else _encode_vlq(value)
+
+def frequencies_to_midi(frequencies):
+    # Quantize frequencies to the nearest MIDI note numbers
+    # frequencies: sequence of frequencies in Hz
+    # returns: int array of MIDI note numbers (0-127)
+    return np.searchsorted(NOTE_BOUNDARIES, np.asarray(frequencies, dtype=np.float64))
+
+def durations_to_ticks(durations_ms):
+    # Convert note durations in milliseconds to ticks (at least one tick)
+    # durations_ms: sequence of durations
+    # returns: int array of tick durations
+    ticks = np.rint(np.asarray(durations_ms, dtype=np.float64) * TICKS_PER_QUARTER / QUARTER_NOTE_MS)
+    return np.maximum(ticks, 1).astype(np.int64)
+
+def tempo_event(bpm):
+    # Set-tempo meta event (microseconds per quarter note)
+    microseconds = int(round(60000000 / max(bpm, 1)))
+    return b'\xff\x51\x03' + min(microseconds, 0xFFFFFF).to_bytes(3, 'big')
+
+def text_event(kind, text):
+    # Text meta event, e.g. 0x03 track name or 0x06 marker
+    data = text.encode('utf-8')
+    return bytes([0xFF, kind]) + vlq(len(data)) + data
+
+def encode_events(deltas, statuses, data1, data2):
+    # Encode three-byte channel events in one vectorized pass
+    # Every event is written as its delta time (a variable-length quantity)
+    # followed by its status and two data bytes.
+    # deltas: delta time of every event in ticks
+    # statuses: status byte of every event, e.g. 0x90 | channel
+    # data1, data2: data bytes of every event (pitch and velocity)
+    # returns: event bytes
+    deltas = np.asarray(deltas, dtype=np.int64)
+    # Bytes of every delta time: one per started group of 7 bits
+    sizes = np.ones(len(deltas), dtype=np.int64)
+    shift = 7
+    while np.any(deltas >> shift):
+        sizes += (deltas >> shift) > 0
+        shift += 7
+    ends = np.cumsum(sizes + 3)
+    starts = ends - sizes - 3
+    data = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    for group in range(shift // 7):
+        written = sizes > group
+        # The lowest 7 bits come last and are the only group without the
+        # continuation bit
+        positions = starts[written] + sizes[written] - 1 - group
+        data[positions] = (deltas[written] >> (7 * group)) & 0x7F | (0x80 if group else 0)
+    status_positions = starts + sizes
+    data[status_positions] = statuses
+    data[status_positions + 1] = data1
+    data[status_positions + 2] = data2
+    return data.tobytes()
+
+def note_events(pitches, ticks, channel=0, velocity=DEFAULT_VELOCITY, lead_ticks=0):
+    # Note on/off events of a monophonic melody
+    # pitches: MIDI note numbers
+    # ticks: tick duration of every note
+    # channel: MIDI channel (0-15)
+    # lead_ticks: delta time before the first note
+    # returns: (event bytes, total ticks of the melody)
+    pitches = np.asarray(pitches)
+    ticks = np.asarray(ticks, dtype=np.int64)
+    # Every note-on directly follows the previous note-off
+    deltas = np.zeros(2 * len(pitches), dtype=np.int64)
+    deltas[1::2] = ticks
+    if len(deltas):
+        deltas[0] = lead_ticks
+    statuses = np.tile(np.array([0x90 | channel, 0x80 | channel], dtype=np.uint8), len(pitches))
+    velocities = np.tile(np.array([velocity, 0], dtype=np.uint8), len(pitches))
+    events = encode_events(deltas, statuses, np.repeat(pitches, 2), velocities)
+    return events, int(ticks.sum())
+
+def midi_channel(index):
+    # MIDI channel of the index-th track or voice, skipping the drum channel 9
+    index %= 15
+    return index if index < 9 else index + 1
+
+def track_chunk(events):
+    # Wrap track events in an MTrk chunk with an end-of-track event
+    data = events + b'\x00\xff\x2f\x00'
+    return b'MTrk' + struct.pack('>I', len(data)) + data
+
+def header_chunk(midi_format, track_count):
+    return b'MThd' + struct.pack('>IHHH', 6, midi_format, track_count, TICKS_PER_QUARTER)
+
+def composition_events(comp, durations_ms=None):
+    # Pitches and tick durations of a composition
+    # comp: Composition
+    # durations_ms: note durations (defaults to the composition's rhythm)
+    # returns: (pitch array, tick array)
+    notes = np.asarray(comp.notes, dtype=np.float64)
+    if durations_ms is None:
+        durations_ms = resolve_rhythm(comp.rhythm_pattern).durations(len(notes))
+    return frequencies_to_midi(notes), durations_to_ticks(durations_ms)
+
+def composition_to_midi(comp, durations_ms=None, velocity=DEFAULT_VELOCITY):
+    # Encode a composition as a single-track (format 0) MIDI file
+    # comp: Composition
+    # durations_ms: note durations (defaults to the composition's rhythm)
+    # velocity: note velocity (1-127)
+    # returns: bytes of the MIDI file
+    pitches, ticks = composition_events(comp, durations_ms)
+    events, _length = note_events(pitches, ticks, velocity=velocity)
+    meta = b'\x00' + text_event(0x03, comp.name) + b'\x00' + tempo_event(comp.tempo)
+    return header_chunk(0, 1) + track_chunk(meta + events)
+
+def symphony_to_midi(compositions, title="Symphony", velocity=DEFAULT_VELOCITY):
+    # Encode movements as one multi-track (format 1) MIDI file
+    # The first track holds the title, a marker and tempo change at the start
+    # of every movement; each movement gets its own track and channel and
+    # starts where the previous one ended.
+    # compositions: movements in playing order
+    # title: title of the symphony
+    # velocity: note velocity (1-127)
+    # returns: bytes of the MIDI file
+    conductor = b'\x00' + text_event(0x03, title)
+    tracks = []
+    start = 0
+    previous_start = 0
+    for idx, comp in enumerate(compositions):
+        pitches, ticks = composition_events(comp)
+        events, length = note_events(pitches, ticks, midi_channel(idx), velocity, lead_ticks=start)
+        tracks.append(track_chunk(b'\x00' + text_event(0x03, comp.name) + events))
+        conductor += vlq(start - previous_start) + text_event(0x06, comp.name)
+        conductor += b'\x00' + tempo_event(comp.tempo)
+        previous_start = start
+        start += length
+    chunks = [track_chunk(conductor)] + tracks
+    return header_chunk(1, len(chunks)) + b''.join(chunks)
+
+def save_midi(compositions, filepath, title=None):
+    # Write a composition, or a list of movements, as a MIDI file
+    # compositions: Composition or list of compositions
+    # filepath: destination path
+    # title: title of a multi-track file (defaults to the file name)
+    # returns: True if successful, False otherwise
+    try:
+        if isinstance(compositions, (list, tuple)):
+            if title is None:
+                title = os.path.splitext(os.path.basename(filepath))[0]
+            data = symphony_to_midi(compositions, title)
+        else:
+            data = composition_to_midi(compositions)
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        return True
+    except Exception as e:
+        print(f"Error exporting MIDI file: {e}")
+        return False
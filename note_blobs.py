@@ -0,0 +1,221 @@
+# Content-addressed, delta-compressed note storage
+# Notes are stored once per distinct melody in a blob named by a hash of the
+# notes, so compositions that share a melody (same sequence and scale at a
+# different tempo or rhythm) share one blob. A blob stores each note as its
+# index into a sorted pitch table - the scale across all octaves for
+# sequence-derived melodies, otherwise the melody's own distinct pitches -
+# and the index deltas as zigzag variable-length integers.
+
+import hashlib
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from composition_storage import atomic_write
+from math_sequences import SCALE_BASE_NOTES
+
+BLOB_DIRECTORY = '.blobs'
+BLOB_EXTENSION = '.nb'
+BLOB_MAGIC = b'MFNB'
+BLOB_VERSION = 1
+# magic, version, encoding, flags, note count
+BLOB_HEADER = struct.Struct('<4sBBBQ')
+ENCODING_SCALE = 0
+ENCODING_PALETTE = 1
+FLAG_ZLIB = 1
+# Unreferenced blobs younger than this survive garbage collection, since
+# another process may have written the blob but not yet its composition
+GC_GRACE_SECONDS = 3600
+
+SCALE_NAMES = sorted(SCALE_BASE_NOTES)
+_scale_tables = {}
+
+def scale_table(scale_type):
+    # Sorted distinct pitches sequence_to_notes can produce for a scale
+    # scale_type: 'major', 'minor' or 'pentatonic'
+    # returns: float64 array of frequencies
+    table = _scale_tables.get(scale_type)
+    if table is None:
+        base = np.asarray(SCALE_BASE_NOTES[scale_type])
+        pitches = base[None, :] * (2.0 ** np.arange(16))[:, None]
+        table = np.unique(np.clip(pitches, 20, 20000))
+        _scale_tables[scale_type] = table
+    return table
+
+def notes_key(notes):
+    # Content address of a melody
+    # notes: sequence of note frequencies
+    # returns: hex digest of the notes as little-endian float64
+    values = np.ascontiguousarray(notes, dtype='<f8')
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+def encode_varints(values):
+    # Encode non-negative integers as LEB128 variable-length integers
+    # values: uint64 array
+    # returns: bytes
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+    if values.max() < 128:
+        return values.astype(np.uint8).tobytes()
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest > 0
+        rest >>= np.uint64(7)
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    encoded = np.zeros(ends[-1], dtype=np.uint8)
+    for byte in range(int(sizes.max())):
+        selected = sizes > byte
+        chunk = (values[selected] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        more = (sizes[selected] > byte + 1).astype(np.uint8) << 7
+        encoded[starts[selected] + byte] = chunk.astype(np.uint8) | more
+    return encoded.tobytes()
+
+def decode_varints(data, count):
+    # Decode LEB128 variable-length integers
+    # data: bytes
+    # count: number of integers expected
+    # returns: uint64 array
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(encoded < 128)
+    if len(ends) != count:
+        raise ValueError(f"Expected {count} integers in note blob, found {len(ends)}")
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if len(encoded) == count:
+        return encoded.astype(np.uint64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    positions = np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1)
+    parts = (encoded & 0x7F).astype(np.uint64) << (7 * positions).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+def encode_note_blob(notes, scale_type=None):
+    # Encode a melody as a compact note blob
+    # notes: sequence of note frequencies
+    # scale_type: scale the notes were mapped to, if known
+    # returns: bytes
+    values = np.asarray(notes, dtype=np.float64)
+    encoding = ENCODING_PALETTE
+    if scale_type in SCALE_BASE_NOTES:
+        table = scale_table(scale_type)
+        indices = np.searchsorted(table, values)
+        if np.array_equal(table[np.minimum(indices, len(table) - 1)], values):
+            encoding = ENCODING_SCALE
+    if encoding == ENCODING_SCALE:
+        table_bytes = bytes([SCALE_NAMES.index(scale_type)])
+    else:
+        table, indices = np.unique(values, return_inverse=True)
+        table_bytes = encode_varints([len(table)]) + table.astype('<f8').tobytes()
+
+    # Zigzag-encoded deltas keep small steps in either direction to one byte
+    deltas = np.diff(indices.astype(np.int64), prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    payload = table_bytes + encode_varints(zigzag.astype(np.uint64))
+
+    flags = 0
+    compressed = zlib.compress(payload, 6)
+    if len(compressed) < len(payload):
+        payload = compressed
+        flags |= FLAG_ZLIB
+    return BLOB_HEADER.pack(BLOB_MAGIC, BLOB_VERSION, encoding, flags, len(values)) + payload
+
+def decode_note_blob(blob):
+    # Decode a note blob
+    # blob: bytes from encode_note_blob
+    # returns: float64 array of note frequencies
+    magic, version, encoding, flags, count = BLOB_HEADER.unpack_from(blob)
+    if magic != BLOB_MAGIC:
+        raise ValueError("Not a note blob")
+    if version > BLOB_VERSION:
+        raise ValueError(f"Unsupported note blob version {version}")
+    payload = blob[BLOB_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+
+    if encoding == ENCODING_SCALE:
+        table = scale_table(SCALE_NAMES[payload[0]])
+        offset = 1
+    elif encoding == ENCODING_PALETTE:
+        end = 0
+        while payload[end] >= 128:
+            end += 1
+        table_size = int(decode_varints(payload[:end + 1], 1)[0])
+        offset = end + 1 + 8 * table_size
+        table = np.frombuffer(payload[end + 1:offset], dtype='<f8')
+    else:
+        raise ValueError(f"Unknown note blob encoding {encoding}")
+
+    zigzag = decode_varints(payload[offset:], count)
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    return table[np.cumsum(deltas)]
+
+class NoteBlobStore:
+    def __init__(self, save_directory):
+        # Blob store inside a composition save directory
+        # save_directory: directory holding the composition files
+        self.directory = os.path.join(save_directory, BLOB_DIRECTORY)
+
+    def blob_path(self, key):
+        # Blobs are spread over subdirectories by the first key characters
+        return os.path.join(self.directory, key[:2], f"{key}{BLOB_EXTENSION}")
+
+    def put(self, notes, scale_type=None):
+        # Store a melody unless an identical one is stored already
+        # notes: sequence of note frequencies
+        # scale_type: scale the notes were mapped to, if known
+        # returns: content key of the blob
+        key = notes_key(notes)
+        path = self.blob_path(key)
+        if os.path.exists(path):
+            # Refresh the mtime so garbage collection sees the blob in use
+            os.utime(path)
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = encode_note_blob(notes, scale_type)
+        atomic_write(path, lambda f: f.write(blob), binary=True)
+        return key
+
+    def get(self, key):
+        # Read a melody
+        # key: content key from put()
+        # returns: list of note frequencies
+        with open(self.blob_path(key), 'rb') as f:
+            return decode_note_blob(f.read()).tolist()
+
+    def keys(self):
+        # Content keys of every stored blob
+        if not os.path.exists(self.directory):
+            return
+        for subdirectory in os.scandir(self.directory):
+            if subdirectory.is_dir():
+                for entry in os.scandir(subdirectory.path):
+                    if entry.name.endswith(BLOB_EXTENSION):
+                        yield entry.name[:-len(BLOB_EXTENSION)]
+
+    def size(self):
+        # Total bytes of stored blobs
+        return sum(os.path.getsize(self.blob_path(key)) for key in self.keys())
+
+    def collect_garbage(self, referenced, grace_seconds=GC_GRACE_SECONDS):
+        # Remove blobs no composition refers to
+        # referenced: set of content keys still in use
+        # grace_seconds: keep unreferenced blobs younger than this
+        # returns: number of blobs removed
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for key in list(self.keys()):
+            if key in referenced:
+                continue
+            path = self.blob_path(key)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
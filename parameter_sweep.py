@@ -0,0 +1,93 @@
+# Parameter sweeps over sequence length, tempo, scale and rhythm
+# A sweep spec gives a value or a list of values per parameter and expands
+# to every combination. Variants share their expensive work: each sequence
+# is generated once at the largest requested length (all sequences are
+# prefix-stable, so shorter lengths are slices of it) and mapped to all the
+# requested scales in one vectorized pass. Only tempo, rhythm and name
+# differ between the compositions built from the same notes.
+
+from itertools import product
+
+from composition import Composition
+from math_sequences import SCALE_BASE_NOTES, SEQUENCE_GENERATORS, generate_sequence, sequence_to_notes_by_scale
+from rhythm import is_rhythm_pattern
+
+# Parameters in the order variants are expanded (the last varies fastest)
+SWEEP_PARAMETERS = ('sequence_type', 'n', 'scale_type', 'rhythm_pattern', 'tempo')
+SWEEP_DEFAULTS = {
+    'n': 10,
+    'scale_type': 'major',
+    'rhythm_pattern': 'simple',
+    'tempo': 120,
+}
+DEFAULT_NAME_TEMPLATE = "{sequence_type}_{n}_{scale_type}_{rhythm_pattern}_{tempo}"
+
+def expand_sweep(sweep_spec):
+    # Expand a sweep spec to its variants
+    # sweep_spec: dictionary of SWEEP_PARAMETERS to a value or list of values
+    #             ('sequence_type' is required), plus an optional
+    #             'name_template' formatted with the variant's parameters
+    # returns: list of variant dictionaries, including their 'name'
+    # raises: ValueError if the spec is invalid
+    unknown = set(sweep_spec) - set(SWEEP_PARAMETERS) - {'name_template'}
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    if 'sequence_type' not in sweep_spec:
+        raise ValueError("A sweep needs a 'sequence_type'")
+
+    values = []
+    for parameter in SWEEP_PARAMETERS:
+        value = sweep_spec.get(parameter, SWEEP_DEFAULTS.get(parameter))
+        values.append(list(value) if isinstance(value, (list, tuple, range)) else [value])
+    for sequence_type in values[0]:
+        if sequence_type not in SEQUENCE_GENERATORS:
+            raise ValueError(f"Unknown sequence type: {sequence_type}")
+    for n in values[1]:
+        if not isinstance(n, int) or n <= 0:
+            raise ValueError(f"Sequence lengths must be positive integers, got {n!r}")
+    for scale_type in values[2]:
+        if scale_type not in SCALE_BASE_NOTES:
+            raise ValueError(f"Unknown scale type: {scale_type}")
+    for rhythm_pattern in values[3]:
+        if not is_rhythm_pattern(rhythm_pattern):
+            raise ValueError(f"Unknown rhythm pattern: {rhythm_pattern}")
+
+    name_template = sweep_spec.get('name_template', DEFAULT_NAME_TEMPLATE)
+    variants = []
+    for combination in product(*values):
+        variant = dict(zip(SWEEP_PARAMETERS, combination))
+        variant['name'] = name_template.format(**variant)
+        variants.append(variant)
+    return variants
+
+def sweep_notes(variants):
+    # Notes of every (sequence type, scale) pair used by the variants
+    # variants: variants from expand_sweep
+    # returns: dictionary of (sequence_type, scale_type) to a float64 note
+    #          array at the largest n requested for the sequence
+    lengths = {}
+    scales = {}
+    for variant in variants:
+        sequence_type = variant['sequence_type']
+        lengths[sequence_type] = max(lengths.get(sequence_type, 0), variant['n'])
+        scales.setdefault(sequence_type, set()).add(variant['scale_type'])
+    notes = {}
+    for sequence_type, n in lengths.items():
+        sequence = generate_sequence(sequence_type, n)
+        for scale_type, scale_notes in sequence_to_notes_by_scale(sequence, sorted(scales[sequence_type])).items():
+            notes[(sequence_type, scale_type)] = scale_notes
+    return notes
+
+def sweep_compositions(variants, composition_class=Composition):
+    # Build the compositions of a sweep, one at a time
+    # variants: variants from expand_sweep
+    # composition_class: Composition or CompactComposition
+    # yields: compositions in variant order, each with a recipe
+    notes = sweep_notes(variants)
+    for variant in variants:
+        sequence_type, n, scale_type = variant['sequence_type'], variant['n'], variant['scale_type']
+        recipe = {'sequence_type': sequence_type, 'n': n, 'scale_type': scale_type}
+        yield composition_class(
+            variant['name'], sequence_type, notes[(sequence_type, scale_type)][:n].tolist(),
+            variant['tempo'], scale_type, variant['rhythm_pattern'], recipe
+        )
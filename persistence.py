@@ -0,0 +1,126 @@
+# Write-behind persistence queue for compositions
+# Saves are queued and written by a background thread, which takes whatever
+# has accumulated as one batch. Repeated saves of the same file before it is
+# written are coalesced, so only the latest version hits the disk.
+
+import atexit
+import threading
+from collections import OrderedDict
+
+class WriteBehindQueue:
+    def __init__(self, write_batch, batch_size=64, batch_delay=0.05):
+        # Start the background writer
+        # write_batch: function(list of (filename, composition)) that writes a
+        #   batch and returns a list of (filename, exception) failures
+        # batch_size: maximum number of compositions written per batch
+        # batch_delay: seconds to wait for more saves before writing a batch
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.pending = OrderedDict()  # filename -> composition
+        self.in_flight = {}  # filename -> composition being written
+        self.errors = []
+        self.flush_waiters = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="composition-writer")
+        self.thread.daemon = True
+        self.thread.start()
+        # Never lose queued saves when the program exits normally
+        atexit.register(self.close)
+
+    def submit(self, filename, comp):
+        # Queue a composition to be written
+        # filename: file name inside the save directory
+        # comp: snapshot of the composition (must not be modified afterwards)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Write-behind queue is closed")
+            self.pending.pop(filename, None)
+            self.pending[filename] = comp
+            self.condition.notify_all()
+
+    def lookup(self, filename):
+        # Composition queued or being written for a file, if any
+        with self.condition:
+            comp = self.pending.get(filename)
+            if comp is None:
+                comp = self.in_flight.get(filename)
+            return comp
+
+    def discard(self, filename):
+        # Drop a queued save and wait until the file is not being written
+        # returns: True if a queued save was dropped
+        with self.condition:
+            dropped = self.pending.pop(filename, None) is not None
+            while filename in self.in_flight:
+                self.condition.wait()
+            return dropped
+
+    def has_pending(self):
+        # Whether any saves are queued or being written
+        with self.condition:
+            return bool(self.pending or self.in_flight)
+
+    def flush(self, timeout=None):
+        # Wait until every queued save has been written
+        # timeout: maximum seconds to wait (None waits forever)
+        # returns: list of (filename, exception) failures since the last flush
+        with self.condition:
+            self.flush_waiters += 1
+            self.condition.notify_all()
+            try:
+                self.condition.wait_for(lambda: not self.pending and not self.in_flight, timeout)
+            finally:
+                self.flush_waiters -= 1
+            errors, self.errors = self.errors, []
+            return errors
+
+    def close(self):
+        # Write everything that is queued and stop the background writer
+        # returns: list of (filename, exception) failures since the last flush
+        with self.condition:
+            if self.closed:
+                return []
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        atexit.unregister(self.close)
+        errors, self.errors = self.errors, []
+        return errors
+
+    def _next_batch(self):
+        # Wait for queued saves and take up to batch_size of them
+        with self.condition:
+            while not self.pending and not self.closed:
+                self.condition.wait()
+            if not self.pending:
+                return None
+            # Give the producer a moment to queue more saves
+            self.condition.wait_for(
+                lambda: (len(self.pending) >= self.batch_size or self.closed
+                         or self.flush_waiters > 0),
+                self.batch_delay
+            )
+            batch = []
+            while self.pending and len(batch) < self.batch_size:
+                batch.append(self.pending.popitem(last=False))
+            self.in_flight.update(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                failures = self.write_batch(batch)
+            except Exception as e:
+                failures = [(filename, e) for filename, _comp in batch]
+            with self.condition:
+                for filename, error in failures:
+                    print(f"Error saving composition file '{filename}': {error}")
+                self.errors.extend(failures)
+                for filename, _comp in batch:
+                    self.in_flight.pop(filename, None)
+                self.condition.notify_all()
@@ -0,0 +1,199 @@
+# Rhythm patterns for melodies
+# A rhythm repeats a short cycle of note durations (in milliseconds, where
+# 500 ms is one beat at the nominal 120 BPM). Rhythms are kept as their
+# cycle, so the duration and onset of note i are O(1) lookups and nothing
+# is materialized per note: live playback walks the cycle lazily and
+# offline rendering tiles it into an array in one vectorized step.
+#
+# Besides the named cycles, rhythm patterns can be given as specs:
+#   'euclid:3:8'            Euclidean rhythm, 3 onsets spread over 8 steps
+#   'euclid:5:8:2'          5 onsets over 8 steps, rotated by 2 notes
+#   'sequence:prime_gaps'   durations from a sequence (here 1, 2, 2, 4, ...)
+#   'sequence:pi:12'        the first 12 values of a sequence
+#   'tuplets:3,2,1'         beats split into a triplet, a duplet and one note
+#   'cycle:750,750,500'     an explicit cycle of durations in milliseconds
+
+from functools import lru_cache
+
+import numpy as np
+
+from math_sequences import SEQUENCE_GENERATORS, generate_sequence
+
+# Durations of one cycle of each rhythm pattern
+RHYTHM_CYCLES = {
+    'simple': [500],               # all notes equal duration
+    'waltz': [800, 400, 400],      # 3/4 time: strong beat, two weak beats
+    'march': [600, 200, 400, 200], # 4/4 time: strong, weak, medium, weak
+}
+DEFAULT_NOTE_DURATION = 500
+BEAT_MS = 500
+# Step length of Euclidean rhythms (an eighth note at 120 BPM)
+EUCLIDEAN_STEP_MS = 250
+# Duration unit of sequence-derived rhythms; values are clamped to 1-8 units
+SEQUENCE_UNIT_MS = 125
+SEQUENCE_MAX_UNITS = 8
+SEQUENCE_RHYTHM_LENGTH = 16
+# Longest cycle rhythm_spec looks for before spelling out every duration
+MAX_SPEC_PERIOD = 64
+
+class Rhythm:
+    def __init__(self, cycle, name=None):
+        # A rhythm repeating a cycle of note durations
+        # cycle: durations in milliseconds (at least one, all positive and finite)
+        # name: rhythm pattern name or spec it was created from
+        # Rhythms are cached and shared per spec, so their arrays are read-only
+        cycle = np.array(cycle, dtype=np.float64)
+        if cycle.ndim != 1 or len(cycle) == 0 or not np.isfinite(cycle).all() or np.any(cycle <= 0):
+            raise ValueError("A rhythm cycle needs at least one positive, finite duration")
+        cycle.flags.writeable = False
+        self.name = name
+        self.cycle = cycle
+        # Onset of every note of the cycle, relative to the cycle start
+        self._offsets = np.concatenate(([0.0], np.cumsum(cycle)[:-1]))
+        self._offsets.flags.writeable = False
+        self.cycle_ms = float(cycle.sum())
+        self._cycle_list = cycle.tolist()
+        self._offset_list = self._offsets.tolist()
+
+    def __len__(self):
+        # Notes per cycle
+        return len(self._cycle_list)
+
+    def __repr__(self):
+        return f"Rhythm({self.name or self._cycle_list!r})"
+
+    def duration(self, i):
+        # Duration of note i in milliseconds
+        return self._cycle_list[i % len(self._cycle_list)]
+
+    def onset(self, i):
+        # Start time of note i in milliseconds
+        cycles, position = divmod(i, len(self._cycle_list))
+        return cycles * self.cycle_ms + self._offset_list[position]
+
+    def total_ms(self, num_notes):
+        # Length of the first num_notes notes in milliseconds
+        return self.onset(num_notes)
+
+    def iter_durations(self, num_notes=None):
+        # Lazily yield note durations (forever if num_notes is None)
+        cycle = self._cycle_list
+        i = 0
+        while num_notes is None or i < num_notes:
+            yield cycle[i % len(cycle)]
+            i += 1
+
+    def durations(self, num_notes):
+        # Durations of the first num_notes notes as a float64 array
+        return np.resize(self.cycle, num_notes)
+
+    def take(self, num_notes):
+        # Durations of the first num_notes notes as a list
+        return self.durations(num_notes).tolist()
+
+def euclidean_rhythm(pulses, steps, rotation=0, step_ms=EUCLIDEAN_STEP_MS):
+    # Euclidean rhythm: pulses onsets spread as evenly as possible over steps
+    # Each note lasts until the next onset, e.g. 3 over 8 gives 3-3-2 steps
+    # (the tresillo); the patterns are Bjorklund's up to rotation
+    # pulses: number of notes per cycle
+    # steps: number of steps per cycle
+    # rotation: notes the pattern is rotated by
+    # step_ms: duration of one step
+    # returns: Rhythm
+    if not 0 < pulses <= steps:
+        raise ValueError(f"A Euclidean rhythm needs 0 < pulses <= steps, got {pulses}:{steps}")
+    onsets = [-(-k * steps // pulses) for k in range(pulses)] + [steps]
+    gaps = np.roll(np.diff(onsets), -rotation)
+    return Rhythm(gaps * step_ms, f"euclid:{pulses}:{steps}" + (f":{rotation}" if rotation else ""))
+
+def sequence_rhythm(sequence, unit_ms=SEQUENCE_UNIT_MS, max_units=SEQUENCE_MAX_UNITS, name=None):
+    # Rhythm whose durations follow a sequence, e.g. prime gaps
+    # sequence: numbers; each becomes that many units (clamped to 1-max_units)
+    # unit_ms: duration of one unit
+    # returns: Rhythm
+    units = np.clip(np.abs(np.asarray(sequence, dtype=np.float64)), 1, max_units)
+    return Rhythm(units * unit_ms, name)
+
+def tuplet_rhythm(groups, beat_ms=BEAT_MS):
+    # Rhythm splitting consecutive beats into equal tuplets
+    # groups: notes per beat, e.g. [3, 2, 1] for a triplet, a duplet and a
+    #         whole beat
+    # beat_ms: duration of one beat
+    # returns: Rhythm
+    if not groups or any(count <= 0 for count in groups):
+        raise ValueError("Tuplet groups need at least one positive note count")
+    cycle = [beat_ms / count for count in groups for _ in range(count)]
+    return Rhythm(cycle, "tuplets:" + ",".join(str(count) for count in groups))
+
+@lru_cache(maxsize=256)
+def _parse_rhythm(pattern):
+    if pattern in RHYTHM_CYCLES:
+        return Rhythm(RHYTHM_CYCLES[pattern], pattern)
+    kind, _, arguments = pattern.partition(':')
+    parts = arguments.split(':') if arguments else []
+    try:
+        if kind == 'euclid' and len(parts) in (2, 3):
+            return euclidean_rhythm(*(int(part) for part in parts))
+        if kind == 'sequence' and len(parts) in (1, 2) and parts[0] in SEQUENCE_GENERATORS:
+            length = int(parts[1]) if len(parts) == 2 else SEQUENCE_RHYTHM_LENGTH
+            return sequence_rhythm(generate_sequence(parts[0], length), name=pattern)
+        if kind == 'tuplets' and len(parts) == 1:
+            return tuplet_rhythm([int(count) for count in parts[0].split(',')])
+        if kind == 'cycle' and len(parts) == 1:
+            return Rhythm([float(duration) for duration in parts[0].split(',')], pattern)
+    except ValueError as e:
+        raise ValueError(f"Invalid rhythm pattern '{pattern}': {e}")
+    raise ValueError(f"Unknown rhythm pattern: {pattern}")
+
+def get_rhythm(pattern):
+    # Resolve a rhythm pattern name or spec
+    # pattern: Rhythm, a RHYTHM_CYCLES name or a spec such as 'euclid:3:8'
+    # returns: Rhythm (cached per spec)
+    # raises: ValueError for unknown or invalid patterns
+    if isinstance(pattern, Rhythm):
+        return pattern
+    if not isinstance(pattern, str):
+        raise ValueError(f"Unknown rhythm pattern: {pattern!r}")
+    return _parse_rhythm(pattern)
+
+def is_rhythm_pattern(pattern):
+    # Whether a rhythm pattern name or spec is valid
+    try:
+        get_rhythm(pattern)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def resolve_rhythm(pattern):
+    # Rhythm of a composition's pattern; unknown patterns play plain beats
+    try:
+        return get_rhythm(pattern)
+    except (TypeError, ValueError):
+        return Rhythm([DEFAULT_NOTE_DURATION], 'simple')
+
+def rhythm_spec(durations_ms, max_period=MAX_SPEC_PERIOD):
+    # Rhythm pattern reproducing a list of note durations
+    # Finds the shortest repeating cycle (up to max_period notes, otherwise
+    # the whole list) and names it: a RHYTHM_CYCLES name when it is one of
+    # them, else a 'cycle:' spec
+    # durations_ms: note durations in milliseconds
+    # returns: rhythm pattern name or spec
+    durations = np.asarray(durations_ms, dtype=np.float64)
+    if len(durations) == 0:
+        return 'simple'
+    cycle = durations
+    for period in range(1, min(max_period, len(durations) - 1) + 1):
+        if np.array_equal(durations[period:], durations[:-period]):
+            cycle = durations[:period]
+            break
+    for name, named_cycle in RHYTHM_CYCLES.items():
+        if len(named_cycle) == len(cycle) and np.array_equal(named_cycle, cycle):
+            return name
+    return "cycle:" + ",".join(f"{duration:g}" for duration in cycle.tolist())
+
+def create_rhythm_pattern(pattern_type='simple', num_notes=8):
+    # Create a rhythm pattern for a melody
+    # pattern_type: rhythm pattern name or spec (unknown ones play plain beats)
+    # num_notes: number of notes in the pattern
+    # returns: list of note durations in milliseconds
+    return resolve_rhythm(pattern_type).take(num_notes)
@@ -0,0 +1,150 @@
+# Event score: one timeline of notes for every voice
+# A score keeps all notes in a single NumPy structured array sorted by onset,
+# with the onset and duration in MIDI ticks (TICKS_PER_QUARTER per beat),
+# the MIDI pitch, the exact frequency, the velocity and the voice of every
+# note. Sorting, slicing by time range, merging voices and MIDI export are
+# vectorized operations over that one contiguous buffer; slices by time are
+# views that copy nothing.
+#
+# Usage:
+#   score = Score.merge([melody.to_score(voice=0), bass.to_score(voice=1)])
+#   chorus = score.between(4 * TICKS_PER_QUARTER, 12 * TICKS_PER_QUARTER)
+#   data = chorus.to_midi("Chorus")
+
+import numpy as np
+
+from midi_export import (
+    DEFAULT_VELOCITY, QUARTER_NOTE_MS, TICKS_PER_QUARTER, composition_events,
+    encode_events, frequencies_to_midi, header_chunk, tempo_event, text_event,
+    track_chunk
+)
+
+SCORE_DTYPE = np.dtype([
+    ('onset_ticks', '<i8'),
+    ('duration_ticks', '<i8'),
+    ('midi_pitch', 'u1'),
+    ('freq', '<f8'),
+    ('velocity', 'u1'),
+    ('voice', '<u2'),
+])
+
+class Score:
+    def __init__(self, events=None, tempo=120):
+        # A score over a structured array of note events
+        # events: array convertible to SCORE_DTYPE (empty if None); sorted by
+        #         onset here unless it already is
+        # tempo: tempo in BPM, which turns ticks into time
+        if events is None:
+            events = np.empty(0, dtype=SCORE_DTYPE)
+        events = np.ascontiguousarray(events, dtype=SCORE_DTYPE)
+        onsets = events['onset_ticks']
+        if len(events) > 1 and np.any(onsets[1:] < onsets[:-1]):
+            # Stable, so notes starting together keep their voice order
+            events = events[np.argsort(onsets, kind='stable')]
+        self.events = events
+        self.tempo = tempo
+
+    @classmethod
+    def from_notes(cls, freqs, duration_ticks, voice=0, velocity=DEFAULT_VELOCITY,
+                   start_ticks=0, tempo=120):
+        # Score of a melody whose notes follow each other
+        # freqs: note frequencies
+        # duration_ticks: tick duration of every note
+        # voice: voice number of the melody
+        # velocity: velocity of every note (one value or one per note)
+        # start_ticks: onset of the first note
+        # tempo: tempo in BPM
+        # returns: Score
+        freqs = np.asarray(freqs, dtype=np.float64)
+        duration_ticks = np.asarray(duration_ticks, dtype=np.int64)
+        events = np.empty(len(freqs), dtype=SCORE_DTYPE)
+        events['duration_ticks'] = duration_ticks
+        np.cumsum(duration_ticks, out=events['onset_ticks'])
+        events['onset_ticks'] += start_ticks - duration_ticks
+        events['freq'] = freqs
+        events['midi_pitch'] = frequencies_to_midi(freqs)
+        events['velocity'] = velocity
+        events['voice'] = voice
+        return cls(events, tempo)
+
+    @classmethod
+    def from_composition(cls, comp, voice=0, start_ticks=0, velocity=DEFAULT_VELOCITY):
+        # Score of a composition, timed by its rhythm pattern
+        # comp: Composition or CompactComposition
+        # returns: Score at the composition's tempo
+        _pitches, ticks = composition_events(comp)
+        return cls.from_notes(comp.notes, ticks, voice, velocity, start_ticks, comp.tempo)
+
+    @classmethod
+    def merge(cls, scores):
+        # Merge scores, e.g. one per voice, into one timeline
+        # scores: scores to merge (the first one sets the tempo)
+        # returns: Score
+        scores = list(scores)
+        if not scores:
+            return cls()
+        return cls(np.concatenate([score.events for score in scores]), scores[0].tempo)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __repr__(self):
+        return f"Score({len(self.events)} notes, {len(self.voices)} voices, {self.tempo} BPM)"
+
+    @property
+    def voices(self):
+        # Voice numbers used by the score
+        return np.unique(self.events['voice'])
+
+    @property
+    def end_ticks(self):
+        # Tick at which the last note ends
+        if len(self.events) == 0:
+            return 0
+        return int((self.events['onset_ticks'] + self.events['duration_ticks']).max())
+
+    @property
+    def duration_ms(self):
+        # Length of the score in milliseconds at its tempo
+        return self.end_ticks * QUARTER_NOTE_MS / TICKS_PER_QUARTER * 120 / self.tempo
+
+    def between(self, start_ticks, end_ticks):
+        # Notes starting in [start_ticks, end_ticks), as a view
+        # returns: Score sharing this score's buffer
+        onsets = self.events['onset_ticks']
+        first, last = np.searchsorted(onsets, [start_ticks, end_ticks])
+        return Score(self.events[first:last], self.tempo)
+
+    def voice(self, voice):
+        # Notes of one voice
+        # returns: Score
+        return Score(self.events[self.events['voice'] == voice], self.tempo)
+
+    def durations_ms(self):
+        # Note durations in milliseconds at the nominal 120 BPM, like rhythm
+        # patterns
+        return self.events['duration_ticks'] * QUARTER_NOTE_MS / TICKS_PER_QUARTER
+
+    def to_midi(self, name="Score"):
+        # Encode the score as a single-track (format 0) MIDI file with one
+        # channel per voice
+        # name: track name
+        # returns: bytes of the MIDI file
+        events = self.events
+        count = len(events)
+        ticks = np.concatenate((events['onset_ticks'], events['onset_ticks'] + events['duration_ticks']))
+        is_note_on = np.repeat(np.array([True, False]), count)
+        # Note-offs go before note-ons at the same tick, so a repeated pitch
+        # is released before it is struck again
+        order = np.lexsort((is_note_on, ticks))
+        ticks = ticks[order]
+        is_note_on = is_note_on[order]
+        # Channels as in midi_channel, skipping the drum channel 9
+        channels = np.tile(events['voice'], 2)[order] % 15
+        channels = np.where(channels < 9, channels, channels + 1).astype(np.uint8)
+        statuses = np.where(is_note_on, 0x90, 0x80).astype(np.uint8) | channels
+        velocities = np.where(is_note_on, np.tile(events['velocity'], 2)[order], 0)
+        deltas = np.diff(ticks, prepend=0)
+        data = encode_events(deltas, statuses, np.tile(events['midi_pitch'], 2)[order], velocities)
+        meta = b'\x00' + text_event(0x03, name) + b'\x00' + tempo_event(self.tempo)
+        return header_chunk(0, 1) + track_chunk(meta + data)
@@ -0,0 +1,127 @@
+# Single-file symphony bundles
+# A bundle holds a table of contents followed by every movement's notes and,
+# optionally, its rendered 16-bit PCM audio. Each section is memory-mapped
+# on its own, so a player can open movement 4 without reading movements 1-3.
+
+import json
+
+import numpy as np
+
+from composition import Composition
+from composition_storage import (
+    DATA_ALIGNMENT, PREAMBLE, atomic_write, encode_notes, map_notes
+)
+
+BUNDLE_EXTENSION = '.mfs'
+BUNDLE_MAGIC = b'MFMS'
+BUNDLE_VERSION = 1
+
+def _aligned(offset):
+    return offset + (-offset % DATA_ALIGNMENT)
+
+def write_symphony_bundle(filepath, title, compositions, pcm_tracks=None, sample_rate=44100):
+    # Write movements into one bundle file (atomically)
+    # filepath: destination path
+    # title: title of the symphony
+    # compositions: movements in playing order
+    # pcm_tracks: optional list with an int16 sample array (or None) per movement
+    # sample_rate: sample rate of the PCM tracks
+    sections = []
+    movements = []
+    for idx, comp in enumerate(compositions):
+        fields, note_array = encode_notes(comp.notes)
+        entry = comp.metadata_dict()
+        entry['notes'] = dict(fields, note_count=len(note_array))
+        sections.append((entry['notes'], note_array))
+
+        pcm = pcm_tracks[idx] if pcm_tracks else None
+        if pcm is not None:
+            pcm = np.asarray(pcm, dtype='<i2')
+            entry['pcm'] = {'sample_count': len(pcm), 'sample_rate': sample_rate}
+            sections.append((entry['pcm'], pcm))
+        movements.append(entry)
+
+    toc = {'title': title, 'movements': movements}
+
+    # Section offsets depend on the size of the table of contents, which in
+    # turn contains the offsets, so lay out with placeholders first
+    for section, _array in sections:
+        section['offset'] = 0
+    while True:
+        toc_bytes = json.dumps(toc).encode('utf-8')
+        offset = _aligned(PREAMBLE.size + len(toc_bytes))
+        changed = False
+        for section, array in sections:
+            if section['offset'] != offset:
+                section['offset'] = offset
+                changed = True
+            offset = _aligned(offset + array.nbytes)
+        if not changed:
+            break
+
+    def write_bundle(f):
+        f.write(PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(toc_bytes), 0))
+        f.write(toc_bytes)
+        for section, array in sections:
+            f.write(b'\0' * (section['offset'] - f.tell()))
+            f.write(array.tobytes())
+
+    atomic_write(filepath, write_bundle, binary=True)
+
+class SymphonyBundle:
+    def __init__(self, filepath):
+        # Open a bundle; only the table of contents is read
+        # filepath: path of the bundle file
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) < PREAMBLE.size:
+                raise ValueError(f"Truncated symphony bundle: {filepath}")
+            magic, version, _flags, toc_length, _unused = PREAMBLE.unpack(preamble)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"Not a symphony bundle: {filepath}")
+            if version > BUNDLE_VERSION:
+                raise ValueError(f"Unsupported symphony bundle version {version}")
+            toc = json.loads(f.read(toc_length).decode('utf-8'))
+        self.title = toc['title']
+        self.movements = toc['movements']
+
+    def __len__(self):
+        return len(self.movements)
+
+    def movement_info(self, idx):
+        # Metadata of a movement without touching its notes
+        # idx: movement index (0-based)
+        # returns: metadata dictionary including 'note_count'
+        entry = self.movements[idx]
+        info = {key: value for key, value in entry.items() if key not in ('notes', 'pcm')}
+        info['note_count'] = entry['notes']['note_count']
+        info['has_audio'] = 'pcm' in entry
+        return info
+
+    def movement(self, idx):
+        # Open a movement as a composition with memory-mapped notes
+        # idx: movement index (0-based)
+        # returns: Composition
+        entry = self.movements[idx]
+        section = entry['notes']
+        data = self.movement_info(idx)
+        data['notes'] = map_notes(self.filepath, section, section['offset'])
+        return Composition.from_dict(data)
+
+    def pcm(self, idx):
+        # Memory-mapped rendered audio of a movement
+        # idx: movement index (0-based)
+        # returns: (int16 sample array, sample rate), or None without audio
+        section = self.movements[idx].get('pcm')
+        if section is None:
+            return None
+        if section['sample_count'] == 0:
+            return np.zeros(0, dtype='<i2'), section['sample_rate']
+        samples = np.memmap(self.filepath, dtype='<i2', mode='r',
+                            offset=section['offset'], shape=(section['sample_count'],))
+        return samples, section['sample_rate']
+
+    def compositions(self):
+        # All movements in order
+        return [self.movement(idx) for idx in range(len(self))]
@@ -0,0 +1,179 @@
+# Additive synthesis engine that renders melodies to audio samples
+# Every frame's spectrum is built directly from the harmonic partials of the
+# sounding note and turned into audio with an inverse FFT and overlap-add,
+# so the cost per frame barely depends on the number of partials
+
+import io
+import wave
+
+import numpy as np
+
+from math_sequences import generate_sequence, sequence_to_partials
+from rhythm import Rhythm
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_FRAME_SIZE = 1024
+KERNEL_RADIUS = 3  # bins on each side of a partial that receive energy
+KERNEL_TABLE_SIZE = 512  # fractional bin positions in the kernel table
+FRAMES_PER_CHUNK = 256  # frames synthesized per inverse FFT batch
+
+def timbre_partials(timbre=None, num_partials=64):
+    # Resolve a timbre description to partial amplitudes
+    # timbre: None (pure sine), a sequence type name ('primes', 'pi', ...)
+    #         or an explicit list of partial amplitudes
+    # num_partials: number of harmonics when deriving from a sequence
+    # returns: list of partial amplitudes
+    if timbre is None:
+        return [1.0]
+    if isinstance(timbre, str):
+        return sequence_to_partials(generate_sequence(timbre, num_partials), num_partials)
+    return list(timbre)
+
+class AdditiveSynthesizer:
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, frame_size=DEFAULT_FRAME_SIZE):
+        # Initialize the synthesizer
+        # sample_rate: output sample rate in Hz
+        # frame_size: inverse FFT size (even), frames overlap by half
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop_size = frame_size // 2
+        self.num_bins = frame_size // 2 + 1
+        self._offsets = np.arange(-KERNEL_RADIUS, KERNEL_RADIUS + 1)
+        self._kernel_table = self._build_kernel_table()
+
+    def _dirichlet(self, delta):
+        # Spectrum of a rectangular frame for a sinusoid `delta` bins away
+        n = self.frame_size
+        out = np.empty(delta.shape, dtype=complex)
+        near = np.abs(delta) < 1e-9
+        d = delta[~near]
+        out[~near] = (np.exp(-1j * np.pi * d * (n - 1) / n)
+                      * np.sin(np.pi * d) / np.sin(np.pi * d / n))
+        out[near] = n
+        return out
+
+    def _build_kernel_table(self):
+        # Tabulate the Hann window spectrum around a partial, indexed by the
+        # partial's fractional bin position and the neighbouring bin offset
+        fractions = np.arange(KERNEL_TABLE_SIZE + 1) / KERNEL_TABLE_SIZE
+        delta = self._offsets[None, :] - fractions[:, None]
+        return (0.5 * self._dirichlet(delta)
+                - 0.25 * self._dirichlet(delta - 1)
+                - 0.25 * self._dirichlet(delta + 1))
+
+    def _frame_spectra(self, fundamentals, gains, phases, partials):
+        # Build the spectra of a batch of frames
+        # fundamentals: fundamental frequency of each frame in Hz
+        # gains: amplitude of each frame (0 for silence)
+        # phases: fundamental phase of each frame at its first sample
+        # partials: partial amplitudes (index 0 is the fundamental)
+        # returns: complex array of shape (frames, num_bins)
+        num_frames = len(fundamentals)
+        harmonics = np.arange(1, len(partials) + 1)
+
+        freqs = fundamentals[:, None] * harmonics[None, :]
+        amps = gains[:, None] * partials[None, :] * 0.5
+        active = (amps > 0) & (freqs < self.sample_rate / 2)
+        frame_idx = np.nonzero(active)[0]
+        centers = (freqs * self.frame_size / self.sample_rate)[active]
+        # All partials are harmonics, so their phases follow the fundamental
+        rotors = amps[active] * np.exp(1j * np.mod(
+            (phases[:, None] * harmonics[None, :])[active], 2 * np.pi))
+
+        spectra = np.zeros(num_frames * self.num_bins, dtype=complex)
+        # Positive frequency and its mirror image, which only reaches the
+        # spectrum for partials close to DC
+        mirrored = centers <= KERNEL_RADIUS + 1
+        for center, rotor, frames in ((centers, rotors, frame_idx),
+                                      (-centers[mirrored], np.conj(rotors[mirrored]),
+                                       frame_idx[mirrored])):
+            base = np.floor(center)
+            fraction = np.rint((center - base) * KERNEL_TABLE_SIZE).astype(np.int64)
+            bins = base.astype(np.int64)[:, None] + self._offsets[None, :]
+            values = rotor[:, None] * self._kernel_table[fraction]
+            valid = (bins >= 0) & (bins < self.num_bins)
+            index = (frames[:, None] * self.num_bins + bins)[valid]
+            spectra.real += np.bincount(index, values.real[valid], len(spectra))
+            spectra.imag += np.bincount(index, values.imag[valid], len(spectra))
+
+        return spectra.reshape(num_frames, self.num_bins)
+
+    def render(self, notes, durations_ms=None, partials=None, gap_ms=50, volume=0.8):
+        # Render a melody to audio samples
+        # notes: list of note frequencies in Hz
+        # durations_ms: list of note durations in ms or a Rhythm (defaults to
+        #               500 each)
+        # partials: partial amplitudes (defaults to a pure sine)
+        # gap_ms: silence after each note, like the live player's pause
+        # volume: output gain (0.0 to 1.0)
+        # returns: float32 array of samples in the range -1.0 to 1.0
+        notes = np.asarray(notes, dtype=np.float64)
+        if durations_ms is None:
+            durations_ms = np.full(len(notes), 500.0)
+        elif isinstance(durations_ms, Rhythm):
+            durations_ms = durations_ms.durations(len(notes))
+        durations_ms = np.asarray(durations_ms, dtype=np.float64)[:len(notes)]
+        notes = notes[:len(durations_ms)]
+        partials = np.asarray(partials if partials is not None else [1.0], dtype=np.float64)
+
+        if len(notes) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # Note boundaries in samples
+        slots = (durations_ms + gap_ms) * self.sample_rate / 1000.0
+        onsets = np.concatenate(([0.0], np.cumsum(slots)))
+        total_samples = int(np.ceil(onsets[-1]))
+        sounding_ends = onsets[:-1] + durations_ms * self.sample_rate / 1000.0
+
+        # Frame j covers samples [(j - 1) * hop, (j + 1) * hop)
+        hop = self.hop_size
+        num_frames = total_samples // hop + 2
+        centers = np.arange(num_frames) * hop
+        note_idx = np.clip(np.searchsorted(onsets, centers, side='right') - 1, 0, len(notes) - 1)
+        fundamentals = notes[note_idx]
+        gains = np.where(centers < sounding_ends[note_idx], volume, 0.0)
+
+        # Continuous fundamental phase, wrapped to keep precision on long pieces
+        steps = 2 * np.pi * fundamentals * hop / self.sample_rate
+        phases = np.mod(np.concatenate(([0.0], np.cumsum(steps[:-1]))), 2 * np.pi)
+
+        output = np.zeros((num_frames + 1) * hop)
+        for start in range(0, num_frames, FRAMES_PER_CHUNK):
+            stop = min(start + FRAMES_PER_CHUNK, num_frames)
+            spectra = self._frame_spectra(
+                fundamentals[start:stop], gains[start:stop], phases[start:stop], partials
+            )
+            frames = np.fft.irfft(spectra, n=self.frame_size, axis=1)
+            # Hann windows at half overlap sum to one, so plain addition works
+            output[start * hop:stop * hop] += frames[:, :hop].ravel()
+            output[(start + 1) * hop:(stop + 1) * hop] += frames[:, hop:].ravel()
+
+        # Drop the half frame that leads in before sample 0
+        return np.clip(output[hop:hop + total_samples], -1.0, 1.0).astype(np.float32)
+
+def to_pcm16(samples):
+    # Convert float samples to 16-bit PCM
+    # samples: float array in the range -1.0 to 1.0
+    # returns: int16 array
+    return (np.asarray(samples) * 32767).astype(np.int16)
+
+def to_wav_bytes(samples, sample_rate=DEFAULT_SAMPLE_RATE):
+    # Encode samples as an in-memory mono WAV file
+    # samples: float array in the range -1.0 to 1.0
+    # sample_rate: sample rate in Hz
+    # returns: WAV file contents as bytes
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(to_pcm16(samples).tobytes())
+    return buffer.getvalue()
+
+def save_wav(samples, filepath, sample_rate=DEFAULT_SAMPLE_RATE):
+    # Save samples as a mono WAV file
+    # samples: float array in the range -1.0 to 1.0
+    # filepath: destination path
+    # sample_rate: sample rate in Hz
+    with open(filepath, 'wb') as f:
+        f.write(to_wav_bytes(samples, sample_rate))
@@ -0,0 +1,161 @@
+# Test script for incremental re-mapping and cached artifacts
+# Changes the scale, tempo and rhythm of compositions and checks that only
+# the affected stages run again
+
+import sys
+
+import numpy as np
+
+def test_scale_change():
+    # Test re-mapping notes when the scale changes
+    print("Testing scale changes...")
+
+    try:
+        from composition import CompactComposition, Composition
+        from math_sequences import generate_sequence, sequence_to_notes
+
+        sequence = generate_sequence('fibonacci', 40)
+        recipe = {'sequence_type': 'fibonacci', 'n': 40, 'scale_type': 'major'}
+        comp = Composition("Fib", "fibonacci", sequence_to_notes(sequence, 'major'), 120, "major", "waltz", recipe)
+        comp.set_source_sequence(sequence)
+        comp.update(scale_type='minor', tempo=90)
+        assert comp.notes == sequence_to_notes(sequence, 'minor'), "Notes not re-mapped"
+        assert comp.recipe['scale_type'] == 'minor' and comp.tempo == 90, "Recipe or tempo not updated"
+        assert comp.notes_revision == 1, "Notes revision not bumped"
+        comp.update(tempo=100, rhythm_pattern='march')
+        assert comp.notes_revision == 1, "Tempo and rhythm changes touched the notes"
+        reloaded = Composition.from_dict(comp.to_dict(include_notes=False))
+        assert reloaded.notes == comp.notes, "Re-mapped recipe does not regenerate"
+
+        # Only the reduced sequence is kept, not thousands-digit Fibonacci numbers
+        import pickle
+        long_sequence = generate_sequence('fibonacci', 5000)
+        long_recipe = {'sequence_type': 'fibonacci', 'n': 5000, 'scale_type': 'major'}
+        long_comp = Composition("Long", "fibonacci", sequence_to_notes(long_sequence, 'major'),
+                                recipe=long_recipe)
+        long_comp.set_source_sequence(long_sequence)
+        size = len(pickle.dumps(long_comp))
+        assert size < 100000, f"Pickle keeps the raw sequence ({size} bytes)"
+        long_comp.update(scale_type='minor')
+        assert long_comp.notes == sequence_to_notes(long_sequence, 'minor'), "Long notes not re-mapped"
+
+        # Notes edited in place are re-mapped as they are, not regenerated
+        for cls in (Composition, CompactComposition):
+            # Few enough notes to stay below the octave cap, where degrees map back exactly
+            edited = cls.from_recipe("Edited", "primes", 12)
+            edited.notes[0] = 1000.0
+            edited.change_scale('minor')
+            expected = sequence_to_notes(generate_sequence('primes', 12), 'minor')
+            assert edited.recipe is None, f"{cls.__name__} kept a stale recipe"
+            assert edited.notes[0] != expected[0] and np.allclose(edited.notes[1:], expected[1:]), \
+                f"{cls.__name__} dropped the in-place edit"
+
+        lazy = Composition.from_recipe("Lazy", "primes", 30)
+        lazy.update(scale_type='pentatonic')
+        assert not lazy.notes_loaded, "Scale change generated the notes"
+        assert lazy.notes == sequence_to_notes(generate_sequence('primes', 30), 'pentatonic'), "Wrong lazy notes"
+
+        # Notes without a recipe are re-mapped degree by degree
+        plain = Composition("Plain", "primes", sequence_to_notes(list(range(40)), 'major'))
+        plain.update(scale_type='minor')
+        assert plain.notes == sequence_to_notes(list(range(40)), 'minor'), "Plain notes not re-mapped"
+        replaced = Composition("Replaced", "primes", [440.0])
+        replaced.update(notes=[220.0], scale_type='minor')
+        assert replaced.notes == [220.0] and replaced.scale_type == 'minor', "Explicit notes were re-mapped"
+
+        compact = CompactComposition.from_composition(Composition.from_recipe("Pi", "pi", 30, "minor"))
+        compact.notes
+        compact.update(scale_type='major')
+        expected = np.float32(sequence_to_notes(generate_sequence('pi', 30), 'major'))
+        assert np.array_equal(compact.notes, expected), "Compact notes not re-mapped"
+        try:
+            plain.update(scale_type='lydian')
+            assert False, "Unknown scale accepted"
+        except ValueError:
+            pass
+        print("Scale changes work")
+        return True
+
+    except Exception as e:
+        print(f"Scale change test failed: {e}")
+        return False
+
+def test_selective_artifacts():
+    # Test that MIDI and audio are rebuilt only for the stages that changed
+    print("\nTesting selective artifact rebuilds...")
+
+    try:
+        import copy
+        from artifacts import composition_audio, composition_midi
+        from composition import Composition
+        from midi_export import composition_to_midi
+        from synthesis import AdditiveSynthesizer
+
+        comp = Composition.from_recipe("Primes", "primes", 24, "minor", 120, "waltz")
+        assert composition_midi(comp) == composition_to_midi(comp), "Cached MIDI differs from the export"
+        events = comp._artifacts['midi_note_events'][1]
+        pitches = comp._artifacts['midi_pitches'][1]
+
+        comp.update(tempo=90, name="Renamed")
+        assert composition_midi(comp) == composition_to_midi(comp), "Tempo change not exported"
+        assert comp._artifacts['midi_note_events'][1] is events, "Tempo change re-encoded the notes"
+
+        comp.update(rhythm_pattern='euclid:3:8')
+        assert composition_midi(comp) == composition_to_midi(comp), "Rhythm change not exported"
+        assert comp._artifacts['midi_pitches'][1] is pitches, "Rhythm change re-quantized the pitches"
+
+        comp.update(scale_type='major')
+        assert composition_midi(comp) == composition_to_midi(comp), "Scale change not exported"
+        assert comp._artifacts['midi_pitches'][1] is not pitches, "Scale change kept stale pitches"
+
+        synthesizer = AdditiveSynthesizer(sample_rate=8000)
+        samples, sample_rate = composition_audio(comp, 'primes', synthesizer)
+        assert sample_rate == 8000 and composition_audio(comp, 'primes', synthesizer)[0] is samples, \
+            "Audio rendered twice"
+        comp.update(tempo=45)
+        slower, _rate = composition_audio(comp, 'primes', synthesizer)
+        assert len(slower) > 1.9 * len(samples), "Tempo change not rendered"
+
+        assert copy.copy(comp)._artifacts is None, "Copies share cached artifacts"
+        print("Selective artifact rebuilds work")
+        return True
+
+    except Exception as e:
+        print(f"Selective artifact test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING ARTIFACT TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Scale Changes", test_scale_change),
+        ("Selective Artifacts", test_selective_artifacts),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
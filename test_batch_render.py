@@ -0,0 +1,169 @@
+# Test script for headless batch rendering
+# Runs job specs through batch_render and the 'render' command
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+
+TEST_DIRECTORY = "test_batch_files"
+
+def reset_test_directory():
+    # Start each test from an empty directory
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+    os.makedirs(TEST_DIRECTORY)
+
+def write_spec(name, spec):
+    # Write a job spec into the test directory and return its path
+    filepath = os.path.join(TEST_DIRECTORY, name)
+    with open(filepath, 'w') as f:
+        json.dump(spec, f)
+    return filepath
+
+def test_job_spec():
+    # Test reading and validating job specs
+    print("Testing job spec validation...")
+
+    try:
+        from batch_render import load_job_spec
+
+        reset_test_directory()
+        filepath = write_spec("jobs.json", {
+            "defaults": {"scale": "minor", "outputs": ["midi"]},
+            "jobs": [{"sequence": "primes", "n": 8}, {"sequence": "pi", "n": 4, "scale": "major"},
+                     {"sequence": "primes", "n": 8, "timbre": "pi"},
+                     {"sequence": "primes", "n": 8, "outputs": ["wav"]},
+                     {"sequence": "primes", "n": 8}],
+        })
+        jobs = load_job_spec(filepath)
+        assert [job['scale'] for job in jobs[:2]] == ["minor", "major"], "Defaults not applied"
+        names = [job['name'] for job in jobs]
+        assert names == ["primes_8_minor_simple_120_midi", "pi_4_major_simple_120_midi",
+                         "primes_8_minor_simple_120_pi_midi", "primes_8_minor_simple_120_wav",
+                         "primes_8_minor_simple_120_midi_2"], f"Wrong job names: {names}"
+
+        for bad_job in [{"sequence": "squares", "n": 8}, {"sequence": "pi", "n": 0},
+                        {"sequence": "pi", "n": True}, {"sequence": "pi", "n": 4, "tempo": True},
+                        {"sequence": "pi", "n": 4, "outputs": ["mp3"]}]:
+            try:
+                load_job_spec(write_spec("bad.json", [bad_job]))
+            except ValueError:
+                continue
+            assert False, f"Accepted invalid job {bad_job}"
+        print("Job spec validation works")
+        return True
+
+    except Exception as e:
+        print(f"Job spec test failed: {e}")
+        return False
+
+def test_render_command():
+    # Test rendering a spec through the command line
+    print("\nTesting render command...")
+
+    try:
+        import batch_render
+        from concurrent.futures.process import BrokenProcessPool
+        from cli import main
+
+        reset_test_directory()
+        filepath = write_spec("render.json", [
+            {"sequence": "fibonacci", "n": 6, "rhythm": "waltz", "name": "Fib"},
+            {"sequence": "primes", "n": 6, "timbre": "pi", "outputs": ["wav"], "name": "Primes"},
+        ])
+        output_directory = os.path.join(TEST_DIRECTORY, "renders")
+        catalog = os.path.join(TEST_DIRECTORY, "catalog")
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            code = main(["--directory", catalog, "render", filepath,
+                         "--workers", "2", "--output-dir", output_directory])
+        summary = json.loads(stdout.getvalue())
+        assert code == 0, f"Exit code {code}: {summary}"
+        assert summary['succeeded'] == 2 and summary['failed'] == 0, "Jobs failed"
+        assert [result['name'] for result in summary['results']] == ["Fib", "Primes"], "Wrong order"
+        assert sorted(os.listdir(output_directory)) == ["Fib.mid", "Fib.wav", "Primes.wav"], \
+            "Wrong output files"
+        saved = sorted(name for name in os.listdir(catalog) if not name.startswith('.'))
+        assert saved == ["Fib.json", "Primes.json"], f"Compositions not saved: {saved}"
+        print("Rendering and saving work")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = main(["render", write_spec("invalid.json", {"jobs": [{"n": 3}]})])
+        assert code == 2, f"Invalid spec gave exit code {code}"
+        print("Invalid specs are rejected")
+
+        # Rhythm specs and explicit names never put ':' or '/' into file names
+        filepath = write_spec("specs.json", [
+            {"sequence": "fibonacci", "n": 6, "rhythm": "euclid:3:8", "outputs": ["midi"]},
+            {"sequence": "primes", "n": 6, "outputs": ["midi"], "name": "Primes: a/b"},
+        ])
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = main(["--directory", catalog, "render", filepath,
+                         "--workers", "1", "--output-dir", output_directory])
+        assert code == 0, f"Rendering rhythm specs gave exit code {code}"
+        outputs = set(os.listdir(output_directory))
+        assert {"fibonacci_6_major_euclid_3_8_120_midi.mid", "Primes__a_b.mid"} <= outputs, \
+            f"Unsafe output names: {sorted(outputs)}"
+        assert "fibonacci_6_major_euclid_3_8_120_midi.json" in os.listdir(catalog), "Unsafe saved name"
+        print("Output file names are sanitized")
+
+        # A crashed worker pool still produces a summary
+        def broken_map(func, items, workers=None, use_processes=False):
+            yield {'name': "Fib"}, None
+            raise BrokenProcessPool("a child process terminated abruptly")
+        ordered_map = batch_render.ordered_map
+        batch_render.ordered_map = broken_map
+        try:
+            summary = batch_render.run_jobs(batch_render.load_job_spec(filepath), output_directory)
+        finally:
+            batch_render.ordered_map = ordered_map
+        assert summary['succeeded'] == 1 and summary['failed'] == 1, f"Wrong summary: {summary}"
+        assert "worker process died" in summary['results'][1]['error'], "Crash not reported"
+        print("A crashed worker pool is reported")
+        return True
+
+    except Exception as e:
+        print(f"Render command test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING BATCH RENDER TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Job Spec", test_job_spec),
+        ("Render Command", test_render_command),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
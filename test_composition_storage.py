@@ -0,0 +1,777 @@
+# Test script for composition storage
+# Tests saving, loading and listing compositions in every storage format
+
+import os
+import shutil
+import sys
+
+TEST_DIRECTORY = "test_storage_compositions"
+
+def reset_test_directory():
+    # Start each test from an empty save directory
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+
+def test_binary_format():
+    # Test the binary composition format
+    print("Testing binary composition format...")
+
+    try:
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY, storage_format="binary")
+
+        # Few distinct notes are stored losslessly as palette indices
+        notes = [261.63, 293.66, 329.63, 261.63] * 1000
+        comp = Composition("Binary Test", "primes", notes, 90, "minor", "march")
+        assert manager.save_composition(comp), "Binary save failed"
+        filename = manager.composition_filename("Binary Test")
+        assert filename == "Binary_Test.mfc", f"Unexpected file name: {filename}"
+        print("Binary saving works")
+
+        loaded = manager.load_composition(filename)
+        assert loaded is not None, "Binary load failed"
+        assert len(loaded.notes) == len(notes), "Wrong number of notes loaded"
+        assert list(loaded.notes[:8]) == notes[:8], "Notes changed after loading"
+        assert loaded.to_dict()['notes'] == notes, "to_dict should return plain notes"
+        assert loaded.tempo == 90 and loaded.scale_type == "minor", "Metadata changed"
+        print("Binary loading works")
+
+        # Saving over the file a composition's notes are mapped from
+        from composition_storage import mapped_file
+        manager = CompositionManager(TEST_DIRECTORY, storage_format="binary")
+        loaded = manager.load_composition(filename)
+        assert mapped_file(loaded._notes) is not None, "Binary notes not memory-mapped"
+        loaded.update(tempo=100)
+        assert manager.save_composition(loaded), "Saving over the mapped file failed"
+        assert mapped_file(loaded._notes) is None, "Notes still mapped from the replaced file"
+        assert loaded.to_dict()['notes'] == notes, "Notes changed by saving over their file"
+        reloaded = manager.load_composition(filename)
+        assert reloaded.tempo == 100 and reloaded.to_dict()['notes'] == notes, "Replaced file is wrong"
+        print("Saving over a memory-mapped file works")
+
+        # Many distinct notes fall back to float32
+        many = [100.0 + i * 0.01 for i in range(70000)]
+        manager.save_composition(Composition("Float Test", notes=many))
+        loaded = manager.load_composition(manager.composition_filename("Float Test"))
+        assert abs(loaded.notes[-1] - many[-1]) < 1e-2, "float32 notes changed"
+        print("float32 note storage works")
+
+        return True
+
+    except Exception as e:
+        print(f"Binary format test failed: {e}")
+        return False
+
+def test_mixed_formats():
+    # Test that JSON and binary compositions coexist in one directory
+    print("\nTesting mixed storage formats...")
+
+    try:
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        json_manager = CompositionManager(TEST_DIRECTORY)
+        binary_manager = CompositionManager(TEST_DIRECTORY, storage_format="binary")
+
+        json_manager.save_composition(Composition("Old Piece", notes=[440.0, 493.88]))
+        binary_manager.save_composition(Composition("New Piece", notes=[523.25]))
+
+        listed = {data['name']: data for data in binary_manager.list_compositions()}
+        assert set(listed) == {"Old Piece", "New Piece"}, f"Unexpected listing: {set(listed)}"
+        loaded = binary_manager.load_composition(listed["Old Piece"]['filename'])
+        assert loaded.notes == [440.0, 493.88], "Existing JSON composition did not load"
+        print("Existing JSON compositions still load")
+
+        assert binary_manager.delete_composition("New Piece"), "Delete failed"
+        assert len(binary_manager.list_compositions()) == 1, "Deleted composition still listed"
+        print("Deleting binary compositions works")
+
+        return True
+
+    except Exception as e:
+        print(f"Mixed formats test failed: {e}")
+        return False
+
+def test_metadata_index():
+    # Test the metadata index behind list_compositions
+    print("\nTesting metadata index...")
+
+    try:
+        import json
+        import sqlite3
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY)
+        manager.save_composition(Composition("Indexed", "pi", [440.0] * 7, 150, "pentatonic"))
+
+        listed = manager.list_compositions()
+        assert len(listed) == 1, f"Expected 1 composition, got {len(listed)}"
+        entry = listed[0]
+        assert entry['filename'] == "Indexed.json", "Wrong file name in index"
+        assert entry['note_count'] == 7 and entry['tempo'] == 150, "Wrong metadata in index"
+        assert 'notes' not in entry, "Listing should not load notes"
+        print("Listing from the index works")
+
+        # Files added and removed behind the manager's back are picked up
+        with open(os.path.join(TEST_DIRECTORY, "External.json"), 'w') as f:
+            json.dump(Composition("External", notes=[261.63]).to_dict(), f)
+        os.remove(os.path.join(TEST_DIRECTORY, "Indexed.json"))
+        names = [data['name'] for data in manager.list_compositions()]
+        assert names == ["External"], f"Index not reconciled: {names}"
+        print("Index reconciliation works")
+
+        assert manager.delete_composition("External"), "Delete failed"
+        assert manager.list_compositions() == [], "Deleted composition still indexed"
+        print("Index updates on delete work")
+
+        # A failed index update does not fail the save, the next listing rescans
+        def broken_update(records, directory_mtime_before=None):
+            raise sqlite3.OperationalError("database is locked")
+        manager.index.record_saved_many = broken_update
+        assert manager.save_composition(Composition("Unindexed", notes=[440.0])), \
+            "Save failed because of the index"
+        assert [data['name'] for data in manager.list_compositions()] == ["Unindexed"], \
+            "Stale index not rescanned"
+        with sqlite3.connect(manager.index.index_path) as connection:
+            mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == 'wal', f"Index not journalled on disk: {mode}"
+        print("Index failures are recovered")
+
+        return True
+
+    except Exception as e:
+        print(f"Metadata index test failed: {e}")
+        return False
+
+def test_composition_cache():
+    # Test the in-memory cache of loaded compositions
+    print("\nTesting composition cache...")
+
+    try:
+        import time
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY, cache_bytes=64 * 1024)
+        manager.save_composition(Composition("Cached", notes=[440.0, 493.88]))
+
+        first = manager.load_composition("Cached.json")
+        second = manager.load_composition("Cached.json")
+        assert manager.cache_stats()['hits'] == 2, f"Loads not served from cache: {manager.cache_stats()}"
+        first.notes.append(523.25)
+        assert second.notes == [440.0, 493.88], "Cached compositions should not share notes"
+        print("Cache hits work")
+
+        # Editing the file outside the manager invalidates the cached copy
+        time.sleep(0.01)
+        other = CompositionManager(TEST_DIRECTORY)
+        other.save_composition(Composition("Cached", notes=[261.63]))
+        assert manager.load_composition("Cached.json").notes == [261.63], "Stale composition served"
+        assert manager.cache_stats()['invalidations'] == 1, "Changed file not invalidated"
+        print("Cache invalidation on external edits works")
+
+        # The byte budget evicts the least recently used compositions
+        for i in range(20):
+            manager.save_composition(Composition(f"Filler {i}", notes=[440.0] * 200))
+        stats = manager.cache_stats()
+        assert stats['bytes'] <= stats['max_bytes'], "Cache exceeded its byte budget"
+        assert stats['evictions'] > 0, "Nothing was evicted"
+        print("Cache eviction works")
+
+        manager.delete_composition("Filler 19")
+        assert "Filler_19.json" not in manager.compositions, "Deleted composition still cached"
+        print("Cache invalidation on delete works")
+
+        return True
+
+    except Exception as e:
+        print(f"Composition cache test failed: {e}")
+        return False
+
+def test_write_behind():
+    # Test write-behind persistence
+    print("\nTesting write-behind persistence...")
+
+    try:
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY)
+
+        with manager.write_behind():
+            for i in range(10):
+                assert manager.save_composition(Composition(f"Queued {i}", notes=[440.0] * 10)), \
+                    "Queued save failed"
+            loaded = manager.load_composition("Queued_9.json")
+            assert loaded is not None and len(loaded.notes) == 10, "Queued composition not readable"
+            assert manager.delete_composition("Queued 0"), "Deleting a queued composition failed"
+        print("Queued saves are readable before they are written")
+
+        names = sorted(data['name'] for data in manager.list_compositions())
+        assert len(names) == 9 and "Queued 0" not in names, f"Unexpected compositions: {names}"
+        leftovers = [f for f in os.listdir(TEST_DIRECTORY) if f.endswith('.tmp')]
+        assert not leftovers, f"Temporary files left behind: {leftovers}"
+        assert manager.writer is None, "Write-behind still active after the block"
+        print("Flushing write-behind saves works")
+
+        # Replaced files keep their permissions, new ones follow the umask
+        if os.name != 'nt':
+            umask = os.umask(0o022)
+            os.umask(umask)
+            queued = os.path.join(TEST_DIRECTORY, "Queued_1.json")
+            assert os.stat(queued).st_mode & 0o777 == 0o666 & ~umask, "New file not created under the umask"
+            os.chmod(queued, 0o640)
+            manager.save_composition(Composition("Queued 1", notes=[440.0]))
+            assert os.stat(queued).st_mode & 0o777 == 0o640, "Replaced file lost its permissions"
+            print("File permissions are kept")
+
+        # Failed queued saves fail the block
+        os.makedirs(os.path.join(TEST_DIRECTORY, "Blocked.json"))
+        try:
+            with manager.write_behind():
+                manager.save_composition(Composition("Blocked", notes=[440.0]))
+            assert False, "Failed queued save not reported"
+        except RuntimeError:
+            pass
+        print("Failed queued saves are reported")
+
+        return True
+
+    except Exception as e:
+        print(f"Write-behind test failed: {e}")
+        return False
+
+def test_recipe_compositions():
+    # Test compositions saved as a recipe and regenerated on demand
+    print("\nTesting recipe compositions...")
+
+    try:
+        import numpy as np
+        from composition import CompactComposition, Composition, CompositionManager
+        from math_sequences import generate_primes, sequence_to_notes
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY, store_recipes=True)
+
+        notes = sequence_to_notes(generate_primes(2000), 'minor')
+        manager.create_composition_from_sequence(
+            "Recipe Primes", "primes", notes, 90, "minor", "march", n=2000
+        )
+        size = os.path.getsize(os.path.join(TEST_DIRECTORY, "Recipe_Primes.json"))
+        assert size < 1000, f"Recipe file too large: {size} bytes"
+        print("Saving recipes works")
+
+        manager.compositions.clear()
+        loaded = manager.load_composition("Recipe_Primes.json")
+        assert not loaded.notes_loaded, "Notes should not be generated on load"
+        assert loaded.note_count == 2000, "Wrong note count for recipe"
+        assert manager.list_compositions()[0]['note_count'] == 2000, "Wrong note count in index"
+        assert loaded.notes == notes, "Regenerated notes differ"
+        print("Lazy note regeneration works")
+
+        # Notes edited in place are saved instead of the recipe
+        compact = CompactComposition.from_composition(loaded)
+        for edited in (loaded, compact):
+            edited.notes[0] = 1000.0
+            assert manager.save_composition(edited), "Saving edited notes failed"
+            manager.compositions.clear()
+            reloaded = manager.load_composition("Recipe_Primes.json")
+            assert reloaded.recipe is None and reloaded.notes[0] == 1000.0, \
+                f"{type(edited).__name__} saved a stale recipe"
+            assert np.allclose(reloaded.notes[1:], notes[1:], rtol=1e-6), "Edited notes saved wrongly"
+        print("Edited recipe notes are saved")
+
+        lazy = Composition.from_recipe("Lazy Pi", "pi", 12, "pentatonic")
+        assert not lazy.notes_loaded, "from_recipe should not generate notes"
+        assert len(lazy.notes) == 12, "Wrong number of regenerated notes"
+        lazy.notes = [440.0]
+        assert lazy.recipe is None, "Explicit notes should replace the recipe"
+        print("Recipe compositions work")
+
+        return True
+
+    except Exception as e:
+        print(f"Recipe compositions test failed: {e}")
+        return False
+
+def test_compact_composition():
+    # Test the slotted, array-backed composition
+    print("\nTesting compact compositions...")
+
+    try:
+        from composition import CompactComposition, Composition, CompositionManager
+
+        comp = Composition("Compact", "pi", [261.5, 293.75, 330.0], 150, "pentatonic", "waltz")
+        compact = CompactComposition.from_composition(comp)
+        assert not hasattr(compact, '__dict__'), "Compact compositions should use slots"
+        assert compact.to_dict() == comp.to_dict(), "Round trip through to_dict changed data"
+        assert compact.created_date == comp.created_date, "Dates changed"
+        assert isinstance(compact.created_us, int), "Dates should be stored as integers"
+        assert compact.to_composition().notes == comp.notes, "Conversion back changed notes"
+        print("Compact composition conversion works")
+
+        # Recipe notes get the same checksum in both classes, also after a
+        # scale change
+        expected = Composition.from_recipe("Derived", "primes", 50, "major")
+        expected.notes
+        for composition_class in (Composition, CompactComposition):
+            derived = composition_class.from_recipe("Derived", "primes", 50, "minor")
+            derived.notes
+            derived.update(scale_type='major')
+            data = derived.to_dict(include_notes=False)
+            assert 'notes' not in data and data['checksum'] == expected.to_dict()['checksum'], \
+                f"{composition_class.__name__} recipe checksum differs"
+        print("Recipe checksums agree")
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY, composition_class=CompactComposition)
+        manager.save_composition(compact)
+        loaded = manager.load_composition("Compact.json")
+        assert isinstance(loaded, CompactComposition), "Manager did not load compact compositions"
+        assert list(loaded.notes) == [261.5, 293.75, 330.0], "Notes changed after loading"
+        print("Saving and loading compact compositions works")
+
+        return True
+
+    except Exception as e:
+        print(f"Compact composition test failed: {e}")
+        return False
+
+def test_symphony_bundle():
+    # Test single-file symphony bundles
+    print("\nTesting symphony bundles...")
+
+    try:
+        import numpy as np
+        from composition import Composition
+        from symphony_bundle import SymphonyBundle, write_symphony_bundle
+
+        reset_test_directory()
+        os.makedirs(TEST_DIRECTORY)
+        movements = [
+            Composition(f"Movement_{i}", "fibonacci", [261.63 * (i + 1), 293.66, 329.63][:i + 1],
+                        100 + i, "major", "simple")
+            for i in range(3)
+        ]
+        pcm_tracks = [None, np.arange(100, dtype=np.int16), np.zeros(0, dtype=np.int16)]
+        filepath = os.path.join(TEST_DIRECTORY, "Symphony.mfs")
+        write_symphony_bundle(filepath, "Symphony", movements, pcm_tracks, 22050)
+
+        bundle = SymphonyBundle(filepath)
+        assert bundle.title == "Symphony", "Title changed"
+        assert len(bundle) == 3, f"Expected 3 movements, got {len(bundle)}"
+        assert bundle.movement_info(2)['note_count'] == 3, "Wrong note count in table of contents"
+        for i, original in enumerate(movements):
+            movement = bundle.movement(i)
+            assert movement.name == original.name, "Movement name changed"
+            assert movement.tempo == original.tempo, "Movement tempo changed"
+            assert list(movement.notes) == original.notes, f"Notes of movement {i} changed"
+        print("Random access to movements works")
+
+        assert bundle.pcm(0) is None, "Movement without audio returned samples"
+        samples, sample_rate = bundle.pcm(1)
+        assert sample_rate == 22050, "Sample rate changed"
+        assert np.array_equal(samples, np.arange(100)), "Rendered audio changed"
+        assert len(bundle.pcm(2)[0]) == 0, "Empty audio track not preserved"
+        print("Stored audio tracks work")
+
+        return True
+
+    except Exception as e:
+        print(f"Symphony bundle test failed: {e}")
+        return False
+
+def test_catalog_scan():
+    # Test the parallel metadata scan
+    print("\nTesting catalog scan...")
+
+    try:
+        import json
+        from catalog_scan import read_json_metadata
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY)
+        for i in range(20):
+            manager.save_composition(
+                Composition(f"Scan_{i:02d}", "primes", [261.63] * i, 90 + i, "minor", "march")
+            )
+        # Older files keep the notes in the middle and have no note count
+        with open(os.path.join(TEST_DIRECTORY, "Legacy.json"), 'w') as f:
+            json.dump({'name': 'Legacy', 'sequence_type': 'pi', 'notes': [261.63, 293.66, 329.63],
+                       'tempo': 150, 'scale_type': 'pentatonic'}, f, indent=2)
+
+        legacy = read_json_metadata(os.path.join(TEST_DIRECTORY, "Legacy.json"), chunk_size=8)
+        assert legacy['note_count'] == 3, f"Expected 3 legacy notes, got {legacy['note_count']}"
+        assert legacy['tempo'] == 150, "Fields after the notes were lost"
+        assert 'notes' not in legacy, "Notes should not be parsed"
+        print("Metadata prefix reading works")
+
+        for workers in (1, 4):
+            scanned = list(manager.scan_compositions(workers=workers))
+            filenames = [entry['filename'] for entry in scanned]
+            assert filenames == sorted(filenames), "Scan results are not in file name order"
+            assert len(scanned) == 21, f"Expected 21 compositions, got {len(scanned)}"
+            assert scanned[-1]['note_count'] == 19, "Wrong note count"
+        listed = {entry['filename']: entry['note_count'] for entry in manager.list_compositions(refresh=True)}
+        assert listed == {entry['filename']: entry['note_count'] for entry in scanned}, \
+            "Index and scan disagree"
+        print("Parallel catalog scan works")
+
+        return True
+
+    except Exception as e:
+        print(f"Catalog scan test failed: {e}")
+        return False
+
+def test_query():
+    # Test querying the composition catalog
+    print("\nTesting catalog queries...")
+
+    try:
+        from datetime import datetime
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY)
+        sequence_types = ['fibonacci', 'primes', 'pi']
+        for i in range(30):
+            comp = Composition(f"Query_{i:02d}", sequence_types[i % 3], [261.63] * (i + 1),
+                               60 + i * 4, ['major', 'minor'][i % 2], "simple")
+            comp.created_date = datetime(2024, 1, i + 1).isoformat()
+            manager.save_composition(comp)
+
+        primes = manager.query(sequence_type='primes')
+        assert len(primes) == 10, f"Expected 10 prime compositions, got {len(primes)}"
+        assert all(entry['sequence_type'] == 'primes' for entry in primes), "Wrong sequence type"
+        assert 'notes' not in primes[0], "Queries should not load notes"
+
+        matches = manager.query(scale_type='minor', tempo_range=(100, 140), min_notes=12)
+        assert [entry['name'] for entry in matches] == ['Query_11', 'Query_13', 'Query_15', 'Query_17', 'Query_19'], \
+            f"Wrong filtered result: {[entry['name'] for entry in matches]}"
+        recent = manager.query(created_after=datetime(2024, 1, 25))
+        assert len(recent) == 6, f"Expected 6 recent compositions, got {len(recent)}"
+        assert manager.count_compositions(sequence_type='pi', max_notes=15) == 5, "Wrong count"
+        print("Filtering works")
+
+        newest = manager.query(order_by='-created_date', limit=3)
+        assert [entry['name'] for entry in newest] == ['Query_29', 'Query_28', 'Query_27'], \
+            "Wrong descending order"
+        pages = [manager.query(order_by='tempo', limit=7, offset=offset) for offset in range(0, 30, 7)]
+        names = [entry['name'] for page in pages for entry in page]
+        assert names == [f"Query_{i:02d}" for i in range(30)], "Pages overlap or skip entries"
+        try:
+            manager.query(order_by='notes; DROP TABLE compositions')
+            assert False, "Unknown order column was accepted"
+        except ValueError:
+            pass
+        print("Ordering and pagination work")
+
+        return True
+
+    except Exception as e:
+        print(f"Query test failed: {e}")
+        return False
+
+def test_jsonl_transfer():
+    # Test bulk JSON Lines export and import
+    print("\nTesting JSON Lines export and import...")
+
+    try:
+        import json
+        from composition import Composition, CompositionManager
+
+        reset_test_directory()
+        source = CompositionManager(os.path.join(TEST_DIRECTORY, "source"), storage_format="binary")
+        for i in range(12):
+            source.save_composition(
+                Composition(f"Export_{i:02d}", "pi", [261.63, 293.66 + i], 120, "major", "simple")
+            )
+        source.save_composition(source.create_composition_from_sequence(
+            "Export_Recipe", "primes", None, 90, "minor", "march", n=6
+        ))
+
+        export_path = os.path.join(TEST_DIRECTORY, "catalog.jsonl.gz")
+        assert source.export_jsonl(export_path) == 13, "Wrong number of exported compositions"
+        metadata_path = os.path.join(TEST_DIRECTORY, "catalog_metadata.jsonl")
+        assert source.export_jsonl(metadata_path, only_metadata=True, sequence_type='pi') == 12, \
+            "Filtered metadata export wrong"
+        with open(metadata_path) as f:
+            first = json.loads(f.readline())
+        assert 'notes' not in first and first['note_count'] == 2, "Metadata export contains notes"
+        print("Export works")
+
+        target = CompositionManager(os.path.join(TEST_DIRECTORY, "target"))
+        assert target.import_jsonl(export_path, batch_size=5) == 13, "Wrong number imported"
+        assert target.import_jsonl(metadata_path) == 0, "Metadata-only lines were imported"
+        imported = target.load_composition("Export_07.json")
+        assert imported.notes == [261.63, 300.66], "Imported notes changed"
+        original = source.load_composition("Export_07.mfc")
+        assert imported.created_date == original.created_date, "Dates changed on import"
+        recipe = target.load_composition("Export_Recipe.json")
+        assert len(recipe.notes) == 6, "Recipe composition not imported"
+        assert len(target.list_compositions()) == 13, "Index not updated by the import"
+        print("Batched import works")
+
+        return True
+
+    except Exception as e:
+        print(f"JSON Lines test failed: {e}")
+        return False
+
+def concurrent_worker(task):
+    # Worker process of the concurrency test (module level so it can be pickled)
+    # task: (action, worker number, naming scheme)
+    # returns: number of errors the worker ran into
+    import io
+    from contextlib import redirect_stdout
+    from composition import Composition, CompositionManager
+
+    action, worker, naming = task
+    output = io.StringIO()
+    with redirect_stdout(output):
+        manager = CompositionManager(TEST_DIRECTORY, naming=naming)
+        shared = [Composition(f"Shared_{i}", "primes", [261.63 + worker] * 200, 90, "minor", "march")
+                  for i in range(5)]
+        for i in range(20):
+            if action == 'save':
+                # Every composition is saved again a few times
+                manager.save_composition(shared[i % 5])
+            elif action == 'load':
+                manager.load_composition("Contested.json")
+            else:
+                manager.delete_composition("Contested")
+                manager.save_composition(Composition("Contested", "pi", [261.63] * 500, 120,
+                                                     "major", "simple"))
+    return output.getvalue().count("Error")
+
+def test_concurrent_writers():
+    # Stress test several processes saving, loading and deleting at once
+    print("\nTesting concurrent writer processes...")
+
+    try:
+        import multiprocessing
+        from composition import Composition, CompositionManager
+        processes = 4
+
+        reset_test_directory()
+        with multiprocessing.Pool(processes) as pool:
+            errors = pool.map(concurrent_worker, [('save', w, 'unique') for w in range(processes)])
+        assert sum(errors) == 0, f"Workers reported {sum(errors)} errors"
+        manager = CompositionManager(TEST_DIRECTORY, naming='unique')
+        entries = manager.list_compositions()
+        # Each worker's five compositions keep their own file across re-saves
+        assert len(entries) == processes * 5, f"Expected {processes * 5} files, got {len(entries)}"
+        assert all(entry['note_count'] == 200 for entry in entries), "Corrupted composition file"
+        assert manager.delete_composition("Shared_0"), "Deleting by name failed"
+        assert manager.count_compositions(name="Shared_0") == 0, "Unique files were not all deleted"
+        print("Unique naming keeps every worker's compositions")
+
+        reset_test_directory()
+        with multiprocessing.Pool(processes) as pool:
+            errors = pool.map(concurrent_worker, [('save', w, 'name') for w in range(processes)])
+        assert sum(errors) == 0, f"Workers reported {sum(errors)} errors"
+        manager = CompositionManager(TEST_DIRECTORY)
+        for entry in manager.list_compositions():
+            assert len(manager.load_composition(entry['filename']).notes) == 200, "Torn write"
+        leftovers = [name for name in os.listdir(TEST_DIRECTORY) if name.endswith('.tmp')]
+        assert not leftovers, f"Temporary files left behind: {leftovers}"
+        print("Concurrent saves of the same name never tear files")
+
+        # Replacing another writer's composition is reported as a warning
+        import logging
+        messages = []
+        manager = CompositionManager(TEST_DIRECTORY, report=lambda message, level=logging.INFO:
+                                     messages.append((level, message)))
+        assert manager.save_composition(Composition("Shared_0", notes=[440.0])), "Replacing save failed"
+        warnings = [message for level, message in messages if level == logging.WARNING]
+        assert len(warnings) == 1 and "replaces a different composition" in warnings[0], \
+            f"Replacement not reported as a warning: {messages}"
+        print("Replacements are reported as warnings")
+
+        reset_test_directory()
+        CompositionManager(TEST_DIRECTORY).save_composition(
+            Composition("Contested", "pi", [261.63] * 500, 120, "major", "simple")
+        )
+        tasks = [('load', w, 'name') for w in range(processes - 1)] + [('delete', 0, 'name')]
+        with multiprocessing.Pool(processes) as pool:
+            errors = pool.map(concurrent_worker, tasks)
+        assert sum(errors) == 0, f"Loads racing with deletes failed {sum(errors)} times"
+        print("Deletes racing with loads are safe")
+
+        return True
+
+    except Exception as e:
+        print(f"Concurrency test failed: {e}")
+        return False
+
+def test_note_blobs():
+    # Test content-addressed, delta-compressed note storage
+    print("\nTesting note blobs...")
+
+    try:
+        from composition import Composition, CompositionManager
+        from math_sequences import generate_fibonacci, generate_primes, sequence_to_notes
+        from note_blobs import decode_note_blob, encode_note_blob
+
+        notes = sequence_to_notes(generate_primes(1000), 'minor')
+        assert decode_note_blob(encode_note_blob(notes, 'minor')).tolist() == notes, \
+            "Scale-index encoding is not lossless"
+        odd_notes = [261.63, 1000.5, 20.0, 1000.5, 19999.25]
+        assert decode_note_blob(encode_note_blob(odd_notes)).tolist() == odd_notes, \
+            "Palette encoding is not lossless"
+        print("Blob encoding works")
+
+        reset_test_directory()
+        inline = CompositionManager(os.path.join(TEST_DIRECTORY, "inline"))
+        manager = CompositionManager(os.path.join(TEST_DIRECTORY, "blobs"), note_store='blobs')
+        for tempo in (90, 120, 150):
+            for target in (inline, manager):
+                target.save_composition(
+                    Composition(f"Primes_{tempo}", "primes", notes, tempo, "minor", "march")
+                )
+        assert len(list(manager.blobs.keys())) == 1, "Identical melodies were stored twice"
+        inline_size = os.path.getsize(os.path.join(inline.save_directory, "Primes_90.json"))
+        blob_size = manager.blobs.size()
+        assert inline_size > 10 * blob_size, f"Notes only shrank from {inline_size} to {blob_size} bytes"
+        loaded = manager.load_composition("Primes_120.json")
+        assert loaded.notes == notes and loaded.tempo == 120, "Notes changed in the blob store"
+        assert manager.list_compositions()[0]['note_count'] == 1000, "Wrong indexed note count"
+        print("Deduplicated blob storage works")
+
+        binary = CompositionManager(manager.save_directory, storage_format="binary", note_store='blobs')
+        fib_notes = sequence_to_notes(generate_fibonacci(30), 'major')
+        binary.save_composition(Composition("Fib", "fibonacci", fib_notes, 100, "major", "waltz"))
+        assert binary.load_composition("Fib.mfc").notes == fib_notes, "Binary blob reference broken"
+        assert binary.delete_composition("Fib"), "Delete failed"
+        assert binary.collect_garbage(grace_seconds=0) == 1, "Unused blob not collected"
+        assert manager.load_composition("Primes_90.json").notes == notes, "Shared blob collected"
+        print("Blob garbage collection works")
+
+        return True
+
+    except Exception as e:
+        print(f"Note blob test failed: {e}")
+        return False
+
+def test_version_history():
+    # Test version history with delta storage
+    print("\nTesting version history...")
+
+    try:
+        import json
+        import time
+        from composition import Composition, CompositionManager
+        from composition_history import MAX_DELTA_CHAIN, apply_delta, diff_compositions
+        from math_sequences import generate_primes, sequence_to_notes
+
+        reset_test_directory()
+        manager = CompositionManager(TEST_DIRECTORY, keep_history=True)
+        comp = Composition("Edited", "primes", sequence_to_notes(generate_primes(300), 'minor'),
+                           90, "minor", "march")
+        expected = []
+        for edit in range(100):
+            if edit % 2:
+                comp.update(tempo=60 + edit)
+            else:
+                notes = list(comp.notes)
+                notes[edit] = 440.0
+                comp.update(notes=notes)
+            manager.save_composition(comp)
+            expected.append(json.loads(json.dumps(comp.to_dict())))
+
+        versions = manager.list_versions("Edited.json")
+        assert [v['version'] for v in versions] == list(range(100)), "Revisions missing"
+        for version in (0, 37, 64, 99):
+            restored = manager.load_version("Edited.json", version)
+            assert restored.to_dict() == expected[version], f"Version {version} changed"
+        assert manager.load_version("Edited.json").tempo == 159, "Latest version wrong"
+        assert manager.load_version("Edited.json", 100) is None, "Unknown version found"
+        print("Every revision can be restored")
+
+        snapshots = [v['version'] for v in versions if v['snapshot']]
+        gaps = [b - a for a, b in zip(snapshots, snapshots[1:] + [100])]
+        assert max(gaps) <= MAX_DELTA_CHAIN + 1, "Delta chains are not bounded"
+        latest_size = os.path.getsize(os.path.join(TEST_DIRECTORY, "Edited.json"))
+        history_size = manager.history.size("Edited.json")
+        assert history_size < 100 * latest_size / 10, \
+            f"History of {history_size} bytes is not much smaller than 100 copies"
+        print(f"History of 100 revisions takes {history_size / latest_size:.1f}x the latest file")
+
+        assert manager.delete_composition("Edited"), "Delete failed"
+        assert manager.list_versions("Edited.json") == [], "History not removed on delete"
+
+        # A one-note edit of a long melody with few distinct notes is diffed
+        # in linear time (saves hold the file lock meanwhile)
+        melody = [261.63, 293.66, 329.63] * 20000
+        edited = list(melody)
+        edited[30000] = 440.0
+        start = time.perf_counter()
+        delta = diff_compositions({'notes': melody}, {'notes': edited})
+        elapsed = time.perf_counter() - start
+        assert delta['patches'] == [[30000, 30001, [440.0]]], "Wrong patch for one changed note"
+        assert elapsed < 0.5, f"Diffing 60000 notes took {elapsed:.2f}s"
+        inserted = melody[:100] + [440.0, 440.0] + melody[100:]
+        delta = diff_compositions({'notes': melody}, {'notes': inserted})
+        assert delta['patches'] == [[100, 100, [440.0, 440.0]]], "Wrong patch for inserted notes"
+        assert apply_delta({'notes': melody}, delta)['notes'] == inserted, "Insertion not restored"
+        print(f"Diffing a one-note edit of 60000 notes takes {elapsed * 1000:.1f} ms")
+
+        return True
+
+    except Exception as e:
+        print(f"Version history test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING STORAGE TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Binary Format", test_binary_format),
+        ("Mixed Formats", test_mixed_formats),
+        ("Metadata Index", test_metadata_index),
+        ("Composition Cache", test_composition_cache),
+        ("Write-Behind", test_write_behind),
+        ("Recipe Compositions", test_recipe_compositions),
+        ("Compact Compositions", test_compact_composition),
+        ("Symphony Bundle", test_symphony_bundle),
+        ("Catalog Scan", test_catalog_scan),
+        ("Catalog Queries", test_query),
+        ("JSON Lines Transfer", test_jsonl_transfer),
+        ("Concurrent Writers", test_concurrent_writers),
+        ("Note Blobs", test_note_blobs),
+        ("Version History", test_version_history),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+        # Clean up after the test has released its memory-mapped files
+        reset_test_directory()
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
@@ -0,0 +1,134 @@
+# Test script for pipeline instrumentation
+# Records spans across the generator, storage and sequence stages
+
+import json
+import os
+import shutil
+import sys
+
+TEST_DIRECTORY = "test_trace_files"
+
+def test_spans():
+    # Test nested spans, CPU time, memory peaks and errors
+    print("Testing spans...")
+
+    try:
+        import instrumentation
+        from instrumentation import span, traced
+
+        @traced(category='test')
+        def allocate(size):
+            return bytearray(size)
+
+        @traced("failing", 'test')
+        def fail():
+            raise ValueError("boom")
+
+        assert not instrumentation.is_enabled(), "Recording enabled by default"
+        with instrumentation.recording(trace_memory=True) as recorder:
+            with span("outer", 'test', size=4):
+                allocate(1 << 20)
+                allocate(1 << 16)
+            try:
+                fail()
+            except ValueError:
+                pass
+        assert not instrumentation.is_enabled(), "Recording still enabled"
+
+        events = {event['name']: event for event in recorder.events}
+        inner = [event for event in recorder.events if event['name'].endswith('allocate')]
+        assert len(inner) == 2, "Missing inner spans"
+        outer = events['outer']
+        assert outer['args']['size'] == 4 and outer['ph'] == 'X', "Wrong span fields"
+        assert outer['args']['memory_peak_bytes'] >= 1 << 20, "Outer span missed the inner peak"
+        assert inner[1]['args']['memory_peak_bytes'] < 1 << 20, "Inner peak leaked into its sibling"
+        assert outer['dur'] >= sum(event['dur'] for event in inner), "Outer span shorter than its parts"
+        assert events['failing']['args']['error'] == 'ValueError', "Error not recorded"
+        assert recorder.summary()[inner[0]['name']]['count'] == 2, "Wrong summary"
+
+        # Disabled spans are no-ops
+        with span("ignored"):
+            allocate(10)
+        assert len(recorder.events) == 4, "Span recorded while disabled"
+        print("Spans work")
+        return True
+
+    except Exception as e:
+        print(f"Span test failed: {e}")
+        return False
+
+def test_pipeline_trace():
+    # Test a Chrome trace of a generator run
+    print("\nTesting pipeline trace...")
+
+    try:
+        import instrumentation
+        from composition import CompositionManager
+        from melody_generator import MelodyGenerator
+
+        generator = MelodyGenerator(quiet=True)
+        generator.composition_manager = CompositionManager(os.path.join(TEST_DIRECTORY, "catalog"))
+        with instrumentation.recording() as recorder:
+            generator.generate_prime_melody(12, save=True)
+            generator.list_saved_compositions()
+        names = {event['name'] for event in recorder.events}
+        for expected in ("generate_primes", "sequence_to_notes", "MelodyGenerator.generate_prime_melody",
+                         "CompositionManager.save_composition", "CompositionManager.query"):
+            assert expected in names, f"Missing span {expected}"
+
+        filepath = os.path.join(TEST_DIRECTORY, "trace.json")
+        assert recorder.save_chrome_trace(filepath), "Saving the trace failed"
+        with open(filepath) as f:
+            trace = json.load(f)
+        assert len(trace['traceEvents']) == len(recorder.events), "Trace events missing"
+        event = trace['traceEvents'][0]
+        assert {'name', 'ph', 'ts', 'dur', 'pid', 'tid'} <= set(event), "Not a Chrome trace event"
+        print("Chrome trace export works")
+        return True
+
+    except Exception as e:
+        print(f"Pipeline trace test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING INSTRUMENTATION TESTS")
+    print("=" * 60)
+
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+    os.makedirs(TEST_DIRECTORY)
+
+    tests = [
+        ("Spans", test_spans),
+        ("Pipeline Trace", test_pipeline_trace),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
@@ -65,6 +65,40 @@ def test_audio_engine():
         print(f"Audio engine test failed: {e}")
         return False
 
+def test_additive_synthesis():
+    # Test additive synthesis with sequence-derived timbres
+    print("\nTesting additive synthesis...")
+    
+    try:
+        from math_sequences import generate_prime_gaps, sequence_to_partials
+        from synthesis import AdditiveSynthesizer, timbre_partials, to_wav_bytes
+        
+        # Test prime gaps and partial amplitudes
+        gaps = generate_prime_gaps(5)
+        assert gaps == [1, 2, 2, 4, 2], f"Prime gaps test failed: {gaps}"
+        partials = sequence_to_partials(gaps, 16)
+        assert len(partials) == 16, "Wrong number of partials"
+        assert abs(sum(partials) - 1.0) < 1e-9, "Partials should sum to 1"
+        print("Sequence-derived partials work")
+        
+        # Test rendering length and range
+        synth = AdditiveSynthesizer(sample_rate=8000, frame_size=256)
+        samples = synth.render([261.63, 329.63], [500, 250], timbre_partials('pi', 64), gap_ms=50)
+        assert len(samples) == int((500 + 50 + 250 + 50) * 8000 / 1000), "Wrong number of samples"
+        assert samples.max() <= 1.0 and samples.min() >= -1.0, "Samples out of range"
+        assert abs(samples).max() > 0.1, "Rendered melody is silent"
+        print("Additive rendering works")
+        
+        wav_data = to_wav_bytes(samples, 8000)
+        assert wav_data[:4] == b'RIFF', "WAV header missing"
+        print("WAV encoding works")
+        
+        return True
+        
+    except Exception as e:
+        print(f"Additive synthesis test failed: {e}")
+        return False
+
 def test_composition_management():
     # Test composition management
     print("\nTesting composition management...")
@@ -126,6 +160,130 @@ def test_melody_generator():
         print(f"Melody generator test failed: {e}")
         return False
 
+def test_generator_events():
+    # Test structured events and quiet mode
+    print("\nTesting generator events...")
+    
+    try:
+        import io
+        import json
+        from events import JsonLinesSink, SequenceGenerated
+        from melody_generator import MelodyGenerator
+        
+        # Quiet mode creates no events and prints nothing
+        generator = MelodyGenerator(quiet=True)
+        created = []
+        original_init = SequenceGenerated.__init__
+        SequenceGenerated.__init__ = lambda self, *args: (created.append(args), original_init(self, *args))[1]
+        try:
+            generator.generate_prime_melody(6, save=False)
+        finally:
+            SequenceGenerated.__init__ = original_init
+        assert not created, "Quiet mode created events"
+        
+        # Saving and loading stay quiet too
+        import contextlib
+        import shutil
+        from composition import CompositionManager
+        directory = "test_quiet_files"
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        generator.composition_manager = CompositionManager(
+            directory, report=generator.composition_manager.report
+        )
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            comp = generator.generate_prime_melody(6, save=True)
+            loaded = generator.composition_manager.load_composition("Primes_6_Numbers.json")
+        shutil.rmtree(directory)
+        assert loaded is not None and loaded.notes == comp.notes, "Quiet save failed"
+        assert stdout.getvalue() == "", f"Quiet mode printed {stdout.getvalue()!r}"
+        print("Quiet mode works")
+        
+        # Callbacks receive typed events; JSON lines leave out the raw sequence
+        received = []
+        stream = io.StringIO()
+        generator = MelodyGenerator(sinks=[received.append, JsonLinesSink(stream)])
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        generator.composition_manager = CompositionManager(
+            directory, report=generator.composition_manager.report
+        )
+        generator.generate_fibonacci_melody(8, save=False)
+        shutil.rmtree(directory)
+        kinds = [event.kind for event in received]
+        assert kinds == ['generation_started', 'sequence_generated', 'notes_mapped', 'notice'], \
+            f"Wrong events: {kinds}"
+        assert received[3].text == "Composition 'Fibonacci_8_Notes' saved successfully.", \
+            "Storage message not routed to the sinks"
+        assert received[1].sequence[:4] == [0, 1, 1, 2], "Event does not carry the sequence"
+        assert received[1].message().startswith("Fibonacci sequence: [0, 1, 1, 2"), "Wrong message"
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert records[1] == dict(records[1], event='sequence_generated', length=8), "Wrong JSON record"
+        assert 'sequence' not in records[1], "JSON record contains the raw sequence"
+        
+        assert generator.get_composition_info() is None, "Info without composition"
+        assert received[-1].kind == 'notice', "Missing notice"
+        print("Event sinks work")
+        
+        return True
+        
+    except Exception as e:
+        print(f"Generator events test failed: {e}")
+        return False
+
+def test_generate_batch():
+    # Test parameter sweeps with shared sequences and per-item errors
+    print("\nTesting batch generation...")
+    
+    try:
+        import os
+        import shutil
+        from math_sequences import generate_sequence, sequence_to_notes, sequence_to_notes_by_scale
+        from melody_generator import MelodyGenerator
+        
+        sequence = generate_sequence('fibonacci', 400)
+        by_scale = sequence_to_notes_by_scale(sequence, ['major', 'minor', 'pentatonic'])
+        for scale_type, notes in by_scale.items():
+            assert notes.tolist() == sequence_to_notes(sequence, scale_type), f"{scale_type} notes differ"
+        print("Vectorized scale mapping works")
+        
+        generator = MelodyGenerator(quiet=True)
+        spec = {'sequence_type': ['primes', 'pi'], 'n': [4, 9], 'scale_type': ['major', 'minor'],
+                'tempo': [90, 120]}
+        items = list(generator.generate_batch(spec, save=False))
+        assert len(items) == 16, f"Expected 16 variants, got {len(items)}"
+        for comp, result, error in items:
+            expected = sequence_to_notes(generate_sequence(comp.sequence_type, comp.recipe['n']), comp.scale_type)
+            assert comp.notes == expected, f"Wrong notes for {comp.name}"
+            assert result is None and error is None, "Unexpected result"
+        assert items[1][0].name == "primes_4_major_simple_120", f"Wrong name {items[1][0].name}"
+        print("Sweep expansion works")
+        
+        # One unwritable output fails its item only
+        directory = "test_sweep_files"
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(os.path.join(directory, "pi_9_minor_simple_90.mid"))
+        items = list(generator.generate_batch(spec, save=False, outputs=['midi'],
+                                              output_directory=directory, workers=2))
+        failed = [comp.name for comp, _result, error in items if error is not None]
+        assert failed == ["pi_9_minor_simple_90"], f"Wrong failures: {failed}"
+        assert items[0][1]['outputs']['midi'].endswith("primes_4_major_simple_90.mid"), "Wrong result"
+        shutil.rmtree(directory)
+        print("Per-item errors work")
+        
+        try:
+            generator.generate_batch({'sequence_type': 'primes', 'scale_type': 'lydian'})
+            assert False, "Invalid sweep accepted"
+        except ValueError:
+            pass
+        return True
+        
+    except Exception as e:
+        print(f"Batch generation test failed: {e}")
+        return False
+
 def run_all_tests():
     # Run all tests and report results
     print("=" * 60)
@@ -135,8 +293,11 @@ def run_all_tests():
     tests = [
         ("Mathematical Sequences", test_math_sequences),
         ("Audio Engine", test_audio_engine),
+        ("Additive Synthesis", test_additive_synthesis),
         ("Composition Management", test_composition_management),
-        ("Melody Generator", test_melody_generator)
+        ("Melody Generator", test_melody_generator),
+        ("Generator Events", test_generator_events),
+        ("Batch Generation", test_generate_batch)
     ]
     
     passed = 0
@@ -0,0 +1,170 @@
+# Test script for MIDI export
+# Writes compositions as Standard MIDI Files and reads them back
+
+import os
+import shutil
+import struct
+import sys
+
+TEST_DIRECTORY = "test_midi_files"
+
+def read_vlq(data, pos):
+    # Read a MIDI variable-length quantity
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+def parse_midi(data):
+    # Minimal Standard MIDI File reader for the tests
+    # returns: (format, ticks per quarter, list of tracks); each track is a
+    #          list of (absolute tick, event bytes)
+    assert data[:4] == b'MThd', "Missing MThd header"
+    _length, midi_format, track_count, division = struct.unpack('>IHHH', data[4:14])
+    pos = 14
+    tracks = []
+    for _ in range(track_count):
+        assert data[pos:pos + 4] == b'MTrk', "Missing MTrk chunk"
+        length = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        end = pos + 8 + length
+        pos += 8
+        tick = 0
+        events = []
+        while pos < end:
+            delta, pos = read_vlq(data, pos)
+            tick += delta
+            if data[pos] == 0xFF:
+                size, data_start = read_vlq(data, pos + 2)
+                events.append((tick, data[pos:data_start + size]))
+                pos = data_start + size
+            else:
+                events.append((tick, data[pos:pos + 3]))
+                pos += 3
+        tracks.append(events)
+    return midi_format, division, tracks
+
+def test_note_quantization():
+    # Test frequency to MIDI note conversion
+    print("Testing note quantization...")
+
+    try:
+        from midi_export import durations_to_ticks, frequencies_to_midi
+
+        pitches = frequencies_to_midi([261.63, 440.0, 523.25, 452.0, 5.0, 30000.0]).tolist()
+        assert pitches == [60, 69, 72, 69, 0, 127], f"Wrong MIDI notes: {pitches}"
+        ticks = durations_to_ticks([500, 800, 200, 0]).tolist()
+        assert ticks == [480, 768, 192, 1], f"Wrong tick durations: {ticks}"
+        print("Note quantization works")
+        return True
+
+    except Exception as e:
+        print(f"Note quantization test failed: {e}")
+        return False
+
+def test_single_track():
+    # Test exporting one composition
+    print("\nTesting single-track export...")
+
+    try:
+        from composition import Composition
+        from midi_export import composition_to_midi
+
+        comp = Composition("Waltz", "fibonacci", [261.63, 293.66, 329.63, 349.23], 90, "major", "waltz")
+        midi_format, division, tracks = parse_midi(composition_to_midi(comp))
+        assert midi_format == 0 and division == 480 and len(tracks) == 1, "Wrong header"
+
+        events = tracks[0]
+        tempo = [event for _tick, event in events if event[:2] == b'\xff\x51'][0]
+        assert int.from_bytes(tempo[3:], 'big') == 666667, "Wrong tempo event"
+        note_ons = [(tick, event[1]) for tick, event in events if event[0] == 0x90]
+        assert note_ons == [(0, 60), (768, 62), (1152, 64), (1536, 65)], f"Wrong notes: {note_ons}"
+        assert events[-1][1] == b'\xff\x2f\x00', "Missing end of track"
+        print("Single-track export works")
+        return True
+
+    except Exception as e:
+        print(f"Single-track test failed: {e}")
+        return False
+
+def test_symphony_export():
+    # Test exporting movements as a multi-track file
+    print("\nTesting multi-track symphony export...")
+
+    try:
+        from composition import Composition, CompositionManager
+        from midi_export import save_midi
+
+        if os.path.exists(TEST_DIRECTORY):
+            shutil.rmtree(TEST_DIRECTORY)
+        os.makedirs(TEST_DIRECTORY)
+        movements = [
+            Composition("First", "fibonacci", [261.63] * 4, 120, "major", "simple"),
+            Composition("Second", "primes", [440.0] * 2, 60, "minor", "march"),
+        ]
+        filepath = os.path.join(TEST_DIRECTORY, "Symphony.mid")
+        assert save_midi(movements, filepath), "Export failed"
+        with open(filepath, 'rb') as f:
+            midi_format, _division, tracks = parse_midi(f.read())
+        assert midi_format == 1 and len(tracks) == 3, "Expected a conductor and two tracks"
+        tempos = [(tick, int.from_bytes(event[3:], 'big'))
+                  for tick, event in tracks[0] if event[:2] == b'\xff\x51']
+        assert tempos == [(0, 500000), (1920, 1000000)], f"Wrong tempo map: {tempos}"
+        second = [(tick, event[0] & 0x0F) for tick, event in tracks[2] if event[0] & 0xF0 == 0x90]
+        assert second == [(1920, 1), (2496, 1)], f"Second movement misplaced: {second}"
+        print("Multi-track export works")
+
+        manager = CompositionManager(os.path.join(TEST_DIRECTORY, "catalog"))
+        for comp in movements:
+            manager.save_composition(comp)
+        midi_directory = os.path.join(TEST_DIRECTORY, "midi")
+        assert manager.export_midi(midi_directory) == 2, "Batch export failed"
+        assert sorted(os.listdir(midi_directory)) == ["First.mid", "Second.mid"], "Wrong files"
+        print("Batch catalog export works")
+        return True
+
+    except Exception as e:
+        print(f"Symphony export test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING MIDI EXPORT TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Note Quantization", test_note_quantization),
+        ("Single Track", test_single_track),
+        ("Symphony Export", test_symphony_export),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
@@ -0,0 +1,118 @@
+# Test script for rhythm patterns
+# Checks Euclidean, sequence-derived and tuplet rhythms and their use by the
+# MIDI export and offline rendering
+
+import sys
+
+def test_rhythm_patterns():
+    # Test rhythm specs, lookups and errors
+    print("Testing rhythm patterns...")
+
+    try:
+        from rhythm import create_rhythm_pattern, get_rhythm, is_rhythm_pattern, resolve_rhythm
+
+        assert create_rhythm_pattern('waltz', 5) == [800, 400, 400, 800, 400], "Wrong waltz pattern"
+        assert create_rhythm_pattern('unknown', 2) == [500, 500], "Unknown pattern should play plain beats"
+
+        tresillo = get_rhythm('euclid:3:8')
+        assert tresillo.take(4) == [750, 750, 500, 750], f"Wrong tresillo: {tresillo.take(4)}"
+        assert get_rhythm('euclid:3:8:2').take(3) == [500, 750, 750], "Wrong rotation"
+        assert get_rhythm('euclid:8:8').take(2) == [250, 250], "Wrong full Euclidean rhythm"
+        assert get_rhythm('euclid:3:8') is tresillo, "Specs should be cached"
+        try:
+            tresillo.cycle[0] = 1.0
+            assert False, "Cached rhythm cycle is writable"
+        except ValueError:
+            pass
+
+        gaps = get_rhythm('sequence:prime_gaps:5')
+        assert gaps.take(5) == [125, 250, 250, 500, 250], f"Wrong prime gap rhythm: {gaps.take(5)}"
+        tuplets = get_rhythm('tuplets:3,1')
+        assert tuplets.cycle_ms == 1000 and len(tuplets) == 4, "Wrong tuplet cycle"
+
+        # Lookups far into a melody need no materialized pattern
+        i = 3 * 10 ** 12 + 2
+        waltz = get_rhythm('waltz')
+        assert waltz.duration(i) == 400 and waltz.onset(i) == 10 ** 12 * 1600 + 1200, "Wrong O(1) lookup"
+        assert waltz.total_ms(7) == sum(create_rhythm_pattern('waltz', 7)), "Wrong total duration"
+        assert list(tuplets.iter_durations(5)) == tuplets.take(5), "Lazy durations differ"
+
+        for invalid in ('euclid:9:8', 'euclid:0:8', 'sequence:unknown', 'tuplets:0', 'swing', None,
+                        'cycle:500,nan', 'cycle:inf', 'cycle:-inf,500'):
+            assert not is_rhythm_pattern(invalid), f"Accepted invalid pattern {invalid!r}"
+        try:
+            get_rhythm('euclid:9:8')
+            assert False, "Invalid Euclidean rhythm accepted"
+        except ValueError:
+            pass
+        assert resolve_rhythm('euclid:9:8').take(1) == [500], "Invalid pattern should play plain beats"
+        print("Rhythm patterns work")
+        return True
+
+    except Exception as e:
+        print(f"Rhythm pattern test failed: {e}")
+        return False
+
+def test_rhythm_outputs():
+    # Test rhythm specs in MIDI export and additive rendering
+    print("\nTesting rhythm outputs...")
+
+    try:
+        from composition import Composition
+        from midi_export import composition_events
+        from rhythm import get_rhythm
+        from synthesis import AdditiveSynthesizer
+
+        notes = [261.63, 293.66, 329.63, 349.23, 392.0]
+        comp = Composition("Tresillo", "primes", notes, 120, "major", "euclid:3:8")
+        _pitches, ticks = composition_events(comp)
+        assert ticks.tolist() == [720, 720, 480, 720, 720], f"Wrong MIDI durations: {ticks.tolist()}"
+
+        synthesizer = AdditiveSynthesizer(sample_rate=8000)
+        rhythm = get_rhythm('tuplets:3,2')
+        from_rhythm = synthesizer.render(notes, rhythm, gap_ms=0)
+        from_list = synthesizer.render(notes, rhythm.take(len(notes)), gap_ms=0)
+        assert len(from_rhythm) == len(from_list) == int(rhythm.total_ms(5) * 8), "Wrong render length"
+        assert (from_rhythm == from_list).all(), "Rendering a Rhythm differs from its durations"
+        print("Rhythm outputs work")
+        return True
+
+    except Exception as e:
+        print(f"Rhythm output test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING RHYTHM TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Rhythm Patterns", test_rhythm_patterns),
+        ("Rhythm Outputs", test_rhythm_outputs),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
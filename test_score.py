@@ -0,0 +1,113 @@
+# Test script for the event score
+# Builds scores from compositions, merges voices, slices by time and exports
+# them as MIDI
+
+import sys
+
+import numpy as np
+
+def test_score_timeline():
+    # Test building, sorting, merging and slicing scores
+    print("Testing score timeline...")
+
+    try:
+        from composition import CompactComposition, Composition
+        from score import SCORE_DTYPE, Score
+
+        melody = Composition("Melody", "primes", [261.63, 293.66, 329.63, 349.23], 90, "major", "waltz")
+        bass = Composition("Bass", "pi", [130.81, 146.83, 164.81], 90, "major", "simple")
+        score = melody.to_score()
+        assert score.events.dtype == SCORE_DTYPE and len(score) == 4, "Wrong score layout"
+        assert score.events['onset_ticks'].tolist() == [0, 768, 1152, 1536], "Wrong onsets"
+        assert score.events['midi_pitch'].tolist() == [60, 62, 64, 65], "Wrong pitches"
+        assert score.end_ticks == 2304 and score.tempo == 90, "Wrong length or tempo"
+
+        merged = Score.merge([score, bass.to_score(voice=1)])
+        onsets = merged.events['onset_ticks'].tolist()
+        assert onsets == sorted(onsets) and len(merged) == 7, "Merged score not sorted"
+        assert merged.events['voice'][:2].tolist() == [0, 1], "Notes starting together lost their voice order"
+        assert merged.voices.tolist() == [0, 1], "Wrong voices"
+
+        unsorted = Score(merged.events[::-1].copy())
+        assert unsorted.events['onset_ticks'].tolist() == onsets, "Unsorted events not sorted"
+
+        window = merged.between(480, 1200)
+        assert window.events['onset_ticks'].tolist() == [480, 768, 960, 1152], "Wrong time slice"
+        assert np.shares_memory(window.events, merged.events), "Time slice copied the events"
+        assert merged.voice(1).events['freq'].tolist() == bass.notes, "Wrong voice selection"
+
+        roundtrip = Composition.from_score(score, "Roundtrip")
+        assert roundtrip.notes == melody.notes and roundtrip.rhythm_pattern == "waltz", "Round trip lost notes or rhythm"
+        compact = CompactComposition.from_score(merged, "Bass", voice=1)
+        assert compact.rhythm_pattern == "simple" and compact.tempo == 90, "Wrong compact composition"
+        print("Score timeline works")
+        return True
+
+    except Exception as e:
+        print(f"Score timeline test failed: {e}")
+        return False
+
+def test_score_midi():
+    # Test MIDI export of single and multi-voice scores
+    print("\nTesting score MIDI export...")
+
+    try:
+        from composition import Composition
+        from midi_export import composition_to_midi
+        from score import Score
+        from test_midi_export import parse_midi
+
+        comp = Composition("Tresillo", "primes", [261.63, 293.66, 329.63, 261.63], 100, "major", "euclid:3:8")
+        assert comp.to_score().to_midi("Tresillo") == composition_to_midi(comp), "Single voice differs from composition export"
+
+        # Two voices overlapping; voice 9 must skip the drum channel
+        score = Score.from_notes([440.0, 440.0], [480, 480], voice=0)
+        score = Score.merge([score, Score.from_notes([220.0], [960], voice=9, velocity=50, start_ticks=240)])
+        midi_format, _division, tracks = parse_midi(score.to_midi())
+        channel_events = [(tick, event[0], event[1], event[2]) for tick, event in tracks[0] if event[0] < 0xF0]
+        assert midi_format == 0 and channel_events == [
+            (0, 0x90, 69, 96), (240, 0x9A, 57, 50), (480, 0x80, 69, 0), (480, 0x90, 69, 96),
+            (960, 0x80, 69, 0), (1200, 0x8A, 57, 0),
+        ], f"Wrong events: {channel_events}"
+        print("Score MIDI export works")
+        return True
+
+    except Exception as e:
+        print(f"Score MIDI test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING SCORE TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Score Timeline", test_score_timeline),
+        ("Score MIDI", test_score_midi),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
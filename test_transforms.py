@@ -0,0 +1,132 @@
+# Test script for melodic transformations
+# Derives variations from a theme and checks which buffers they share
+
+import sys
+
+import numpy as np
+
+def test_pitch_transforms():
+    # Test transposition, inversion, retrograde and scale remapping
+    print("Testing pitch transforms...")
+
+    try:
+        from composition import Composition
+        from math_sequences import sequence_to_notes
+        from transforms import invert, remap_scale, retrograde, transpose
+
+        sequence = list(range(40))
+        theme = Composition("Theme", "primes", sequence_to_notes(sequence, 'major'), 120, "major", "waltz")
+        original = list(theme.notes)
+
+        up = transpose(theme, 12)
+        assert np.allclose(up.notes[:7], np.array(original[:7]) * 2), "Octave transposition failed"
+        assert up.name == "Theme (transposed +12)" and up.rhythm_pattern == "waltz", "Wrong variation fields"
+        quarter = transpose(theme, -0.5)
+        assert quarter.name == "Theme (transposed -0.5)", f"Wrong fractional name {quarter.name}"
+
+        inverted = invert(theme, axis=440.0)
+        assert np.allclose(inverted.notes * np.array(original), 440.0 ** 2), "Inversion is not a mirror"
+        assert invert(theme).notes[0] == original[0], "Inversion should keep the first note"
+
+        backwards = retrograde(theme)
+        assert backwards.notes.tolist() == original[::-1], "Retrograde notes not reversed"
+        # 40 waltz notes end on the strong beat, so the reversed cycle starts there
+        assert backwards.rhythm_pattern == "waltz", f"Wrong retrograde rhythm: {backwards.rhythm_pattern}"
+        assert retrograde(retrograde(transpose(theme, 0))).rhythm_pattern == "waltz", "Double retrograde changed the rhythm"
+
+        for scale_type in ('minor', 'pentatonic'):
+            remapped = remap_scale(theme, scale_type)
+            assert remapped.notes.tolist() == sequence_to_notes(sequence, scale_type), f"Wrong {scale_type} remap"
+            assert remapped.scale_type == scale_type, "Scale type not updated"
+        assert theme.notes == original, "Theme was modified"
+        try:
+            remap_scale(theme, 'lydian')
+            assert False, "Unknown scale accepted"
+        except ValueError:
+            pass
+        print("Pitch transforms work")
+        return True
+
+    except Exception as e:
+        print(f"Pitch transform test failed: {e}")
+        return False
+
+def test_timing_transforms():
+    # Test augmentation, diminution and time-stretch, and buffer sharing
+    print("\nTesting timing transforms...")
+
+    try:
+        from composition import CompactComposition, Composition
+        from rhythm import create_rhythm_pattern
+        from array import array
+        from transforms import augment, diminish, retrograde, time_stretch, transpose
+
+        theme = Composition("Theme", "primes", np.linspace(220.0, 880.0, 1000), 120, "minor", "march")
+        slow = augment(theme, 2)
+        assert slow.rhythm_pattern == "cycle:1200,400,800,400", f"Wrong augmented rhythm: {slow.rhythm_pattern}"
+        assert diminish(slow, 2).rhythm_pattern == "march", "Diminution did not undo augmentation"
+        assert np.shares_memory(slow.notes, theme.notes), "Augmentation copied the notes"
+        assert not slow.notes.flags.writeable, "Shared notes are writable"
+        assert np.shares_memory(retrograde(theme).notes, theme.notes), "Retrograde copied the notes"
+
+        stretched = time_stretch(theme, 2)
+        assert stretched.tempo == 60 and stretched.rhythm_pattern == "march", "Wrong time-stretch"
+        assert create_rhythm_pattern(slow.rhythm_pattern, 4) == [1200, 400, 800, 400], "Augmented rhythm unusable"
+
+        # Recipe notes stay unloaded, compact notes stay compact
+        lazy = Composition.from_recipe("Lazy", "primes", 500)
+        lazy_variant = time_stretch(lazy, 0.5)
+        assert not lazy_variant.notes_loaded and lazy_variant.tempo == 240, "Recipe notes were generated"
+        assert lazy_variant.notes == lazy.notes, "Wrong recipe notes"
+        compact = CompactComposition.from_composition(theme)
+        compact_variant = augment(compact, 3)
+        assert isinstance(compact_variant, CompactComposition), "Wrong variation class"
+        assert isinstance(compact_variant._notes, array), "Compact variant notes are not an array('f')"
+        assert compact_variant.notes == compact.notes, "Wrong compact variant notes"
+        pitch_variant = transpose(compact, 12)
+        assert isinstance(pitch_variant._notes, array), "Compact pitch variant notes are not an array('f')"
+        # The theme stays resizable after variations are taken
+        compact.notes.append(440.0)
+        assert len(compact.notes) == 1001 and len(compact_variant.notes) == 1000, "Variation shares the theme"
+        print("Timing transforms work")
+        return True
+
+    except Exception as e:
+        print(f"Timing transform test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING TRANSFORM TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Pitch Transforms", test_pitch_transforms),
+        ("Timing Transforms", test_timing_transforms),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
@@ -0,0 +1,120 @@
+# Test script for visualization
+# Checks the data reductions behind the plots and renders PNG files
+
+import os
+import shutil
+import sys
+
+import numpy as np
+
+TEST_DIRECTORY = "test_visualize_files"
+
+def test_reductions():
+    # Test envelope, spectrogram and piano roll reductions
+    print("Testing plot data reductions...")
+
+    try:
+        import visualize
+        from visualize import minmax_envelope, piano_roll_image, spectrogram_columns
+
+        samples = np.sin(2 * np.pi * 440 * np.arange(44100) / 44100).astype(np.float32)
+        samples[30000] = -1.0
+        # Small chunks exercise the chunked reads
+        chunk_size = visualize.ENVELOPE_CHUNK_SIZE
+        visualize.ENVELOPE_CHUNK_SIZE = 1000
+        try:
+            mins, maxs = minmax_envelope(samples, 300)
+        finally:
+            visualize.ENVELOPE_CHUNK_SIZE = chunk_size
+        edges = np.arange(301) * len(samples) // 300
+        expected = [samples[edges[i]:edges[i + 1]].min() for i in range(300)]
+        assert np.array_equal(mins, expected), "Wrong envelope minimums"
+        assert len(maxs) == 300 and maxs.max() <= 1.0, "Wrong envelope maximums"
+        pcm_mins, _pcm_maxs = minmax_envelope((samples * 32767).astype(np.int16), 300)
+        assert np.allclose(pcm_mins, mins, atol=1e-3), "16-bit samples not rescaled"
+        print("Min/max envelope works")
+
+        spectrogram = spectrogram_columns(samples, 12, fft_size=2048)
+        assert spectrogram.shape == (1025, 12), f"Wrong spectrogram shape {spectrogram.shape}"
+        peaks = spectrogram.argmax(axis=0) * 44100 / 2048
+        assert np.all(np.abs(peaks - 440) < 44100 / 2048), f"Wrong spectral peaks {peaks}"
+        print("Chunked spectrogram works")
+
+        image, low, total_ms = piano_roll_image([440.0, 440.0, 880.0], [500, 500, 1000], 8)
+        assert low == 69 and total_ms == 2000 and image.shape == (13, 8), "Wrong piano roll layout"
+        assert image[0].tolist() == [1, 1, 1, 1, 0, 0, 0, 0], "Wrong low note span"
+        assert image[12].tolist() == [0, 0, 0, 0, 1, 1, 1, 1], "Wrong high note span"
+        print("Piano roll rasterization works")
+        return True
+
+    except Exception as e:
+        print(f"Reduction test failed: {e}")
+        return False
+
+def test_png_output():
+    # Test rendering plots to PNG files
+    print("\nTesting PNG output...")
+
+    try:
+        from composition import Composition
+        from synthesis import AdditiveSynthesizer
+        from visualize import plot_piano_roll, plot_spectrogram, plot_waveform
+
+        if os.path.exists(TEST_DIRECTORY):
+            shutil.rmtree(TEST_DIRECTORY)
+        os.makedirs(TEST_DIRECTORY)
+        comp = Composition.from_recipe("Primes", "primes", 24, "minor", 120, "march")
+        samples = AdditiveSynthesizer().render(comp.notes)
+        paths = [os.path.join(TEST_DIRECTORY, name)
+                 for name in ("roll.png", "waveform.png", "spectrogram.png")]
+        assert plot_piano_roll(comp, paths[0], width=800, height=300), "Piano roll failed"
+        assert plot_waveform(samples, paths[1], width=800, height=300), "Waveform failed"
+        assert plot_spectrogram(samples, paths[2], width=800, height=300), "Spectrogram failed"
+        for path in paths:
+            with open(path, 'rb') as f:
+                assert f.read(8) == b'\x89PNG\r\n\x1a\n', f"{path} is not a PNG file"
+        print("PNG output works")
+        return True
+
+    except Exception as e:
+        print(f"PNG output test failed: {e}")
+        return False
+
+def run_all_tests():
+    # Run all tests and report results
+    print("=" * 60)
+    print("           RUNNING VISUALIZATION TESTS")
+    print("=" * 60)
+
+    tests = [
+        ("Reductions", test_reductions),
+        ("PNG Output", test_png_output),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        if test_func():
+            passed += 1
+        else:
+            print(f"  {test_name} test failed!")
+
+    if os.path.exists(TEST_DIRECTORY):
+        shutil.rmtree(TEST_DIRECTORY)
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+if __name__ == "__main__":
+    try:
+        success = run_all_tests()
+        if not success:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\nTesting interrupted by user.")
+        sys.exit(1)
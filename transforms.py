@@ -0,0 +1,163 @@
+# Melodic transformations for deriving variations from a theme
+# Every transform takes a composition (Composition or CompactComposition)
+# and returns a new one of the same class, leaving the theme untouched.
+# Pitch transforms run as one vectorized operation over the note array;
+# transforms that only change timing (augmentation, diminution, time-stretch)
+# share the theme's notes instead of copying them - including unloaded
+# recipe notes - and retrograde reverses them as a view. Themes are never
+# mutated: shared note arrays are handed out read-only. Compact float32
+# notes are the exception: they are resizable, so they are copied rather
+# than exported, and compact variants keep them as an array('f').
+#
+# Usage:
+#   theme = generator.generate_prime_melody(64, save=False)
+#   answer = transpose(invert(theme), 7)
+#   coda = time_stretch(retrograde(theme), 2.0)
+
+import copy
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from math_sequences import MAX_OCTAVE, SCALE_BASE_NOTES, reduced_to_notes
+from rhythm import resolve_rhythm, rhythm_spec
+
+MIN_FREQUENCY = 20
+MAX_FREQUENCY = 20000
+
+def note_array(comp):
+    # Note frequencies of a composition as a read-only array
+    # Float arrays (memory maps, earlier transforms) are viewed without
+    # copying; note lists are converted once. Compact notes are copied: a
+    # view would export their buffer and stop the theme's array('f') from
+    # ever growing or shrinking again.
+    notes = comp.notes
+    if isinstance(notes, array):
+        view = np.frombuffer(notes, dtype=np.float32).copy()
+    elif isinstance(notes, np.ndarray) and notes.dtype in (np.float32, np.float64):
+        view = notes.view()
+    else:
+        view = np.array(notes, dtype=np.float64)
+    view.flags.writeable = False
+    return view
+
+def _with_notes(comp, label, notes, **fields):
+    # New composition of the same class with new notes
+    fields.setdefault('rhythm_pattern', comp.rhythm_pattern)
+    fields.setdefault('scale_type', comp.scale_type)
+    fields.setdefault('tempo', comp.tempo)
+    return type(comp)(f"{comp.name} ({label})", comp.sequence_type, notes, **fields)
+
+def _with_timing(comp, label, tempo=None, rhythm_pattern=None):
+    # New composition sharing the theme's notes (or its unloaded recipe)
+    variant = copy.copy(comp)
+    if isinstance(comp._notes, array):
+        # Compact notes stay compact, in a copy of their own
+        variant._notes = array('f', comp._notes)
+    elif isinstance(comp._notes, (list, np.ndarray)):
+        # Editable notes are shared as a read-only view; lists are converted
+        variant._notes = note_array(comp)
+    if comp.recipe is not None:
+        variant.recipe = dict(comp.recipe)
+    variant.name = f"{comp.name} ({label})"
+    if tempo is not None:
+        variant.tempo = tempo
+    if rhythm_pattern is not None:
+        variant.rhythm_pattern = rhythm_pattern
+    variant.created_date = variant.modified_date = datetime.now().isoformat()
+    return variant
+
+def _clip(frequencies):
+    return np.clip(frequencies, MIN_FREQUENCY, MAX_FREQUENCY)
+
+def transpose(comp, semitones):
+    # Shift every note by a number of semitones
+    # semitones: interval (may be fractional), negative to transpose down
+    # returns: new composition
+    return _with_notes(comp, f"transposed {semitones:+g}", _clip(note_array(comp) * 2.0 ** (semitones / 12)))
+
+def invert(comp, axis=None):
+    # Mirror the melody's intervals around an axis pitch (melodic inversion)
+    # axis: frequency to mirror around (defaults to the first note)
+    # returns: new composition
+    notes = note_array(comp)
+    if axis is None:
+        axis = float(notes[0]) if len(notes) else 0.0
+    # Mirroring in log-frequency turns f into axis^2 / f
+    inverted = _clip(axis * axis / np.maximum(notes, MIN_FREQUENCY)) if len(notes) else notes
+    return _with_notes(comp, "inverted", inverted)
+
+def retrograde(comp):
+    # Play the melody backwards, durations included
+    # returns: new composition whose notes are a reversed view of the theme's
+    notes = note_array(comp)
+    cycle = resolve_rhythm(comp.rhythm_pattern).cycle
+    # Note i of the reversed melody has the duration of note n-1-i, so one
+    # reversed cycle describes the whole reversed rhythm
+    reversed_cycle = cycle[(len(notes) - 1 - np.arange(len(cycle))) % len(cycle)]
+    return _with_notes(comp, "retrograde", notes[::-1], rhythm_pattern=rhythm_spec(reversed_cycle))
+
+def augment(comp, factor=2.0):
+    # Scale every note duration (augmentation; factors below 1 diminish)
+    # The written rhythm changes while the tempo stays
+    # factor: duration multiplier
+    # returns: new composition sharing the theme's notes
+    if factor <= 0:
+        raise ValueError(f"Augmentation needs a positive factor, got {factor}")
+    cycle = resolve_rhythm(comp.rhythm_pattern).cycle * factor
+    return _with_timing(comp, f"augmented x{factor:g}", rhythm_pattern=rhythm_spec(cycle))
+
+def diminish(comp, factor=2.0):
+    # Divide every note duration by a factor (diminution)
+    # returns: new composition sharing the theme's notes
+    if factor <= 0:
+        raise ValueError(f"Diminution needs a positive factor, got {factor}")
+    return augment(comp, 1 / factor)
+
+def time_stretch(comp, factor):
+    # Stretch the whole melody in time by changing its tempo
+    # The written rhythm stays; factor 2 plays it half as fast
+    # factor: length multiplier
+    # returns: new composition sharing the theme's notes
+    if factor <= 0:
+        raise ValueError(f"Time-stretch needs a positive factor, got {factor}")
+    tempo = comp.tempo / factor
+    if float(tempo).is_integer():
+        tempo = int(tempo)
+    return _with_timing(comp, f"stretched x{factor:g}", tempo=tempo)
+
+def scale_table(scale_type):
+    # Frequencies of every degree of a scale across all octaves, ascending
+    # (before clipping to the audible range), as sequence_to_notes maps them
+    base = np.asarray(SCALE_BASE_NOTES[scale_type])
+    degrees = np.arange(len(base) * (MAX_OCTAVE + 1))
+    return base[degrees % len(base)] * 2.0 ** (degrees // len(base))
+
+def scale_degrees(notes, scale_type):
+    # Nearest degree of a scale (counted across octaves) for every note
+    # Notes mapped by sequence_to_notes give back the mapped value
+    # returns: int array of degrees
+    table = scale_table(scale_type)
+    notes = np.asarray(notes, dtype=np.float64)
+    above = np.clip(np.searchsorted(table, notes), 1, len(table) - 1)
+    # Pick the nearer neighbour in log-frequency
+    below_is_nearer = notes * notes < table[above - 1] * table[above]
+    return above - below_is_nearer
+
+def remap_scale(comp, scale_type, source_scale=None):
+    # Map the melody onto another scale degree by degree
+    # Every note is read as a degree of its source scale (the nearest one
+    # if it lies off the scale) and replaced by the same degree of the new
+    # scale, so sequence-derived melodies get the notes their sequence has
+    # in that scale
+    # scale_type: target scale
+    # source_scale: scale the notes are in (defaults to the composition's)
+    # returns: new composition
+    if scale_type not in SCALE_BASE_NOTES:
+        raise ValueError(f"Unknown scale type: {scale_type}")
+    source_scale = source_scale or comp.scale_type
+    if source_scale not in SCALE_BASE_NOTES:
+        raise ValueError(f"Unknown scale type: {source_scale}")
+    notes = reduced_to_notes(scale_degrees(note_array(comp), source_scale), scale_type)
+    return _with_notes(comp, scale_type, notes, scale_type=scale_type)
@@ -0,0 +1,201 @@
+# Piano roll, waveform and spectrogram plots
+# Renders headless to PNG with matplotlib's Agg canvas, without pyplot or a
+# display. Data is reduced to the plot's pixel width before drawing: the
+# waveform as a min/max envelope per pixel column, the spectrogram as one
+# STFT frame per column computed in chunks, and the piano roll as a pixel
+# image. Plot cost therefore depends on the image size, not on the number of
+# samples or notes, so hour-long renders and million-note melodies plot in
+# bounded memory. Sample arrays may be memory-mapped (see SymphonyBundle.pcm).
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from midi_export import frequencies_to_midi
+from rhythm import resolve_rhythm
+from synthesis import DEFAULT_SAMPLE_RATE
+
+DEFAULT_WIDTH = 1600
+DEFAULT_HEIGHT = 500
+DPI = 100
+# Samples reduced per step when computing an envelope
+ENVELOPE_CHUNK_SIZE = 1 << 20
+# STFT frames computed per batch
+SPECTROGRAM_CHUNK_FRAMES = 256
+DEFAULT_FFT_SIZE = 2048
+MIN_DB = -90.0
+
+def as_float_samples(samples):
+    # View samples as floats in -1.0 to 1.0 (16-bit PCM is rescaled)
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
+
+def minmax_envelope(samples, columns):
+    # Minimum and maximum sample of each pixel column
+    # Reads the samples in chunks, so memory use stays bounded for
+    # memory-mapped input of any length
+    # samples: 1-D sample array (float or int16)
+    # columns: number of columns
+    # returns: (mins, maxs) float arrays of length min(columns, len(samples))
+    total = len(samples)
+    if total == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    columns = min(columns, total)
+    # Column c covers samples [edges[c], edges[c + 1])
+    edges = (np.arange(columns + 1, dtype=np.int64) * total) // columns
+    mins = np.empty(columns, dtype=np.float32)
+    maxs = np.empty(columns, dtype=np.float32)
+    column = 0
+    while column < columns:
+        # Whole columns fitting in one chunk (at least one)
+        last = max(column + 1, np.searchsorted(edges, edges[column] + ENVELOPE_CHUNK_SIZE, side='right') - 1)
+        last = min(last, columns)
+        chunk = as_float_samples(samples[edges[column]:edges[last]])
+        starts = edges[column:last] - edges[column]
+        mins[column:last] = np.minimum.reduceat(chunk, starts)
+        maxs[column:last] = np.maximum.reduceat(chunk, starts)
+        column = last
+    return mins, maxs
+
+def spectrogram_columns(samples, columns, fft_size=DEFAULT_FFT_SIZE):
+    # Magnitude spectrum in dB at evenly spaced points, one per pixel column
+    # samples: 1-D sample array (float or int16)
+    # columns: number of columns
+    # fft_size: STFT window length
+    # returns: float array of shape (fft_size // 2 + 1, columns)
+    total = len(samples)
+    columns = max(1, columns)
+    window = np.hanning(fft_size).astype(np.float32)
+    # Window starts, centred on each column
+    centers = ((np.arange(columns) + 0.5) * total / columns).astype(np.int64)
+    starts = np.clip(centers - fft_size // 2, 0, max(total - fft_size, 0))
+    offsets = np.arange(fft_size)
+    spectrogram = np.empty((fft_size // 2 + 1, columns), dtype=np.float32)
+    scale = 2.0 / window.sum()
+    for first in range(0, columns, SPECTROGRAM_CHUNK_FRAMES):
+        chunk_starts = starts[first:first + SPECTROGRAM_CHUNK_FRAMES]
+        # Read each window on its own: with long input the windows are far
+        # apart, and reading the span between them would touch every sample
+        frames = np.stack([as_float_samples(samples[start:start + fft_size]) for start in chunk_starts])
+        if frames.shape[1] < fft_size:
+            frames = np.pad(frames, ((0, 0), (0, fft_size - frames.shape[1])))
+        frames *= window
+        magnitudes = np.abs(np.fft.rfft(frames, axis=1)) * scale
+        spectrogram[:, first:first + len(chunk_starts)] = (
+            20 * np.log10(np.maximum(magnitudes, 10 ** (MIN_DB / 20)))
+        ).T
+    return spectrogram
+
+def piano_roll_image(notes, durations_ms, columns):
+    # Rasterize a melody into a pitch by time occupancy image
+    # Every note adds one at its first column and subtracts one after its last,
+    # and a running sum along time fills the spans, so the cost is linear in
+    # notes plus pixels however long the notes are
+    # notes: note frequencies in Hz
+    # durations_ms: note durations in ms
+    # columns: number of time columns
+    # returns: (image of shape (pitch rows, columns), lowest MIDI note,
+    #           total duration in ms)
+    pitches = frequencies_to_midi(notes)
+    durations_ms = np.asarray(durations_ms, dtype=np.float64)[:len(pitches)]
+    pitches = pitches[:len(durations_ms)]
+    ends = np.cumsum(durations_ms)
+    onsets = ends - durations_ms
+    total_ms = ends[-1] if len(ends) else 0.0
+    if not len(pitches) or total_ms <= 0:
+        return np.zeros((1, columns), dtype=np.float32), 60, 0.0
+
+    low = int(pitches.min())
+    rows = int(pitches.max()) - low + 1
+    first = np.minimum((onsets * columns / total_ms).astype(np.int64), columns - 1)
+    # Short notes still cover at least their first column
+    last = np.maximum(np.ceil(ends * columns / total_ms).astype(np.int64), first + 1)
+    rows_offset = (pitches - low) * (columns + 1)
+    edges = (np.bincount(rows_offset + first, minlength=rows * (columns + 1))
+             - np.bincount(rows_offset + last, minlength=rows * (columns + 1)))
+    image = np.cumsum(edges.reshape(rows, columns + 1)[:, :columns], axis=1) > 0
+    return image.astype(np.float32), low, total_ms
+
+def _new_figure(width, height):
+    figure = Figure(figsize=(width / DPI, height / DPI), dpi=DPI)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot(1, 1, 1)
+
+def _plot_width(width):
+    # Pixel columns inside the axes (the figure margins are excluded)
+    return max(1, int(width * 0.8))
+
+def plot_piano_roll(comp, filepath, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, durations_ms=None):
+    # Save a piano roll of a composition as a PNG image
+    # comp: Composition
+    # filepath: destination path
+    # width, height: image size in pixels
+    # durations_ms: note durations (defaults to the composition's rhythm)
+    # returns: True if successful, False otherwise
+    try:
+        if durations_ms is None:
+            durations_ms = resolve_rhythm(comp.rhythm_pattern).durations(len(comp.notes))
+        image, low, total_ms = piano_roll_image(comp.notes, durations_ms, _plot_width(width))
+        figure, axes = _new_figure(width, height)
+        axes.imshow(image, aspect='auto', origin='lower', interpolation='nearest', cmap='Greys',
+                    extent=(0, total_ms / 1000.0, low - 0.5, low + len(image) - 0.5))
+        axes.set_title(f"{comp.name} - piano roll")
+        axes.set_xlabel("Time (s)")
+        axes.set_ylabel("MIDI note")
+        figure.savefig(filepath)
+        return True
+    except Exception as e:
+        print(f"Error plotting piano roll: {e}")
+        return False
+
+def plot_waveform(samples, filepath, sample_rate=DEFAULT_SAMPLE_RATE, width=DEFAULT_WIDTH,
+                  height=DEFAULT_HEIGHT, title="Waveform"):
+    # Save a waveform plot (min/max envelope per pixel column) as a PNG image
+    # samples: 1-D sample array (float or int16, may be memory-mapped)
+    # filepath: destination path
+    # sample_rate: sample rate in Hz
+    # width, height: image size in pixels
+    # returns: True if successful, False otherwise
+    try:
+        mins, maxs = minmax_envelope(samples, _plot_width(width))
+        times = (np.arange(len(mins)) + 0.5) * len(samples) / len(mins) / sample_rate
+        figure, axes = _new_figure(width, height)
+        axes.fill_between(times, mins, maxs, linewidth=0.5)
+        axes.set_xlim(0, len(samples) / sample_rate)
+        axes.set_ylim(-1.0, 1.0)
+        axes.set_title(title)
+        axes.set_xlabel("Time (s)")
+        figure.savefig(filepath)
+        return True
+    except Exception as e:
+        print(f"Error plotting waveform: {e}")
+        return False
+
+def plot_spectrogram(samples, filepath, sample_rate=DEFAULT_SAMPLE_RATE, width=DEFAULT_WIDTH,
+                     height=DEFAULT_HEIGHT, fft_size=DEFAULT_FFT_SIZE, max_frequency=5000,
+                     title="Spectrogram"):
+    # Save a spectrogram as a PNG image
+    # samples: 1-D sample array (float or int16, may be memory-mapped)
+    # filepath: destination path
+    # sample_rate: sample rate in Hz
+    # width, height: image size in pixels
+    # fft_size: STFT window length
+    # max_frequency: highest frequency shown in Hz
+    # returns: True if successful, False otherwise
+    try:
+        spectrogram = spectrogram_columns(samples, _plot_width(width), fft_size)
+        bins = min(len(spectrogram), int(max_frequency * fft_size / sample_rate) + 1)
+        figure, axes = _new_figure(width, height)
+        axes.imshow(spectrogram[:bins], aspect='auto', origin='lower', cmap='magma',
+                    vmin=MIN_DB, vmax=0,
+                    extent=(0, len(samples) / sample_rate, 0, bins * sample_rate / fft_size))
+        axes.set_title(title)
+        axes.set_xlabel("Time (s)")
+        axes.set_ylabel("Frequency (Hz)")
+        figure.savefig(filepath)
+        return True
+    except Exception as e:
+        print(f"Error plotting spectrogram: {e}")
+        return False